@@ -1,5 +1,3 @@
+from .main import main
 
-from . import cli
-from . import assistant
-
-cli.cli()
+main()
@@ -1,14 +1,31 @@
 """
 Helpers.
+
+Names are imported from rich on first access, so importing this module
+doesn't pull in all of rich.
 """
+from importlib import import_module
+
+_EXPORTS = {
+    "Console": "rich.console",
+    "ConsoleOptions": "rich.console",
+    "RenderResult": "rich.console",
+    "Panel": "rich.panel",
+    "Markdown": "rich.markdown",
+    "Prompt": "rich.prompt",
+    "Table": "rich.table",
+    "Column": "rich.table",
+    "Columns": "rich.columns",
+    "Text": "rich.text",
+    "Padding": "rich.padding",
+    "Live": "rich.live",
+}
 
-from rich.console import Console, ConsoleOptions, RenderResult
-from rich.panel import Panel
-from rich.markdown import Markdown
-from rich.prompt import Prompt
-from rich.table import Table, Column
-from rich.columns import Columns
-from rich.text import Text
-from rich.padding import Padding
 
-Working = Console().status("Working...")
+def __getattr__(name: str):
+    try:
+        module = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = globals()[name] = getattr(import_module(module), name)
+    return value
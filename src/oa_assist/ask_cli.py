@@ -0,0 +1,77 @@
+import sys
+
+import click
+import openai
+
+from .assistant import AssistantInterface
+from .cache import ASSISTANT
+from .cli import cli, CLI
+from .names import ObjectRef, THREAD_REF
+from .output import write_ndjson, write_record, write_run
+from .runs import RunFailed
+from .tool_executor import ToolExecutor
+
+# Exit statuses; click exits with 2 for usage errors.
+EXIT_FAILED = 1
+EXIT_API_ERROR = 3
+EXIT_INTERRUPTED = 130
+
+
+@cli.command
+@click.argument("message")
+@click.option("--thread", "-t", "thread_id", type=THREAD_REF, help="Thread to ask on (default: the selected one).")
+@click.option("--new", "-n", "new_thread", is_flag=True, help="Ask on a new thread, leaving the selection as it is.")
+@click.option("--assistant", "-a", "assistant_id", type=ObjectRef(ASSISTANT),
+              help="Assistant to ask (default: the selected one).")
+@click.option("--format", "-f", "output_format", type=click.Choice(["text", "ndjson"]), default="text",
+              show_default=True, help="Plain reply text, or every run event as a JSON line.")
+@click.pass_context
+def ask(ctx: click.Context, message: str, thread_id: str | None, new_thread: bool, assistant_id: str | None,
+        output_format: str):
+    """
+    Send MESSAGE, write the reply to stdout and exit; for scripts.
+
+    MESSAGE "-" is read from stdin. Without a selected thread, a new one is
+    created and selected. Exits with 0 once the run completes, 1 if it
+    fails, expires or is cancelled, 2 for usage errors, 3 if the API
+    can't be reached or refuses a request and 130 when interrupted.
+    """
+    obj: CLI = ctx.obj
+    if message == "-":
+        message = sys.stdin.read()
+    assistant_id = assistant_id or obj.config.selected.assistant_id
+    if assistant_id is None:
+        raise click.UsageError("No assistant selected; pass --assistant")
+
+    ndjson = output_format == "ndjson"
+    try:
+        acc = AssistantInterface.retrieve(
+            obj.openai,
+            assistant_id,
+            obj.tools,
+            executor=ToolExecutor(obj.config.tools),
+            cache=obj.cache,
+            metrics=obj.metrics,
+            runs=obj.runs,
+            run_policy=obj.config.runs,
+        )
+        thread_id = None if new_thread else thread_id or obj.config.selected.thread_id
+        if thread_id is None:
+            thread = acc.create_thread()
+            if not new_thread:
+                with obj.config.update() as conf:
+                    conf.selected.thread_id = thread.thread.id
+        else:
+            thread = acc.retrieve_thread(thread_id)
+        op = thread.send(message)
+        (write_ndjson if ndjson else write_run)(sys.stdout, op)
+    except KeyboardInterrupt:
+        ctx.exit(EXIT_INTERRUPTED)
+    except (RunFailed, openai.APIError) as err:
+        if ndjson:
+            record = {"type": "error", "error": str(err)}
+            if isinstance(err, RunFailed):
+                record.update(run_id=err.run.id, status=err.run.status)
+            write_record(sys.stdout, record)
+        click.echo(f"Error: {err}", err=True)
+        ctx.exit(EXIT_FAILED if isinstance(err, RunFailed) else EXIT_API_ERROR)
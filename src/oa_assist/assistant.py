@@ -1,33 +1,69 @@
+import re
 import time
 from logging import info
+from typing import Any, Iterable, Iterator, NamedTuple
 
 import openai
 from openai.types.beta.assistant import Assistant
 from openai.types.beta.thread import Thread
+from openai.types.beta.threads import ThreadMessage
 from openai.types.beta.assistant_create_params import AssistantCreateParams
 from openai.types.beta.threads.run_submit_tool_outputs_params import RunSubmitToolOutputsParams, ToolOutput
 from openai.types.beta.threads.required_action_function_tool_call import RequiredActionFunctionToolCall, Function
 
+from .cache import ObjectCache, ASSISTANT, THREAD, MESSAGE
+from .metrics import MetricsStore, RunMetrics, TERMINAL_STATUSES, ToolCallTiming
+from .output_budget import OutputBudget
+from .runs import RunFailed, RunPolicy, RunStore, UNFINISHED_STATUSES
 from .tool_functions import BaseFunction, WriteFileFunction, FunctionEventHandler
+from .tool_executor import ToolExecutor
+from .tool_registry import ToolRegistry
 
 
 class AssistantInterface:
     @classmethod
-    def create(cls, client: openai.OpenAI, functions: list[BaseFunction], params: AssistantCreateParams):
+    def create(cls, client: openai.OpenAI, functions: Iterable[type[BaseFunction]], params: AssistantCreateParams,
+               executor: ToolExecutor | None = None, cache: ObjectCache | None = None,
+               metrics: MetricsStore | None = None, runs: RunStore | None = None,
+               run_policy: RunPolicy = RunPolicy()):
         assistant = client.beta.assistants.create(**params)
         info("Created assistant_id '%s'", assistant.id)
-        return cls(client, assistant, functions)
+        if cache:
+            cache.put(ASSISTANT, assistant)
+        return cls(client, assistant, functions, executor, cache, metrics, runs, run_policy)
 
     @classmethod
-    def retrieve(cls, client: openai.OpenAI, assistant_id: str, functions: list[BaseFunction]):
-        assistant = client.beta.assistants.retrieve(assistant_id=assistant_id)
-        info("Retrieved assistant_id '%s'", assistant.id)
-        return cls(client, assistant, functions)
+    def retrieve(cls, client: openai.OpenAI, assistant_id: str, functions: Iterable[type[BaseFunction]],
+                 executor: ToolExecutor | None = None, cache: ObjectCache | None = None,
+                 metrics: MetricsStore | None = None, runs: RunStore | None = None,
+                 run_policy: RunPolicy = RunPolicy()):
+        assistant = cache and cache.get(ASSISTANT, assistant_id, Assistant)
+        if assistant:
+            info("Cached assistant_id '%s'", assistant.id)
+        else:
+            assistant = client.beta.assistants.retrieve(assistant_id=assistant_id)
+            info("Retrieved assistant_id '%s'", assistant.id)
+            if cache:
+                cache.put(ASSISTANT, assistant)
+        return cls(client, assistant, functions, executor, cache, metrics, runs, run_policy)
 
-    def __init__(self, client: openai.OpenAI, assistant: Assistant, functions: list[BaseFunction] = []):
+    def __init__(self, client: openai.OpenAI, assistant: Assistant, functions: Iterable[type[BaseFunction]] = (),
+                 executor: ToolExecutor | None = None, cache: ObjectCache | None = None,
+                 metrics: MetricsStore | None = None, runs: RunStore | None = None,
+                 run_policy: RunPolicy = RunPolicy()):
         self.client = client
         self.assistant = assistant
-        self.functions = {func.NAME: func for func in functions}
+        self.functions = functions if isinstance(functions, ToolRegistry) else ToolRegistry(functions)
+        self.executor = executor or ToolExecutor()
+        self.budget = OutputBudget(self.executor.settings)
+        self.cache = cache
+        # Where finished runs' metrics are recorded, if anywhere.
+        self.metrics = metrics
+        # Where runs in progress are recorded so they can be resumed (see `runs`).
+        self.runs = runs
+        self.run_policy = run_policy
+        # Cleared the first time the API or SDK refuses a streaming run.
+        self.streaming = True
 
     def create_thread(self):
         return ThreadInterface.create(self)
@@ -36,17 +72,31 @@ class AssistantInterface:
         return ThreadInterface.retrieve(self, thread_id)
 
 
+def refuses_streaming(err: openai.BadRequestError) -> bool:
+    """Whether a 400 is the API rejecting `stream` itself, rather than anything else about the run."""
+    return err.param == "stream" or re.search(r"\bstream\b", err.message or "") is not None
+
+
 class ThreadInterface:
     @classmethod
     def create(cls, assistant_interface: AssistantInterface):
         thread = assistant_interface.client.beta.threads.create()
         info("Created thread_id '%s'", thread.id)
+        if assistant_interface.cache:
+            assistant_interface.cache.put(THREAD, thread)
         return cls(assistant_interface, thread)
 
     @classmethod
     def retrieve(cls, assistant_inteface: AssistantInterface, thread_id: str):
-        thread = assistant_inteface.client.beta.threads.retrieve(thread_id=thread_id)
-        info("Retrieved thread_id '%s'", thread.id)
+        cache = assistant_inteface.cache
+        thread = cache and cache.get(THREAD, thread_id, Thread)
+        if thread:
+            info("Cached thread_id '%s'", thread.id)
+        else:
+            thread = assistant_inteface.client.beta.threads.retrieve(thread_id=thread_id)
+            info("Retrieved thread_id '%s'", thread.id)
+            if cache:
+                cache.put(THREAD, thread)
         return cls(assistant_inteface, thread)
 
     def __init__(self, assistant_interface: AssistantInterface, thread: Thread):
@@ -58,47 +108,282 @@ class ThreadInterface:
     def functions(self):
         return self.assistant_interface.functions
 
-    def send(self, mesg: str):
-        self.client.beta.threads.messages.create(
+    @property
+    def cache(self) -> ObjectCache | None:
+        return self.assistant_interface.cache
+
+    @property
+    def _messages_key(self) -> str:
+        return f"messages:{self.thread.id}"
+
+    @property
+    def _complete_key(self) -> str:
+        return f"messages-complete:{self.thread.id}"
+
+    def recent_messages(self, limit: int = 20) -> list[ThreadMessage]:
+        """
+        The last `limit` messages in the thread, oldest first.
+
+        With a cache this is at most one request, made only when the cached
+        history is stale: for the messages after the last one seen, or if
+        there are more of those than `limit`, for the newest page, which
+        replaces the cached range so that the cache always holds one
+        unbroken run of messages.
+        """
+        if self.cache is None:
+            page = self.client.beta.threads.messages.list(thread_id=self.thread.id, order="desc", limit=limit)
+            return list(reversed(page.data))
+
+        if not self.cache.is_synced(self._messages_key):
+            cursor = self.cache.cursor(self._messages_key)
+            new = self._messages_after(cursor, limit) if cursor else None
+            if new is None:
+                page = self.client.beta.threads.messages.list(thread_id=self.thread.id, order="desc", limit=limit)
+                new = list(reversed(page.data))
+                self.cache.clear(MESSAGE, self.thread.id)
+                self.cache.forget(self._complete_key)
+                if len(page.data) < limit:
+                    self.cache.mark_synced(self._complete_key)
+            self.cache.put_many(MESSAGE, new, parent=self.thread.id, position="after")
+            self.cache.mark_synced(self._messages_key, new[-1].id if new else cursor)
+        return self.cache.page(MESSAGE, ThreadMessage, parent=self.thread.id, limit=limit)
+
+    def _messages_after(self, message_id: str, limit: int) -> list[ThreadMessage] | None:
+        """The messages after `message_id`, oldest first, or None if there are more than `limit`."""
+        try:
+            page = self.client.beta.threads.messages.list(
+                thread_id=self.thread.id, order="asc", after=message_id, limit=limit)
+        except (openai.NotFoundError, openai.BadRequestError):
+            # The message has been deleted.
+            return None
+        return None if len(page.data) >= limit else page.data
+
+    def earlier_messages(self, before: str, limit: int = 20) -> list[ThreadMessage]:
+        """Up to `limit` messages preceding the message `before`, oldest first."""
+        if self.cache is None:
+            page = self.client.beta.threads.messages.list(
+                thread_id=self.thread.id, order="desc", before=before, limit=limit)
+            return list(reversed(page.data))
+
+        messages = self.cache.page(MESSAGE, ThreadMessage, parent=self.thread.id, before=before, limit=limit)
+        if len(messages) < limit and not self.cache.is_synced(self._complete_key, max_age=float("inf")):
+            wanted = limit - len(messages)
+            page = self.client.beta.threads.messages.list(
+                thread_id=self.thread.id,
+                order="desc",
+                before=messages[0].id if messages else before,
+                limit=wanted,
+            )
+            older = list(reversed(page.data))
+            self.cache.put_many(MESSAGE, older, parent=self.thread.id, position="before")
+            if len(older) < wanted:
+                self.cache.mark_synced(self._complete_key)
+            messages = older + messages
+        return messages
+
+    def send(self, mesg: str, stream: bool = True):
+        message = self.add_message(mesg)
+        return self.start_run(stream, after=message.id)
+
+    def add_message(self, mesg: str):
+        if self.cache:
+            self.cache.invalidate(self._messages_key)
+        return self.client.beta.threads.messages.create(
             thread_id=self.thread.id,
             role="user",
             content=mesg,
         )
 
+    def start_run(self, stream: bool = True, after: str | None = None):
+        """Start a run; `after` is the id of the message it answers, if known."""
+        if stream and self.assistant_interface.streaming:
+            try:
+                events = self.client.beta.threads.runs.create(
+                    thread_id=self.thread.id,
+                    assistant_id=self.assistant_interface.assistant.id,
+                    stream=True,
+                )
+            except TypeError:
+                # The installed SDK predates streaming runs.
+                info("Streaming runs unavailable, falling back to polling")
+                self.assistant_interface.streaming = False
+            except openai.BadRequestError as err:
+                # Any other 400 (e.g. a run already active) would fail just the same when polling.
+                if not refuses_streaming(err):
+                    raise
+                info("Streaming runs refused, falling back to polling: %s", err.message)
+                self.assistant_interface.streaming = False
+            else:
+                return PendingOperation(self, None, stream=events, after=after)
+
         run = self.client.beta.threads.runs.create(
             thread_id=self.thread.id,
             assistant_id=self.assistant_interface.assistant.id,
         )
 
-        return PendingOperation(self, run.id)
+        return PendingOperation(self, run.id, after=after)
 
-    def run_required_action(self, run: openai.types.beta.threads.Run, pending: "PendingOperation"):
-        outputs: list[ToolOutput] = []
-        action: RequiredActionFunctionToolCall
-        for action in run.required_action.submit_tool_outputs.tool_calls:
-            info("Should Run: %s: %s", action.function.name, action.function.arguments)
+    def attach(self, run_id: str):
+        """Follow a run started earlier, e.g. by a process that was interrupted."""
+        return PendingOperation(self, run_id)
 
-            func_cls = self.functions[action.function.name]
-            func = func_cls.model_validate_json(action.function.arguments)
+    def run_required_action(self, run: openai.types.beta.threads.Run, pending: "PendingOperation", stream: bool = False):
+        with pending.metrics.timed("tools"):
+            outputs = self.assistant_interface.executor.run(
+                self.functions,
+                run.required_action.submit_tool_outputs.tool_calls,
+                pending,
+            )
+            outputs = self.assistant_interface.budget.apply(
+                run.required_action.submit_tool_outputs.tool_calls, outputs, pending)
 
-            outputs.append(ToolOutput(output=str(func(pending)), tool_call_id=action.id))
+        with pending.metrics.timed("submit"):
+            if stream:
+                return self.client.beta.threads.runs.submit_tool_outputs(
+                    thread_id=self.thread.id,
+                    run_id=run.id,
+                    tool_outputs=outputs,
+                    stream=True,
+                )
 
-        self.client.beta.threads.runs.submit_tool_outputs(
-            thread_id=self.thread.id,
-            run_id=run.id,
-            tool_outputs=outputs,
-        )
+            self.client.beta.threads.runs.submit_tool_outputs(
+                thread_id=self.thread.id,
+                run_id=run.id,
+                tool_outputs=outputs,
+            )
+
+
+class RunEvent(NamedTuple):
+    """
+    A single update from a run.
+
+    `kind` is one of "status" (the Run, after its status changed), "delta"
+    (a fragment of assistant text), "log" (a tool log message), "tool" (a
+    finished tool call's ToolCallTiming), "message" (a completed
+    ThreadMessage) or "done" (the final Run).
+    """
+    kind: str
+    data: Any = None
+
+
+def collect_response(pages: Iterable, run_id: str, newest_first: bool) -> list[ThreadMessage]:
+    """
+    The messages of `run_id` in message listing pages, oldest first. Pages
+    listed newest first end at the first message from before the run.
+    """
+    response = []
+    for page in pages:
+        for message in page.data:
+            if message.run_id == run_id:
+                response.append(message)
+            elif newest_first:
+                return response[::-1]
+    return response[::-1] if newest_first else response
+
+
+def iter_pages(page, limit: int) -> Iterator:
+    """
+    A listing's pages, fetched as they're needed. A page short of `limit`
+    is the last; the SDK's has_next_page() only knows that once it has
+    fetched an empty page.
+    """
+    while True:
+        yield page
+        if len(page.data) < limit:
+            return
+        page = page.get_next_page()
+
+
+def translate_stream_event(event) -> Iterator[RunEvent]:
+    """Translate a server-sent assistant stream event into RunEvents."""
+    match event.event:
+        case "thread.message.delta":
+            for part in event.data.delta.content or []:
+                if part.type == "text" and part.text and part.text.value:
+                    yield RunEvent("delta", part.text.value)
+        case "thread.message.completed":
+            yield RunEvent("message", event.data)
+        case "thread.run.completed":
+            yield RunEvent("done", event.data)
+        case "error":
+            raise ValueError(f"Stream error: {event.data}")
+        case name if name.startswith("thread.run.") and not name.startswith("thread.run.step."):
+            yield RunEvent("status", event.data)
+
+
+class PollBackoff:
+    """Exponential delay between polls, reset whenever the run makes progress."""
+
+    def __init__(self, initial: float = 0.05, maximum: float = 2.0, factor: float = 2.0):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.delay = initial
+
+    def reset(self):
+        self.delay = self.initial
+
+    def next_delay(self) -> float:
+        delay = self.delay
+        self.delay = min(self.delay * self.factor, self.maximum)
+        return delay
+
+    def wait(self):
+        time.sleep(self.next_delay())
 
 
 class PendingOperation(FunctionEventHandler):
-    def __init__(self, thread_interface, run_id):
+    def __init__(self, thread_interface, run_id, stream=None, after: str | None = None):
         self.thread_interface = thread_interface
         self.run_id = run_id
+        self._stream = stream
+        # The message that the run answers; its response is what follows.
+        self.after = after
         self._log_messages: list[str] = []
+        self._tool_calls: list[ToolCallTiming] = []
+        self.backoff = PollBackoff()
+        self.settings = thread_interface.assistant_interface.executor.settings
+        self.shells = thread_interface.assistant_interface.executor.shells
+        self.session = thread_interface.thread.id
+        self.metrics = RunMetrics(thread_interface.thread.id, thread_interface.assistant_interface.assistant.id)
+        self._tracked = False
+        self.retries = 0
 
     def log(self, mesg: str):
         self._log_messages.append(mesg)
 
+    def update(self, run: openai.types.beta.threads.Run):
+        """Record a status of the run: in its metrics and, when it starts or ends, in the run store."""
+        self.metrics.update(run)
+        runs = self.thread_interface.assistant_interface.runs
+        if runs is not None and (not self._tracked or run.status in TERMINAL_STATUSES):
+            self._tracked = runs.track(run)
+
+    def tool_call(self, name: str, seconds: float, success: bool):
+        self.metrics.tool_call(name, seconds, success)
+        self._tool_calls.append(ToolCallTiming(name, seconds, success))
+
+    def restart(self, run: openai.types.beta.threads.Run):
+        """
+        Apply the run policy to a run that ended without completing: start
+        another run on the thread in its place, or raise RunFailed.
+        """
+        delay = self.thread_interface.assistant_interface.run_policy.retry_after(run, self.retries)
+        if delay is None:
+            raise RunFailed(run)
+        self.retries += 1
+        self.log(f"Run {run.id} {run.status}; starting it again in {delay:.1f}s")
+        self.metrics.finish(run)
+        self.record_metrics()
+        self.metrics = RunMetrics(self.thread_interface.thread.id, self.thread_interface.assistant_interface.assistant.id)
+        time.sleep(delay)
+        self.run_id = self.thread_interface.client.beta.threads.runs.create(
+            thread_id=self.thread_interface.thread.id,
+            assistant_id=self.thread_interface.assistant_interface.assistant.id,
+        ).id
+        self._tracked = False
+        self.backoff.reset()
+
     def get_log_messages(self) -> list[str]:
         log_messages = self._log_messages
         if log_messages:
@@ -110,19 +395,132 @@ class PendingOperation(FunctionEventHandler):
             thread_id=self.thread_interface.thread.id,
             run_id=self.run_id,
         )
+        self.metrics.poll()
+        self.update(run)
         match run.status:
             case "completed":
                 return True
             case "requires_action":
                 self.thread_interface.run_required_action(run, self)
-            case "queued" | "in_progress":
+            case "failed" | "cancelled" | "expired":
+                self.restart(run)
+            case "queued" | "in_progress" | "cancelling":
                 pass
             case _:
                 raise ValueError(f"Unhandled status: {run.status}")
         return False
 
-    def get_response(self):
-        return list(self.thread_interface.client.beta.threads.messages.list(
-            thread_id=self.thread_interface.thread.id,
-            limit=1,
-        ))[0]
+    def events(self) -> Iterator[RunEvent]:
+        """
+        Iterate over the run until it completes.
+
+        Streaming runs yield text deltas as they arrive; polled runs only
+        yield status changes and the final message.
+        """
+        try:
+            if self._stream is not None:
+                yield from self._stream_events()
+            else:
+                yield from self._poll_events()
+        except RunFailed as err:
+            self.metrics.finish(err.run)
+            raise
+        except Exception:
+            self.metrics.finish(status="error")
+            raise
+        finally:
+            self.record_metrics()
+
+    def record_metrics(self):
+        self.metrics.finish()
+        store = self.thread_interface.assistant_interface.metrics
+        if store is not None:
+            store.record(self.metrics)
+
+    def _log_events(self) -> Iterator[RunEvent]:
+        for mesg in self.get_log_messages():
+            yield RunEvent("log", mesg)
+        tool_calls, self._tool_calls = self._tool_calls, []
+        for timing in tool_calls:
+            yield RunEvent("tool", timing)
+
+    def _stream_events(self) -> Iterator[RunEvent]:
+        stream, self._stream = self._stream, None
+        while stream is not None:
+            next_stream = None
+            for event in stream:
+                for update in translate_stream_event(event):
+                    if update.kind in ("status", "done"):
+                        self.update(update.data)
+                    if update.kind == "done":
+                        self.metrics.finish(update.data)
+                    yield update
+                    if update.kind == "done":
+                        return
+                    if update.kind == "status":
+                        self.run_id = update.data.id
+                        if update.data.status == "requires_action":
+                            next_stream = self.thread_interface.run_required_action(update.data, self, stream=True)
+                            yield from self._log_events()
+                        elif update.data.status in UNFINISHED_STATUSES:
+                            # Any new run is followed by polling.
+                            self.restart(update.data)
+                            yield from self._log_events()
+                            yield from self._poll_events()
+                            return
+            stream = next_stream
+
+    def _poll_events(self) -> Iterator[RunEvent]:
+        status = None
+        while True:
+            run = self.thread_interface.client.beta.threads.runs.retrieve(
+                thread_id=self.thread_interface.thread.id,
+                run_id=self.run_id,
+            )
+            self.metrics.poll()
+            self.update(run)
+            if run.status != status:
+                status = run.status
+                self.backoff.reset()
+                yield RunEvent("status", run)
+
+            match run.status:
+                case "completed":
+                    with self.metrics.timed("response"):
+                        response = self.get_response()
+                    self.metrics.finish(run)
+                    for message in response:
+                        yield RunEvent("message", message)
+                    yield RunEvent("done", run)
+                    return
+                case "requires_action":
+                    self.thread_interface.run_required_action(run, self)
+                    yield from self._log_events()
+                    self.backoff.reset()
+                    continue
+                case "failed" | "cancelled" | "expired":
+                    self.restart(run)
+                    yield from self._log_events()
+                    status = None
+                    continue
+                case "queued" | "in_progress" | "cancelling":
+                    pass
+                case _:
+                    raise ValueError(f"Unhandled status: {run.status}")
+            self.backoff.wait()
+
+    def get_response(self) -> list[ThreadMessage]:
+        """
+        Every message the run added, oldest first. That's usually a single
+        page of the messages following the one the run answers; for an
+        attached run, it's the newest messages back to the first from
+        before the run.
+        """
+        messages = self.thread_interface.client.beta.threads.messages
+        if self.after is not None:
+            limit = 100
+            page = messages.list(thread_id=self.thread_interface.thread.id, order="asc", after=self.after, limit=limit)
+        else:
+            limit = 20
+            page = messages.list(thread_id=self.thread_interface.thread.id, order="desc", limit=limit)
+        return collect_response(iter_pages(page, limit), self.run_id, newest_first=self.after is None)
@@ -1,12 +1,18 @@
+import time
+from fnmatch import fnmatch
+from typing import Callable
+
 import rich
 import rich.box
-from ._dep.rich import Console, Table, Column
+from ._dep.rich import Console, Table, Column, Live
 import click
 from pydantic import BaseModel
 
 from .assistant import Assistant
-from .cli import cli, CLI, ShortcutGroup
-from .tool_functions import DEFAULT_FUNCTIONS
+from .bulk import delete_all
+from .cache import ASSISTANT
+from .cli import cli, CLI, ShortcutGroup, parse_age
+from .names import ObjectRef
 
 
 def show_assistant(console: Console, assistant: Assistant):
@@ -20,9 +26,35 @@ def assistant(ctx):
         ctx.invoke(list_assistants)
 
 
+def builtin_tools(code_interpreter: bool, retrieval: bool) -> list[dict]:
+    return [{"type": name} for name, enabled in (("code_interpreter", code_interpreter), ("retrieval", retrieval))
+            if enabled]
+
+
+def fetch_assistants(obj: CLI, on_page: Callable[[list[Assistant]], None] | None = None) -> list[Assistant]:
+    """Every assistant, a page at a time; `on_page` is called with each page as it arrives."""
+    assistants = []
+    page = obj.openai.beta.assistants.list(limit=100)
+    while True:
+        assistants.extend(page.data)
+        if on_page:
+            on_page(page.data)
+        if len(page.data) < 100:
+            break
+        page = page.get_next_page()
+    obj.cache.replace_all(ASSISTANT, assistants)
+    obj.cache.mark_synced(ASSISTANT)
+    return assistants
+
+
+# Names of assistants that have never been listed aren't known until they are.
+ASSISTANT_REF = ObjectRef(ASSISTANT, refresh=fetch_assistants)
+
+
 @assistant.command(name="list")
+@click.option("--refresh", "-r", is_flag=True, help="Ignore the local cache.")
 @click.pass_obj
-def list_assistants(obj: CLI):
+def list_assistants(obj: CLI, refresh: bool = False):
     table = Table(
         ":question_mark:",
         "Name",
@@ -32,8 +64,9 @@ def list_assistants(obj: CLI):
         title="Assistants",
         box=rich.box.SIMPLE_HEAD
     )
-    with obj.console.status("Working..."):
-        for item in obj.openai.beta.assistants.list():
+
+    def add_rows(assistants: list[Assistant]):
+        for item in assistants:
             selected = obj.config.selected.assistant_id == item.id
 
             table.add_row(
@@ -41,36 +74,85 @@ def list_assistants(obj: CLI):
                 item.name,
                 item.id,
                 item.model,
-                item.instructions.split("\n")[0].strip(),
+                (item.instructions or "").split("\n")[0].strip(),
                 style="bold green" if selected else "",
             )
-    obj.console.print(table)
+
+    if refresh or not obj.cache.is_synced(ASSISTANT):
+        # Rows are shown as each page arrives.
+        with Live(table, console=obj.console, refresh_per_second=8):
+            fetch_assistants(obj, add_rows)
+    else:
+        add_rows(obj.cache.list(ASSISTANT, Assistant, reverse=True))
+        obj.console.print(table)
+
+
+def delete_assistants(obj: CLI, assistant_ids: list[str], concurrency: int):
+    client = obj.openai
+    gone = delete_all(
+        obj.console, "assistant", assistant_ids, lambda id: client.beta.assistants.delete(assistant_id=id),
+        concurrency,
+    )
+    with obj.config.update():
+        for assistant_id in gone:
+            obj.cache.delete(ASSISTANT, assistant_id)
+            obj.names.set_label(ASSISTANT, assistant_id, None)
+            if obj.config.selected.assistant_id == assistant_id:
+                obj.config.selected.assistant_id = None
 
 
 @assistant.command
 @click.pass_obj
-@click.argument("assistant_id", nargs=-1)
-def delete(obj: CLI, assistant_id):
+@click.argument("assistant_id", nargs=-1, type=ObjectRef(ASSISTANT, refresh=fetch_assistants, confirm="Delete"))
+@click.option("--yes", "-y", is_flag=True, is_eager=True, help="Don't ask before deleting by a prefix.")
+@click.option("--concurrency", "-j", default=8, show_default=True, help="Assistants deleted at once.")
+def delete(obj: CLI, assistant_id, yes: bool, concurrency: int):
+    delete_assistants(obj, list(assistant_id), concurrency)
+
+
+@assistant.command
+@click.pass_obj
+@click.option("--older-than", "-o", callback=parse_age, help="Only assistants created longer ago than this, e.g. 30d.")
+@click.option("--name", "pattern", help="Only assistants whose name matches this glob pattern.")
+@click.option("--dry-run", "-n", is_flag=True, help="Show what would be deleted.")
+@click.option("--yes", "-y", is_flag=True, help="Don't ask for confirmation.")
+@click.option("--concurrency", "-j", default=8, show_default=True, help="Assistants deleted at once.")
+def prune(obj: CLI, older_than: float | None, pattern: str | None, dry_run: bool, yes: bool, concurrency: int):
+    """Delete assistants by age and name, except the selected one."""
+    if older_than is None and pattern is None:
+        raise click.UsageError("Pass at least one of --older-than and --name")
     with obj.console.status("Working..."):
-        for id in assistant_id:
-            obj.console.print(f"Deleting assistant [bold]{id}[/bold].")
-            obj.openai.beta.assistants.delete(assistant_id=id)
+        assistants = fetch_assistants(obj)
+    cutoff = time.time() - (older_than or 0)
+    doomed = [
+        item for item in assistants
+        if item.id != obj.config.selected.assistant_id
+        and (older_than is None or item.created_at < cutoff)
+        and (pattern is None or fnmatch(item.name or "", pattern))
+    ]
+    if not doomed:
+        obj.console.print("No assistants to delete.")
+        return
+    if dry_run:
+        for item in doomed:
+            obj.console.print(f"Would delete assistant [bold]{item.id}[/bold] {item.name or ''}")
+        return
+    if not yes:
+        click.confirm(f"Delete {len(doomed)} assistants?", abort=True)
+    delete_assistants(obj, [item.id for item in doomed], concurrency)
 
 
 @assistant.command
 @click.pass_obj
-@click.argument("assistant_id")
-@click.option("--name", "-n", is_flag=True)
+@click.argument("assistant_id", type=ASSISTANT_REF)
+@click.option("--name", "-n", is_flag=True, hidden=True, help="Ignored; names are always accepted.")
 def select(obj: CLI, assistant_id: str, name: bool):
+    """Select an assistant by id, name or label, or a prefix of one."""
     with obj.console.status("Working..."):
-        if name:
-            for assist in obj.openai.beta.assistants.list():
-                if assist.name == assistant_id:
-                    break
-            else:
-                raise ValueError(f"Unknown name: '{assistant_id}'")
-        else:
+        assist = obj.cache.get(ASSISTANT, assistant_id, Assistant)
+        if assist is None:
             assist = obj.openai.beta.assistants.retrieve(assistant_id)
+            obj.cache.put(ASSISTANT, assist)
         obj.config.selected.assistant_id = assist.id
         obj.config.save()
         obj.console.print(f"[bold]{assist.id}[/bold] is now selected.")
@@ -90,8 +172,9 @@ def create(obj: CLI, model, name, instructions, retrieval, code_interpreter, sel
             model=model,
             name=name,
             instructions=instructions,
-            tools=[{"type": "code_interpreter"}] + [{"type": "function", "function": func.get_function()} for func in DEFAULT_FUNCTIONS],
+            tools=obj.tools.definitions(builtin_tools(code_interpreter, retrieval)),
         )
+        obj.cache.put(ASSISTANT, assist)
     obj.console.print("Created: ")
     show_assistant(obj.console, assist)
     if select:
@@ -102,11 +185,37 @@ def create(obj: CLI, model, name, instructions, retrieval, code_interpreter, sel
 
 @assistant.command
 @click.pass_obj
-@click.argument("model")
-@click.argument("name")
-@click.argument("instructions")
-@click.option("--retrieval/--no-retrieval", default=False)
-@click.option("--code-interpreter/--no-code-interpreter", default=True)
-@click.option("--select", "-s", is_flag=True)
-def update():
-    pass
+@click.option("--model")
+@click.option("--name")
+@click.option("--instructions")
+@click.option("--retrieval/--no-retrieval", default=None, help="Default: keep the current setting.")
+@click.option("--code-interpreter/--no-code-interpreter", default=None, help="Default: keep the current setting.")
+def update(obj: CLI, model, name, instructions, retrieval, code_interpreter):
+    """Update the selected assistant, including its tools if they've changed locally."""
+    if obj.config.selected.assistant_id is None:
+        raise click.ClickException("No assistant selected")
+    assist = obj.cache.get(ASSISTANT, obj.config.selected.assistant_id, Assistant)
+    if assist is None:
+        with obj.console.status("Working..."):
+            assist = obj.openai.beta.assistants.retrieve(obj.config.selected.assistant_id)
+
+    current = {tool.type for tool in assist.tools}
+    builtin = builtin_tools(
+        "code_interpreter" in current if code_interpreter is None else code_interpreter,
+        "retrieval" in current if retrieval is None else retrieval,
+    )
+    params = {
+        key: value for key, value in (("model", model), ("name", name), ("instructions", instructions))
+        if value is not None and value != getattr(assist, key)
+    }
+    if not obj.tools.matches(assist.tools, builtin):
+        params["tools"] = obj.tools.definitions(builtin)
+    if not params:
+        obj.console.print(f"[bold]{assist.id}[/bold] is up to date.")
+        return
+
+    with obj.console.status("Working..."):
+        assist = obj.openai.beta.assistants.update(assist.id, **params)
+        obj.cache.put(ASSISTANT, assist)
+    obj.console.print(f"Updated {', '.join(params)}: ")
+    show_assistant(obj.console, assist)
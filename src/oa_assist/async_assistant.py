@@ -0,0 +1,334 @@
+"""
+Asyncio versions of the interfaces in `assistant`, built on `openai.AsyncOpenAI`.
+
+These mirror `AssistantInterface`, `ThreadInterface` and `PendingOperation`
+so that a single event loop can drive many threads and runs at once.
+"""
+import asyncio
+from logging import info
+from typing import AsyncIterator, Iterable
+
+import openai
+from openai.types.beta.assistant import Assistant
+from openai.types.beta.thread import Thread
+from openai.types.beta.threads import ThreadMessage
+from openai.types.beta.assistant_create_params import AssistantCreateParams
+
+from .assistant import RunEvent, PollBackoff, collect_response, refuses_streaming, translate_stream_event
+from .metrics import MetricsStore, RunMetrics, TERMINAL_STATUSES, ToolCallTiming
+from .output_budget import OutputBudget
+from .runs import RunFailed, RunPolicy, RunStore, UNFINISHED_STATUSES
+from .tool_functions import BaseFunction, FunctionEventHandler
+from .tool_executor import AsyncToolExecutor
+from .tool_registry import ToolRegistry
+
+
+class AsyncAssistantInterface:
+    @classmethod
+    async def create(cls, client: openai.AsyncOpenAI, functions: Iterable[type[BaseFunction]], params: AssistantCreateParams,
+                     executor: AsyncToolExecutor | None = None, metrics: MetricsStore | None = None,
+                     runs: RunStore | None = None, run_policy: RunPolicy = RunPolicy()):
+        assistant = await client.beta.assistants.create(**params)
+        info("Created assistant_id '%s'", assistant.id)
+        return cls(client, assistant, functions, executor, metrics, runs, run_policy)
+
+    @classmethod
+    async def retrieve(cls, client: openai.AsyncOpenAI, assistant_id: str, functions: Iterable[type[BaseFunction]],
+                       executor: AsyncToolExecutor | None = None, metrics: MetricsStore | None = None,
+                       runs: RunStore | None = None, run_policy: RunPolicy = RunPolicy()):
+        assistant = await client.beta.assistants.retrieve(assistant_id=assistant_id)
+        info("Retrieved assistant_id '%s'", assistant.id)
+        return cls(client, assistant, functions, executor, metrics, runs, run_policy)
+
+    def __init__(self, client: openai.AsyncOpenAI, assistant: Assistant, functions: Iterable[type[BaseFunction]] = (),
+                 executor: AsyncToolExecutor | None = None, metrics: MetricsStore | None = None,
+                 runs: RunStore | None = None, run_policy: RunPolicy = RunPolicy()):
+        self.client = client
+        self.assistant = assistant
+        self.functions = functions if isinstance(functions, ToolRegistry) else ToolRegistry(functions)
+        self.executor = executor or AsyncToolExecutor()
+        self.budget = OutputBudget(self.executor.settings)
+        self.metrics = metrics
+        self.runs = runs
+        self.run_policy = run_policy
+        self.streaming = True
+
+    async def create_thread(self):
+        return await AsyncThreadInterface.create(self)
+
+    async def retrieve_thread(self, thread_id: str):
+        return await AsyncThreadInterface.retrieve(self, thread_id)
+
+
+class AsyncThreadInterface:
+    @classmethod
+    async def create(cls, assistant_interface: AsyncAssistantInterface):
+        thread = await assistant_interface.client.beta.threads.create()
+        info("Created thread_id '%s'", thread.id)
+        return cls(assistant_interface, thread)
+
+    @classmethod
+    async def retrieve(cls, assistant_interface: AsyncAssistantInterface, thread_id: str):
+        thread = await assistant_interface.client.beta.threads.retrieve(thread_id=thread_id)
+        info("Retrieved thread_id '%s'", thread.id)
+        return cls(assistant_interface, thread)
+
+    def __init__(self, assistant_interface: AsyncAssistantInterface, thread: Thread):
+        self.assistant_interface = assistant_interface
+        self.thread = thread
+        self.client = self.assistant_interface.client
+
+    @property
+    def functions(self):
+        return self.assistant_interface.functions
+
+    async def send(self, mesg: str, stream: bool = True):
+        message = await self.add_message(mesg)
+        return await self.start_run(stream, after=message.id)
+
+    async def add_message(self, mesg: str):
+        return await self.client.beta.threads.messages.create(
+            thread_id=self.thread.id,
+            role="user",
+            content=mesg,
+        )
+
+    async def start_run(self, stream: bool = True, after: str | None = None):
+        if stream and self.assistant_interface.streaming:
+            try:
+                events = await self.client.beta.threads.runs.create(
+                    thread_id=self.thread.id,
+                    assistant_id=self.assistant_interface.assistant.id,
+                    stream=True,
+                )
+            except TypeError:
+                info("Streaming runs unavailable, falling back to polling")
+                self.assistant_interface.streaming = False
+            except openai.BadRequestError as err:
+                if not refuses_streaming(err):
+                    raise
+                info("Streaming runs refused, falling back to polling: %s", err.message)
+                self.assistant_interface.streaming = False
+            else:
+                return AsyncPendingOperation(self, None, stream=events, after=after)
+
+        run = await self.client.beta.threads.runs.create(
+            thread_id=self.thread.id,
+            assistant_id=self.assistant_interface.assistant.id,
+        )
+
+        return AsyncPendingOperation(self, run.id, after=after)
+
+    def attach(self, run_id: str):
+        return AsyncPendingOperation(self, run_id)
+
+    async def run_required_action(self, run: openai.types.beta.threads.Run, pending: "AsyncPendingOperation",
+                                  stream: bool = False):
+        with pending.metrics.timed("tools"):
+            outputs = await self.assistant_interface.executor.run(
+                self.functions,
+                run.required_action.submit_tool_outputs.tool_calls,
+                pending,
+            )
+            # Reducing large outputs is CPU-bound, so it's done off the event loop.
+            outputs = await asyncio.to_thread(
+                self.assistant_interface.budget.apply,
+                run.required_action.submit_tool_outputs.tool_calls, outputs, pending,
+            )
+
+        with pending.metrics.timed("submit"):
+            if stream:
+                return await self.client.beta.threads.runs.submit_tool_outputs(
+                    thread_id=self.thread.id,
+                    run_id=run.id,
+                    tool_outputs=outputs,
+                    stream=True,
+                )
+
+            await self.client.beta.threads.runs.submit_tool_outputs(
+                thread_id=self.thread.id,
+                run_id=run.id,
+                tool_outputs=outputs,
+            )
+
+
+class AsyncPendingOperation(FunctionEventHandler):
+    def __init__(self, thread_interface: AsyncThreadInterface, run_id, stream=None, after: str | None = None):
+        self.thread_interface = thread_interface
+        self.run_id = run_id
+        self._stream = stream
+        self.after = after
+        self._log_messages: list[str] = []
+        self._tool_calls: list[ToolCallTiming] = []
+        self.backoff = PollBackoff()
+        self.settings = thread_interface.assistant_interface.executor.settings
+        self.shells = thread_interface.assistant_interface.executor.shells
+        self.session = thread_interface.thread.id
+        self.metrics = RunMetrics(thread_interface.thread.id, thread_interface.assistant_interface.assistant.id)
+        self._tracked = False
+        self.retries = 0
+
+    def log(self, mesg: str):
+        self._log_messages.append(mesg)
+
+    def update(self, run: openai.types.beta.threads.Run):
+        """See `PendingOperation.update`."""
+        self.metrics.update(run)
+        runs = self.thread_interface.assistant_interface.runs
+        if runs is not None and (not self._tracked or run.status in TERMINAL_STATUSES):
+            self._tracked = runs.track(run)
+
+    def tool_call(self, name: str, seconds: float, success: bool):
+        self.metrics.tool_call(name, seconds, success)
+        self._tool_calls.append(ToolCallTiming(name, seconds, success))
+
+    async def restart(self, run: openai.types.beta.threads.Run):
+        """See `PendingOperation.restart`."""
+        delay = self.thread_interface.assistant_interface.run_policy.retry_after(run, self.retries)
+        if delay is None:
+            raise RunFailed(run)
+        self.retries += 1
+        self.log(f"Run {run.id} {run.status}; starting it again in {delay:.1f}s")
+        self.metrics.finish(run)
+        self.record_metrics()
+        self.metrics = RunMetrics(self.thread_interface.thread.id, self.thread_interface.assistant_interface.assistant.id)
+        await asyncio.sleep(delay)
+        new_run = await self.thread_interface.client.beta.threads.runs.create(
+            thread_id=self.thread_interface.thread.id,
+            assistant_id=self.thread_interface.assistant_interface.assistant.id,
+        )
+        self.run_id = new_run.id
+        self._tracked = False
+        self.backoff.reset()
+
+    def get_log_messages(self) -> list[str]:
+        log_messages = self._log_messages
+        if log_messages:
+            self._log_messages = []
+        return log_messages
+
+    def __aiter__(self) -> AsyncIterator[RunEvent]:
+        return self.events()
+
+    async def events(self) -> AsyncIterator[RunEvent]:
+        """See `PendingOperation.events`."""
+        if self._stream is not None:
+            events = self._stream_events()
+        else:
+            events = self._poll_events()
+        try:
+            async for event in events:
+                yield event
+        except RunFailed as err:
+            self.metrics.finish(err.run)
+            raise
+        except Exception:
+            self.metrics.finish(status="error")
+            raise
+        finally:
+            self.record_metrics()
+
+    def record_metrics(self):
+        self.metrics.finish()
+        store = self.thread_interface.assistant_interface.metrics
+        if store is not None:
+            store.record(self.metrics)
+
+    async def wait(self) -> list:
+        """Run to completion, returning the messages the run produced."""
+        return [event.data async for event in self.events() if event.kind == "message"]
+
+    def _log_events(self):
+        for mesg in self.get_log_messages():
+            yield RunEvent("log", mesg)
+        tool_calls, self._tool_calls = self._tool_calls, []
+        for timing in tool_calls:
+            yield RunEvent("tool", timing)
+
+    async def _stream_events(self) -> AsyncIterator[RunEvent]:
+        stream, self._stream = self._stream, None
+        while stream is not None:
+            next_stream = None
+            async for event in stream:
+                for update in translate_stream_event(event):
+                    if update.kind in ("status", "done"):
+                        self.update(update.data)
+                    if update.kind == "done":
+                        self.metrics.finish(update.data)
+                    yield update
+                    if update.kind == "done":
+                        return
+                    if update.kind == "status":
+                        self.run_id = update.data.id
+                        if update.data.status == "requires_action":
+                            next_stream = await self.thread_interface.run_required_action(
+                                update.data, self, stream=True)
+                            for log_event in self._log_events():
+                                yield log_event
+                        elif update.data.status in UNFINISHED_STATUSES:
+                            await self.restart(update.data)
+                            for log_event in self._log_events():
+                                yield log_event
+                            async for poll_event in self._poll_events():
+                                yield poll_event
+                            return
+            stream = next_stream
+
+    async def _poll_events(self) -> AsyncIterator[RunEvent]:
+        status = None
+        while True:
+            run = await self.thread_interface.client.beta.threads.runs.retrieve(
+                thread_id=self.thread_interface.thread.id,
+                run_id=self.run_id,
+            )
+            self.metrics.poll()
+            self.update(run)
+            if run.status != status:
+                status = run.status
+                self.backoff.reset()
+                yield RunEvent("status", run)
+
+            match run.status:
+                case "completed":
+                    with self.metrics.timed("response"):
+                        response = await self.get_response()
+                    self.metrics.finish(run)
+                    for message in response:
+                        yield RunEvent("message", message)
+                    yield RunEvent("done", run)
+                    return
+                case "requires_action":
+                    await self.thread_interface.run_required_action(run, self)
+                    for log_event in self._log_events():
+                        yield log_event
+                    self.backoff.reset()
+                    continue
+                case "failed" | "cancelled" | "expired":
+                    await self.restart(run)
+                    for log_event in self._log_events():
+                        yield log_event
+                    status = None
+                    continue
+                case "queued" | "in_progress" | "cancelling":
+                    pass
+                case _:
+                    raise ValueError(f"Unhandled status: {run.status}")
+            await asyncio.sleep(self.backoff.next_delay())
+
+    async def get_response(self) -> list[ThreadMessage]:
+        """Every message the run added, oldest first; see `PendingOperation.get_response`."""
+        messages = self.thread_interface.client.beta.threads.messages
+        newest_first = self.after is None
+        limit = 20 if newest_first else 100
+        if newest_first:
+            page = await messages.list(thread_id=self.thread_interface.thread.id, order="desc", limit=limit)
+        else:
+            page = await messages.list(
+                thread_id=self.thread_interface.thread.id, order="asc", after=self.after, limit=limit)
+        pages = [page]
+        # As in `iter_pages`, a short page is the last.
+        while len(page.data) == limit and not (
+                newest_first and any(message.run_id != self.run_id for message in page.data)):
+            page = await page.get_next_page()
+            pages.append(page)
+        return collect_response(pages, self.run_id, newest_first)
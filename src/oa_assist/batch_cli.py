@@ -0,0 +1,125 @@
+import asyncio
+import json
+import time
+from typing import IO, Iterator
+
+import click
+from rich.console import Console
+
+from .async_assistant import AsyncAssistantInterface, AsyncThreadInterface
+from .cache import ASSISTANT
+from .cli import cli, CLI
+from .client import get_async_client
+from .names import ObjectRef
+from .output import message_text
+from .tool_executor import AsyncToolExecutor
+
+
+def read_records(input: IO[str]) -> Iterator[tuple[int, str]]:
+    for lineno, line in enumerate(input, 1):
+        line = line.strip()
+        if line:
+            yield lineno, line
+
+
+def parse_record(line: str) -> dict:
+    record = json.loads(line)
+    if isinstance(record, str):
+        record = {"prompt": record}
+    return record
+
+
+class BatchRunner:
+    def __init__(self, assistant: AsyncAssistantInterface, output: IO[str], concurrency: int):
+        self.assistant = assistant
+        self.output = output
+        self.concurrency = concurrency
+        self.thread_locks: dict[str, asyncio.Lock] = {}
+        self.completed = 0
+        self.failed = 0
+
+    async def run(self, records: Iterator[tuple[int, str]]):
+        workers = [asyncio.create_task(self.worker(records)) for _ in range(max(1, self.concurrency))]
+        await asyncio.gather(*workers)
+
+    async def worker(self, records: Iterator[tuple[int, str]]):
+        for lineno, line in records:
+            result = await self.process(lineno, line)
+            self.output.write(json.dumps(result) + "\n")
+            self.output.flush()
+
+    async def process(self, lineno: int, line: str) -> dict:
+        start = time.monotonic()
+        result = {"id": lineno, "thread_id": None}
+        try:
+            record = parse_record(line)
+            result.update(id=record.get("id", lineno), thread_id=record.get("thread_id"))
+            prompt = record.get("prompt") or record["message"]
+            if result["thread_id"]:
+                lock = self.thread_locks.setdefault(result["thread_id"], asyncio.Lock())
+                async with lock:
+                    thread = await self.assistant.retrieve_thread(result["thread_id"])
+                    result.update(await self.send(thread, prompt))
+            else:
+                thread = await self.assistant.create_thread()
+                result["thread_id"] = thread.thread.id
+                result.update(await self.send(thread, prompt))
+            result["status"] = "completed"
+            self.completed += 1
+        except Exception as err:
+            result.update(status="failed", error=f"{type(err).__name__}: {err}")
+            self.failed += 1
+        result["elapsed"] = round(time.monotonic() - start, 3)
+        return result
+
+    async def send(self, thread: AsyncThreadInterface, prompt: str) -> dict:
+        op = await thread.send(prompt)
+        messages = await op.wait()
+        return {
+            "run_id": op.run_id,
+            "response": [text for message in messages for text in message_text(message)],
+        }
+
+
+@cli.command
+@click.argument("input", type=click.File("r"), default="-")
+@click.option("--output", "-o", type=click.File("w"), default="-",
+              help="Where to write JSONL results (default: stdout).")
+@click.option("--assistant", "-a", "assistant_id", type=ObjectRef(ASSISTANT),
+              help="Assistant to use (default: the selected one).")
+@click.option("--concurrency", "-j", default=8, show_default=True, help="Records processed at once.")
+@click.option("--max-retries", default=5, show_default=True, help="Retries per failed request.")
+@click.pass_obj
+def batch(obj: CLI, input: IO[str], output: IO[str], assistant_id: str | None, concurrency: int, max_retries: int):
+    """
+    Send each prompt in a JSONL file to its own thread.
+
+    Each INPUT line is either a JSON string or an object with a "prompt"
+    and optionally an "id" and a "thread_id" to continue. Results are
+    written as JSON lines as soon as each record completes.
+    """
+    assistant_id = assistant_id or obj.config.selected.assistant_id
+    if assistant_id is None:
+        raise click.ClickException("No assistant selected")
+
+    stderr = Console(stderr=True)
+
+    async def run():
+        client = get_async_client(obj.config.client.model_copy(update={"max_retries": max_retries}))
+        assistant = await AsyncAssistantInterface.retrieve(
+            client,
+            assistant_id,
+            obj.tools,
+            executor=AsyncToolExecutor(obj.config.tools),
+            metrics=obj.metrics,
+            runs=obj.runs,
+            run_policy=obj.config.runs,
+        )
+        runner = BatchRunner(assistant, output, concurrency)
+        await runner.run(read_records(input))
+        return runner
+
+    runner = asyncio.run(run())
+    stderr.print(f"Completed {runner.completed}, failed {runner.failed}.")
+    if runner.failed:
+        raise SystemExit(1)
@@ -0,0 +1,3 @@
+"""
+Benchmarks, run with `python -m oa_assist.benchmarks.<name>`.
+"""
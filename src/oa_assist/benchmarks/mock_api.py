@@ -0,0 +1,539 @@
+"""
+A local stand-in for the Assistants API, for offline benchmarks and manual testing.
+
+Implements enough of /v1 for oa-assist: assistants, threads, messages and
+runs, including `requires_action` tool calls, tool output submission,
+cancellation and streamed (server-sent event) runs. Runs move through
+queued and in_progress on a timer, latency can be added to every request
+and requests can be made to fail at random:
+
+    python -m oa_assist.benchmarks.mock_api --port 8765 --latency 0.05
+    oaa config set client.base_url http://127.0.0.1:8765/v1
+
+Request counts per endpoint are kept in `MockAPIServer.counts` and served
+from GET /_mock/stats.
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Iterable
+from urllib.parse import parse_qs, urlparse
+
+import pydantic
+
+
+class MockToolCall(pydantic.BaseModel):
+    name: str
+    arguments: dict[str, Any] = {}
+
+
+class MockSettings(pydantic.BaseModel):
+    # Added to every request, plus up to `jitter` at random.
+    latency: float = 0.0
+    jitter: float = 0.0
+    # How long a run stays queued, and in_progress before each step.
+    queue_time: float = 0.05
+    process_time: float = 0.1
+    # Tool calls every run asks for once before completing.
+    tool_calls: list[MockToolCall] = []
+    # The assistant's reply; {message} is the user's last message.
+    reply: str = "You said: **{message}**\n\n- one\n- two\n"
+    # Messages in each reply.
+    reply_messages: int = 1
+    # Fraction of requests answered with a 500 or a 429.
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: float = 0.1
+    # Fraction of runs that end as "failed".
+    run_failure_rate: float = 0.0
+    seed: int | None = None
+
+
+class _NotFound(Exception):
+    pass
+
+
+def _now() -> int:
+    return int(time.time())
+
+
+class MockState:
+    """The API objects, advanced lazily whenever a run is looked at."""
+
+    def __init__(self, settings: MockSettings):
+        self.settings = settings
+        self.random = random.Random(settings.seed)
+        self.lock = threading.RLock()
+        self.ids = itertools.count(1)
+        self.assistants: dict[str, dict] = {}
+        self.threads: dict[str, dict] = {}
+        self.messages: dict[str, list[dict]] = {}
+        self.runs: dict[str, dict] = {}
+        # Per run: when its current status started, and whether its tools ran.
+        self.run_state: dict[str, dict] = {}
+
+    def new_id(self, prefix: str) -> str:
+        return f"{prefix}_{next(self.ids):08d}"
+
+    def create_assistant(self, body: dict) -> dict:
+        assistant = {
+            "id": self.new_id("asst"),
+            "object": "assistant",
+            "created_at": _now(),
+            "name": body.get("name"),
+            "description": body.get("description"),
+            "model": body.get("model", "gpt-4-1106-preview"),
+            "instructions": body.get("instructions"),
+            "tools": body.get("tools", []),
+            "file_ids": body.get("file_ids", []),
+            "metadata": body.get("metadata", {}),
+        }
+        self.assistants[assistant["id"]] = assistant
+        return assistant
+
+    def create_thread(self, body: dict) -> dict:
+        thread = {
+            "id": self.new_id("thread"),
+            "object": "thread",
+            "created_at": _now(),
+            "metadata": body.get("metadata", {}),
+        }
+        self.threads[thread["id"]] = thread
+        self.messages[thread["id"]] = []
+        for message in body.get("messages", []):
+            self.add_message(thread["id"], message)
+        return thread
+
+    def thread(self, thread_id: str) -> dict:
+        if thread_id not in self.threads:
+            raise _NotFound(f"No thread found with id '{thread_id}'.")
+        return self.threads[thread_id]
+
+    def add_message(self, thread_id: str, body: dict, role: str = "user",
+                    assistant_id: str | None = None, run_id: str | None = None) -> dict:
+        self.thread(thread_id)
+        message = {
+            "id": self.new_id("msg"),
+            "object": "thread.message",
+            "created_at": _now(),
+            "thread_id": thread_id,
+            "role": body.get("role", role),
+            "content": [{"type": "text", "text": {"value": body["content"], "annotations": []}}],
+            "assistant_id": assistant_id,
+            "run_id": run_id,
+            "file_ids": body.get("file_ids", []),
+            "metadata": body.get("metadata", {}),
+        }
+        self.messages[thread_id].append(message)
+        return message
+
+    def list_messages(self, thread_id: str, query: dict[str, str]) -> dict:
+        self.thread(thread_id)
+        return _paginate(self.messages[thread_id], query)
+
+    def create_run(self, thread_id: str, body: dict) -> dict:
+        self.thread(thread_id)
+        if body["assistant_id"] not in self.assistants:
+            raise _NotFound(f"No assistant found with id '{body['assistant_id']}'.")
+        assistant = self.assistants[body["assistant_id"]]
+        run = {
+            "id": self.new_id("run"),
+            "object": "thread.run",
+            "created_at": _now(),
+            "thread_id": thread_id,
+            "assistant_id": assistant["id"],
+            "status": "queued",
+            "required_action": None,
+            "last_error": None,
+            "expires_at": _now() + 600,
+            "started_at": None,
+            "cancelled_at": None,
+            "failed_at": None,
+            "completed_at": None,
+            "model": assistant["model"],
+            "instructions": assistant["instructions"] or "",
+            "tools": assistant["tools"],
+            "file_ids": [],
+            "metadata": body.get("metadata", {}),
+            "usage": None,
+        }
+        self.runs[run["id"]] = run
+        self.run_state[run["id"]] = {"since": time.monotonic(), "tools_done": not self.settings.tool_calls}
+        return run
+
+    def run(self, thread_id: str, run_id: str) -> dict:
+        run = self.runs.get(run_id)
+        if run is None or run["thread_id"] != thread_id:
+            raise _NotFound(f"No run found with id '{run_id}'.")
+        return run
+
+    def _duration(self, run: dict) -> float | None:
+        match run["status"]:
+            case "queued":
+                return self.settings.queue_time
+            case "in_progress":
+                return self.settings.process_time
+        return None
+
+    def remaining(self, run: dict) -> float | None:
+        """Seconds until the run's next status change, or None if it's waiting on the client or done."""
+        duration = self._duration(run)
+        if duration is None:
+            return None
+        return max(0.0, duration - (time.monotonic() - self.run_state[run["id"]]["since"]))
+
+    def advance(self, run: dict, steps: int | None = None) -> dict:
+        """Move a run on as far as the elapsed time allows, or by at most `steps` statuses."""
+        state = self.run_state[run["id"]]
+        for _ in itertools.repeat(None) if steps is None else range(steps):
+            if self.remaining(run) != 0.0:
+                break
+            state["since"] += self._duration(run)
+            if run["status"] == "queued":
+                run["status"] = "in_progress"
+                run["started_at"] = _now()
+            elif not state["tools_done"]:
+                run["status"] = "requires_action"
+                run["required_action"] = {
+                    "type": "submit_tool_outputs",
+                    "submit_tool_outputs": {"tool_calls": [
+                        {
+                            "id": self.new_id("call"),
+                            "type": "function",
+                            "function": {"name": call.name, "arguments": json.dumps(call.arguments)},
+                        }
+                        for call in self.settings.tool_calls
+                    ]},
+                }
+            elif self.random.random() < self.settings.run_failure_rate:
+                run["status"] = "failed"
+                run["failed_at"] = _now()
+                run["last_error"] = {"code": "server_error", "message": "Injected run failure."}
+            else:
+                self.complete(run)
+        return run
+
+    def complete(self, run: dict):
+        last = next((m for m in reversed(self.messages[run["thread_id"]]) if m["role"] == "user"), None)
+        text = last["content"][0]["text"]["value"] if last else ""
+        for _ in range(self.settings.reply_messages):
+            self.add_message(run["thread_id"], {"content": self.settings.reply.format(message=text)},
+                             role="assistant", assistant_id=run["assistant_id"], run_id=run["id"])
+        run["status"] = "completed"
+        run["completed_at"] = _now()
+        run["usage"] = {"prompt_tokens": len(text.split()) + 50, "completion_tokens": 20}
+        run["usage"]["total_tokens"] = run["usage"]["prompt_tokens"] + run["usage"]["completion_tokens"]
+
+    def submit_tool_outputs(self, run: dict, body: dict) -> dict:
+        if run["status"] != "requires_action":
+            raise ValueError(f"Runs in status \"{run['status']}\" do not accept tool outputs.")
+        expected = {call["id"] for call in run["required_action"]["submit_tool_outputs"]["tool_calls"]}
+        given = {output["tool_call_id"] for output in body.get("tool_outputs", [])}
+        if given != expected:
+            raise ValueError(f"Expected tool outputs for {sorted(expected)}, got {sorted(given)}.")
+        run["status"] = "in_progress"
+        run["required_action"] = None
+        self.run_state[run["id"]].update(since=time.monotonic(), tools_done=True)
+        return run
+
+    def cancel(self, run: dict) -> dict:
+        if run["status"] in ("queued", "in_progress", "requires_action"):
+            run["status"] = "cancelled"
+            run["cancelled_at"] = _now()
+            run["required_action"] = None
+        return run
+
+
+def _paginate(items: Iterable[dict], query: dict[str, str]) -> dict:
+    """A page of `items` (oldest first) as selected by the order, after, before and limit parameters."""
+    items = list(items)
+    if query.get("order", "desc") == "desc":
+        items.reverse()
+    ids = [item["id"] for item in items]
+    if "after" in query and query["after"] in ids:
+        items = items[ids.index(query["after"]) + 1:]
+    if "before" in query and query["before"] in ids:
+        items = items[:ids.index(query["before"])]
+    data = items[:int(query.get("limit", 20))]
+    return {
+        "object": "list",
+        "data": data,
+        "first_id": data[0]["id"] if data else None,
+        "last_id": data[-1]["id"] if data else None,
+        "has_more": len(items) > len(data),
+    }
+
+
+Route = tuple[str, re.Pattern, str]
+ROUTES: list[Route] = [
+    (method, re.compile(f"^/v1{pattern}$"), name)
+    for method, pattern, name in [
+        ("POST", r"/assistants", "create_assistant"),
+        ("GET", r"/assistants", "list_assistants"),
+        ("GET", r"/assistants/(?P<assistant_id>[^/]+)", "retrieve_assistant"),
+        ("POST", r"/assistants/(?P<assistant_id>[^/]+)", "modify_assistant"),
+        ("DELETE", r"/assistants/(?P<assistant_id>[^/]+)", "delete_assistant"),
+        ("POST", r"/threads", "create_thread"),
+        ("GET", r"/threads/(?P<thread_id>[^/]+)", "retrieve_thread"),
+        ("DELETE", r"/threads/(?P<thread_id>[^/]+)", "delete_thread"),
+        ("POST", r"/threads/(?P<thread_id>[^/]+)/messages", "create_message"),
+        ("GET", r"/threads/(?P<thread_id>[^/]+)/messages", "list_messages"),
+        ("POST", r"/threads/(?P<thread_id>[^/]+)/runs", "create_run"),
+        ("GET", r"/threads/(?P<thread_id>[^/]+)/runs", "list_runs"),
+        ("GET", r"/threads/(?P<thread_id>[^/]+)/runs/(?P<run_id>[^/]+)", "retrieve_run"),
+        ("POST", r"/threads/(?P<thread_id>[^/]+)/runs/(?P<run_id>[^/]+)/submit_tool_outputs", "submit_tool_outputs"),
+        ("POST", r"/threads/(?P<thread_id>[^/]+)/runs/(?P<run_id>[^/]+)/cancel", "cancel_run"),
+    ]
+]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; don't let Nagle delay the body.
+    disable_nagle_algorithm = True
+    server: "MockAPIServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def send_json(self, status: int, body: dict, headers: dict[str, str] = {}):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status: int, message: str, kind: str, headers: dict[str, str] = {}):
+        self.send_json(status, {"error": {"message": message, "type": kind, "param": None, "code": None}}, headers)
+
+    def dispatch(self, method: str):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if url.path == "/_mock/stats":
+            return self.send_json(200, dict(self.server.counts))
+        if url.path == "/_mock/reset" and method == "POST":
+            self.server.reset_counts()
+            return self.send_json(200, {})
+
+        for route_method, pattern, name in ROUTES:
+            match = pattern.match(url.path)
+            if match and route_method == method:
+                break
+        else:
+            return self.send_error_json(404, f"Unknown request URL: {method} {url.path}.", "invalid_request_error")
+
+        settings = self.server.settings
+        with self.server.lock:
+            self.server.counts[name] += 1
+            roll = self.server.state.random.random()
+            delay = settings.latency + settings.jitter * self.server.state.random.random()
+        if delay:
+            time.sleep(delay)
+        if roll < settings.error_rate:
+            return self.send_error_json(500, "Injected server error.", "server_error")
+        if roll < settings.error_rate + settings.rate_limit_rate:
+            return self.send_error_json(429, "Injected rate limit.", "rate_limit_error",
+                                        {"Retry-After": str(settings.retry_after)})
+
+        handler: Callable = getattr(self, f"handle_{name}")
+        try:
+            handler(body=body, query=query, **match.groupdict())
+        except _NotFound as err:
+            self.send_error_json(404, str(err), "invalid_request_error")
+        except (KeyError, ValueError) as err:
+            self.send_error_json(400, str(err), "invalid_request_error")
+
+    @property
+    def state(self) -> MockState:
+        return self.server.state
+
+    def handle_create_assistant(self, body, query):
+        with self.server.lock:
+            self.send_json(200, self.state.create_assistant(body))
+
+    def handle_list_assistants(self, body, query):
+        with self.server.lock:
+            self.send_json(200, _paginate(self.state.assistants.values(), query))
+
+    def handle_retrieve_assistant(self, body, query, assistant_id):
+        with self.server.lock:
+            if assistant_id not in self.state.assistants:
+                raise _NotFound(f"No assistant found with id '{assistant_id}'.")
+            self.send_json(200, self.state.assistants[assistant_id])
+
+    def handle_modify_assistant(self, body, query, assistant_id):
+        with self.server.lock:
+            if assistant_id not in self.state.assistants:
+                raise _NotFound(f"No assistant found with id '{assistant_id}'.")
+            assistant = self.state.assistants[assistant_id]
+            assistant.update({key: value for key, value in body.items() if key in assistant and key != "id"})
+            self.send_json(200, assistant)
+
+    def handle_delete_assistant(self, body, query, assistant_id):
+        with self.server.lock:
+            deleted = self.state.assistants.pop(assistant_id, None) is not None
+        self.send_json(200, {"id": assistant_id, "object": "assistant.deleted", "deleted": deleted})
+
+    def handle_create_thread(self, body, query):
+        with self.server.lock:
+            self.send_json(200, self.state.create_thread(body))
+
+    def handle_retrieve_thread(self, body, query, thread_id):
+        with self.server.lock:
+            self.send_json(200, self.state.thread(thread_id))
+
+    def handle_delete_thread(self, body, query, thread_id):
+        with self.server.lock:
+            deleted = self.state.threads.pop(thread_id, None) is not None
+        self.send_json(200, {"id": thread_id, "object": "thread.deleted", "deleted": deleted})
+
+    def handle_create_message(self, body, query, thread_id):
+        with self.server.lock:
+            self.send_json(200, self.state.add_message(thread_id, body))
+
+    def handle_list_messages(self, body, query, thread_id):
+        with self.server.lock:
+            self.send_json(200, self.state.list_messages(thread_id, query))
+
+    def handle_create_run(self, body, query, thread_id):
+        with self.server.lock:
+            run = self.state.create_run(thread_id, body)
+        if body.get("stream"):
+            return self.stream_run(run)
+        self.send_json(200, run)
+
+    def handle_list_runs(self, body, query, thread_id):
+        with self.server.lock:
+            self.state.thread(thread_id)
+            runs = [self.state.advance(run) for run in self.state.runs.values() if run["thread_id"] == thread_id]
+            self.send_json(200, _paginate(runs, query))
+
+    def handle_retrieve_run(self, body, query, thread_id, run_id):
+        with self.server.lock:
+            self.send_json(200, self.state.advance(self.state.run(thread_id, run_id)))
+
+    def handle_submit_tool_outputs(self, body, query, thread_id, run_id):
+        with self.server.lock:
+            run = self.state.submit_tool_outputs(self.state.advance(self.state.run(thread_id, run_id)), body)
+        if body.get("stream"):
+            return self.stream_run(run, created=False)
+        self.send_json(200, run)
+
+    def handle_cancel_run(self, body, query, thread_id, run_id):
+        with self.server.lock:
+            self.send_json(200, self.state.cancel(self.state.advance(self.state.run(thread_id, run_id))))
+
+    def stream_run(self, run: dict, created: bool = True):
+        """Answer with server-sent events until the run completes or needs tool outputs."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send(event: str, data: Any):
+            self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+            self.wfile.flush()
+
+        if created:
+            send("thread.run.created", run)
+        send(f"thread.run.{run['status']}", run)
+        while (remaining := self.state.remaining(run)) is not None:
+            time.sleep(remaining)
+            with self.server.lock:
+                messages = self.state.messages[run["thread_id"]]
+                count = len(messages)
+                self.state.advance(run, steps=1)
+                snapshot = json.loads(json.dumps(run))
+                new = messages[count:]
+            for message in new:
+                text = message["content"][0]["text"]["value"]
+                for word in re.findall(r"\S+\s*", text):
+                    send("thread.message.delta", {
+                        "id": message["id"],
+                        "object": "thread.message.delta",
+                        "delta": {"content": [{"index": 0, "type": "text", "text": {"value": word}}]},
+                    })
+                send("thread.message.completed", message)
+            send(f"thread.run.{snapshot['status']}", snapshot)
+        self.wfile.write(b"event: done\ndata: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class MockAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, settings: MockSettings = MockSettings(), host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.settings = settings
+        self.state = MockState(settings)
+        self.lock = self.state.lock
+        self.counts: Counter[str] = Counter()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def reset_counts(self):
+        with self.lock:
+            self.counts.clear()
+
+    def start(self) -> "MockAPIServer":
+        """Serve from a background thread."""
+        threading.Thread(target=self.serve_forever, name="mock-api", daemon=True).start()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--settings", metavar="JSON", default="{}",
+                        help='MockSettings as JSON, e.g. \'{"tool_calls": [{"name": "read_file", ...}]}\'')
+    for name in ("latency", "jitter", "queue_time", "process_time", "error_rate", "rate_limit_rate",
+                 "run_failure_rate"):
+        parser.add_argument(f"--{name.replace('_', '-')}", type=float, dest=name)
+    opts = parser.parse_args(argv)
+
+    overrides = {name: value for name, value in vars(opts).items()
+                 if name in MockSettings.model_fields and value is not None}
+    settings = MockSettings.model_validate({**json.loads(opts.settings), **overrides})
+    server = MockAPIServer(settings, opts.host, opts.port)
+    print(f"Serving the mock Assistants API on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
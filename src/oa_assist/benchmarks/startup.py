@@ -0,0 +1,111 @@
+"""
+Measure how long `oaa` takes to start.
+
+Runs the CLI in fresh interpreters and reports the median wall time, and
+optionally fails if it exceeds a threshold or if a module that should stay
+off the startup path (openai by default) was imported:
+
+    python -m oa_assist.benchmarks.startup --max-ms 150 -- thread list
+
+Use --importtime to print the slowest imports reported by `python -X importtime`.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROBE = """\
+import sys
+from oa_assist.main import main
+sys.argv[0] = "oaa"
+try:
+    main()
+except SystemExit:
+    pass
+print("\\0" + ",".join(sorted(sys.modules)), file=sys.stderr)
+"""
+
+
+def run_once(args: list[str], env: dict[str, str]) -> tuple[float, set[str]]:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE, *args],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+    modules = proc.stderr.rpartition("\0")[2].strip().split(",")
+    return elapsed, set(modules)
+
+
+def interpreter_startup() -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"])
+    return (time.perf_counter() - start) * 1000
+
+
+def import_times(args: list[str], env: dict[str, str], top: int) -> list[tuple[int, str]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE, *args],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    times = []
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                times.append((int(cumulative), name.rstrip()))
+    return sorted(times, reverse=True)[:top]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", "-n", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, help="Fail if the median exceeds this many milliseconds.")
+    parser.add_argument("--forbid", action="append", default=None,
+                        help="Fail if this module is imported (default: openai).")
+    parser.add_argument("--importtime", type=int, metavar="N", help="Show the N slowest imports.")
+    parser.add_argument("command", nargs="*", default=["--help"])
+    opts = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    # A placeholder key keeps commands that build a client from failing early.
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+
+    run_once(opts.command, env)  # Warm the bytecode and filesystem caches.
+    samples = []
+    modules: set[str] = set()
+    for _ in range(opts.repeat):
+        elapsed, modules = run_once(opts.command, env)
+        samples.append(elapsed)
+
+    baseline = statistics.median(interpreter_startup() for _ in range(opts.repeat))
+    median = statistics.median(samples)
+    print(f"python -c pass: median {baseline:.1f} ms")
+    print(f"oaa {' '.join(opts.command)}: median {median:.1f} ms, "
+          f"min {min(samples):.1f} ms, max {max(samples):.1f} ms ({opts.repeat} runs)")
+
+    if opts.importtime:
+        for cumulative, name in import_times(opts.command, env, opts.importtime):
+            print(f"{cumulative / 1000:10.1f} ms  {name}")
+
+    failed = False
+    for module in opts.forbid if opts.forbid is not None else ["openai"]:
+        if module in modules:
+            print(f"FAIL: '{module}' was imported")
+            failed = True
+    if opts.max_ms is not None and median > opts.max_ms:
+        print(f"FAIL: median {median:.1f} ms exceeds {opts.max_ms:.1f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+End-to-end benchmarks against the mock Assistants API in `mock_api`.
+
+Measures, without touching the network:
+
+  - turn latency: sending a message and rendering the reply through the
+    chat path (`chat.send_cmd`), with a tool call in every run;
+  - requests per turn, as counted by the mock server;
+  - throughput of the asyncio interfaces with many threads at once;
+  - CLI start-up time of `oaa thread list` (see `startup`).
+
+Results can be saved as a baseline and later runs compared against it;
+any metric that is worse than the baseline by more than the tolerance
+makes the exit status non-zero, so CI can fail on regressions:
+
+    python -m oa_assist.benchmarks.turns --save baseline.json
+    python -m oa_assist.benchmarks.turns --baseline baseline.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from .mock_api import MockAPIServer, MockSettings, MockToolCall
+from . import startup
+
+# Metric name: (description, True if higher is better).
+METRICS = {
+    "turn_p50_ms": ("median turn latency", False),
+    "turn_p90_ms": ("90th percentile turn latency", False),
+    "requests_per_turn": ("API requests per turn", False),
+    "throughput_turns_per_s": ("concurrent turns per second", True),
+    "startup_ms": ("median CLI start-up time", False),
+}
+
+
+def mock_settings(opts: argparse.Namespace) -> MockSettings:
+    return MockSettings(
+        latency=opts.latency,
+        queue_time=opts.queue_time,
+        process_time=opts.process_time,
+        tool_calls=[MockToolCall(name="read_file", arguments={"path": "bench.txt"})] * opts.tool_calls,
+        seed=0,
+    )
+
+
+@contextmanager
+def workspace():
+    """Run in a scratch directory holding the file the mock tool calls read."""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as path:
+        Path(path, "bench.txt").write_text("benchmark\n" * 100)
+        os.chdir(path)
+        try:
+            yield
+        finally:
+            os.chdir(cwd)
+
+
+def bench_turns(server: MockAPIServer, turns: int) -> dict[str, float]:
+    from rich.console import Console
+
+    from ..assistant import AssistantInterface
+    from ..chat import send_cmd
+    from ..client import ClientSettings, get_client
+    from ..tool_executor import ToolExecutor
+    from ..tool_functions import DEFAULT_FUNCTIONS
+
+    client = get_client(ClientSettings(base_url=server.base_url, max_retries=0))
+    assistant = AssistantInterface(
+        client, client.beta.assistants.create(model="mock"), DEFAULT_FUNCTIONS, executor=ToolExecutor(),
+    )
+    thread = assistant.create_thread()
+    console = Console(file=io.StringIO(), force_terminal=False, width=100)
+
+    send_cmd(console, thread, "warm up")
+    server.reset_counts()
+    samples = []
+    for turn in range(turns):
+        start = time.perf_counter()
+        send_cmd(console, thread, f"turn {turn}")
+        samples.append((time.perf_counter() - start) * 1000)
+    assistant.executor.shutdown()
+
+    quantiles = statistics.quantiles(samples, n=10) if len(samples) > 1 else samples * 9
+    return {
+        "turn_p50_ms": statistics.median(samples),
+        "turn_p90_ms": quantiles[8],
+        "requests_per_turn": sum(server.counts.values()) / turns,
+    }
+
+
+def bench_throughput(server: MockAPIServer, concurrency: int, turns: int) -> dict[str, float]:
+    from ..async_assistant import AsyncAssistantInterface
+    from ..client import ClientSettings, get_async_client
+    from ..tool_executor import AsyncToolExecutor
+    from ..tool_functions import DEFAULT_FUNCTIONS
+
+    async def run() -> float:
+        client = get_async_client(ClientSettings(base_url=server.base_url, max_retries=0))
+        assistant = AsyncAssistantInterface(
+            client, await client.beta.assistants.create(model="mock"), DEFAULT_FUNCTIONS,
+            executor=AsyncToolExecutor(),
+        )
+
+        async def worker(index: int):
+            thread = await assistant.create_thread()
+            for turn in range(turns):
+                await (await thread.send(f"worker {index} turn {turn}")).wait()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(index) for index in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        await client.close()
+        return elapsed
+
+    elapsed = asyncio.run(run())
+    return {"throughput_turns_per_s": concurrency * turns / elapsed}
+
+
+def bench_startup(repeat: int) -> dict[str, float]:
+    # A command that shouldn't need openai, with an empty config and cache.
+    command = ["thread", "list"]
+    env = dict(os.environ, HOME=os.getcwd(), OAA_NO_DAEMON="1")
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    startup.run_once(command, env)
+    return {"startup_ms": statistics.median(startup.run_once(command, env)[0] for _ in range(repeat))}
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], tolerance: float) -> list[str]:
+    """Descriptions of the metrics that regressed by more than `tolerance` (a fraction)."""
+    regressions = []
+    for name, (description, higher_is_better) in METRICS.items():
+        if name not in results or not baseline.get(name):
+            continue
+        change = (results[name] - baseline[name]) / baseline[name]
+        if higher_is_better:
+            change = -change
+        if change > tolerance:
+            regressions.append(
+                f"{description} ({name}): {results[name]:.2f} vs baseline {baseline[name]:.2f}, "
+                f"{change:.0%} worse"
+            )
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--concurrent-turns", type=int, default=3, help="Turns per concurrent thread.")
+    parser.add_argument("--tool-calls", type=int, default=1, help="Tool calls requested by each run.")
+    parser.add_argument("--latency", type=float, default=0.005, help="Mock API latency per request.")
+    parser.add_argument("--queue-time", type=float, default=0.02)
+    parser.add_argument("--process-time", type=float, default=0.05)
+    parser.add_argument("--startup-repeat", type=int, default=5, help="0 to skip the start-up benchmark.")
+    parser.add_argument("--baseline", type=Path, help="Fail if results regress from this file.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression as a fraction.")
+    parser.add_argument("--save", type=Path, help="Write the results here, e.g. as a new baseline.")
+    opts = parser.parse_args(argv)
+
+    # The mock server doesn't check it, but the client needs one.
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+    results: dict[str, float] = {}
+    with workspace():
+        with MockAPIServer(mock_settings(opts)) as server:
+            results.update(bench_turns(server, opts.turns))
+            results.update(bench_throughput(server, opts.concurrency, opts.concurrent_turns))
+        if opts.startup_repeat:
+            results.update(bench_startup(opts.startup_repeat))
+
+    for name, value in results.items():
+        print(f"{METRICS[name][0]:>30}: {value:10.2f}  ({name})")
+
+    if opts.save:
+        opts.save.write_text(json.dumps(results, indent=2) + "\n")
+
+    if opts.baseline:
+        regressions = compare(results, json.loads(opts.baseline.read_text()), opts.tolerance)
+        for regression in regressions:
+            print(f"FAIL: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
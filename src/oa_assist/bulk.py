@@ -0,0 +1,69 @@
+"""
+Concurrent API calls for bulk commands.
+
+Calls run on a thread pool sharing the process's client, and with it the
+connection pool and request scheduler (see `scheduler`), so hundreds of
+deletes or status checks go out `concurrency` at a time while still
+backing off together when the API pushes back. Outcomes are yielded as
+they complete so that commands can show progress as it happens.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Generic, Iterable, Iterator, NamedTuple, TypeVar
+
+Item = TypeVar("Item")
+
+
+class Outcome(NamedTuple, Generic[Item]):
+    item: Item
+    result: Any = None
+    error: Exception | None = None
+
+
+def run_concurrently(func: Callable[[Item], Any], items: Iterable[Item], concurrency: int = 8) -> Iterator[Outcome]:
+    """Call `func` on every item, yielding each outcome as soon as it's known."""
+    items = list(items)
+    if not items:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items)))) as pool:
+        futures = {pool.submit(func, item): item for item in items}
+        try:
+            for future in as_completed(futures):
+                error = future.exception()
+                yield Outcome(futures[future], None if error else future.result(), error)
+        finally:
+            # When the caller stops early (e.g. Ctrl-C), don't start the rest.
+            for future in futures:
+                future.cancel()
+
+
+class Cell:
+    """A table cell whose text can change while the table is shown in a `rich.live.Live`."""
+
+    def __init__(self, text: str = "", style: str = ""):
+        self.text = text
+        self.style = style
+
+    def set(self, text: str, style: str = ""):
+        self.text = text
+        self.style = style
+
+    def __rich__(self):
+        from rich.text import Text
+        return Text(self.text, style=self.style)
+
+
+def delete_all(console, noun: str, ids: list[str], delete: Callable[[str], Any], concurrency: int = 8) -> list[str]:
+    """Delete `ids` concurrently, reporting each as it's done; returns those that are gone."""
+    gone = []
+    with console.status(f"Deleting {len(ids)} {noun}s...") as status:
+        for done, outcome in enumerate(run_concurrently(delete, ids, concurrency), 1):
+            if outcome.error is None:
+                gone.append(outcome.item)
+                console.print(f"Deleted {noun} [bold]{outcome.item}[/bold].")
+            elif getattr(outcome.error, "status_code", None) == 404:
+                gone.append(outcome.item)
+                console.print(f"No {noun} [bold]{outcome.item}[/bold]; forgetting it.")
+            else:
+                console.print(f"[red]Couldn't delete {noun} [bold]{outcome.item}[/bold]: {outcome.error}[/red]")
+            status.update(f"Deleting {noun}s... {done}/{len(ids)}")
+    return gone
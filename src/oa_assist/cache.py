@@ -0,0 +1,234 @@
+"""
+Local cache of API objects.
+
+Assistants, threads and messages are stored as JSON in a SQLite database
+so repeated commands can skip the network. Every object and every listing
+("sync") records when it was fetched; callers treat anything older than
+the TTL as stale and refresh it, but stale objects are never evicted since
+the cache is also the only record of which threads we know about.
+
+Assistant names and user labels are indexed alongside the objects (see
+`names`), so that they can be resolved to ids without listing anything.
+"""
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, Literal, TypeVar
+
+import pydantic
+
+CACHE_PATH = Path("~/.cache/oa-assist/cache.db").expanduser()
+
+ASSISTANT = "assistant"
+THREAD = "thread"
+MESSAGE = "message"
+TOOL = "tool"
+RUN = "run"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    parent TEXT,
+    created_at INTEGER,
+    fetched_at REAL NOT NULL,
+    data TEXT NOT NULL,
+    -- Order among the parent's children as the API lists them, which
+    -- created_at (in seconds) doesn't always settle.
+    position INTEGER,
+    PRIMARY KEY (kind, id)
+);
+CREATE INDEX IF NOT EXISTS objects_parent ON objects (kind, parent, created_at);
+CREATE TABLE IF NOT EXISTS syncs (
+    key TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL,
+    cursor TEXT
+);
+CREATE TABLE IF NOT EXISTS names (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (kind, id, source)
+);
+CREATE INDEX IF NOT EXISTS names_key ON names (kind, key);
+"""
+
+# Where a name comes from: the object itself, or the user's labels.
+NAME = "name"
+LABEL = "label"
+
+Model = TypeVar("Model", bound=pydantic.BaseModel)
+
+# Children of a parent in the order the API lists them.
+_CHILD_ORDER = "created_at {0}, COALESCE(position, 0) {0}, rowid {0}"
+
+
+class ObjectCache:
+    def __init__(self, path: Path = CACHE_PATH, ttl: float = 300.0):
+        self.path = path
+        self.ttl = ttl
+        self._db: sqlite3.Connection | None = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+            if "position" not in {column for _, column, *_ in self._db.execute("PRAGMA table_info(objects)")}:
+                # A cache created before positions were recorded.
+                self._db.execute("ALTER TABLE objects ADD COLUMN position INTEGER")
+        return self._db
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _fresh(self, fetched_at: float, max_age: float | None) -> bool:
+        max_age = self.ttl if max_age is None else max_age
+        return time.time() - fetched_at < max_age
+
+    def get(self, kind: str, id: str, model: type[Model], max_age: float | None = None) -> Model | None:
+        """Return the cached object, or None if it is missing or stale."""
+        row = self.db.execute(
+            "SELECT data, fetched_at FROM objects WHERE kind = ? AND id = ?", (kind, id)
+        ).fetchone()
+        if row is None or not self._fresh(row[1], max_age):
+            return None
+        return model.model_validate_json(row[0])
+
+    def find(self, kind: str, model: type[Model], **fields) -> Model | None:
+        """Return the newest cached object whose JSON fields match, stale or not."""
+        where = " AND ".join(f"json_extract(data, '$.{name}') = ?" for name in fields)
+        row = self.db.execute(
+            f"SELECT data FROM objects WHERE kind = ? AND {where} ORDER BY created_at DESC LIMIT 1",
+            (kind, *fields.values()),
+        ).fetchone()
+        return model.model_validate_json(row[0]) if row else None
+
+    def page(self, kind: str, model: type[Model], parent: str, before: str | None = None,
+             limit: int = 20) -> list[Model]:
+        """The newest `limit` children of `parent` preceding `before` (or all), oldest first."""
+        query = "SELECT data FROM objects WHERE kind = ? AND parent = ?"
+        params: tuple = (kind, parent)
+        if before is not None:
+            query += (
+                " AND (created_at, COALESCE(position, 0), rowid) < "
+                "(SELECT created_at, COALESCE(position, 0), rowid FROM objects WHERE kind = ? AND id = ?)"
+            )
+            params += (kind, before)
+        rows = self.db.execute(f"{query} ORDER BY {_CHILD_ORDER.format('DESC')} LIMIT ?", (*params, limit))
+        return [model.model_validate_json(data) for data, in reversed(rows.fetchall())]
+
+    def list(self, kind: str, model: type[Model] | None, parent: str | None = None,
+             reverse: bool = False) -> list[Model] | list[dict]:
+        """Cached objects of a kind, oldest first; as plain dicts when `model` is None."""
+        order = "DESC" if reverse else "ASC"
+        query = "SELECT data FROM objects WHERE kind = ?"
+        params: tuple = (kind,)
+        if parent is not None:
+            query += " AND parent = ?"
+            params += (parent,)
+        rows = self.db.execute(f"{query} ORDER BY {_CHILD_ORDER.format(order)}", params)
+        if model is None:
+            return [json.loads(data) for data, in rows]
+        return [model.model_validate_json(data) for data, in rows]
+
+    def put(self, kind: str, obj: pydantic.BaseModel, parent: str | None = None):
+        self.put_many(kind, [obj], parent)
+
+    def put_many(self, kind: str, objs: Iterable[pydantic.BaseModel], parent: str | None = None,
+                 position: Literal["after", "before"] | None = None):
+        """
+        Store objects. With `position`, `objs` are a run of the parent's
+        children in the API's order, oldest first, that come after or
+        before the ones already cached; objects already cached keep their
+        place.
+        """
+        objs = list(objs)
+        now = time.time()
+        with self.db:
+            positions = [None] * len(objs)
+            if position is not None:
+                first, last = self.db.execute(
+                    "SELECT MIN(position), MAX(position) FROM objects WHERE kind = ? AND parent = ?", (kind, parent)
+                ).fetchone()
+                start = (last or 0) + 1 if position == "after" else (first or 0) - len(objs)
+                positions = range(start, start + len(objs))
+            self.db.executemany(
+                "INSERT INTO objects (kind, id, parent, created_at, fetched_at, data, position) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (kind, id) DO UPDATE SET "
+                "parent = excluded.parent, fetched_at = excluded.fetched_at, data = excluded.data, "
+                "position = COALESCE(position, excluded.position)",
+                [
+                    (kind, obj.id, parent, getattr(obj, "created_at", None), now, obj.model_dump_json(), pos)
+                    for obj, pos in zip(objs, positions)
+                ],
+            )
+            self._index_names(kind, objs)
+
+    def _index_names(self, kind: str, objs: Iterable[pydantic.BaseModel]):
+        named = [obj for obj in objs if hasattr(obj, "name")]
+        if not named:
+            return
+        # Replacing rather than upserting drops the names of objects renamed to None.
+        self.db.executemany(
+            "DELETE FROM names WHERE kind = ? AND id = ? AND source = ?", [(kind, obj.id, NAME) for obj in named])
+        self.db.executemany(
+            "INSERT INTO names (kind, id, source, name, key) VALUES (?, ?, ?, ?, ?)",
+            [(kind, obj.id, NAME, obj.name, obj.name.casefold()) for obj in named if obj.name],
+        )
+
+    def replace_all(self, kind: str, objs: Iterable[pydantic.BaseModel]):
+        """Store a complete listing, dropping cached objects it no longer contains."""
+        objs = list(objs)
+        with self.db:
+            self.db.execute("CREATE TEMP TABLE IF NOT EXISTS keep (id TEXT PRIMARY KEY)")
+            self.db.execute("DELETE FROM keep")
+            self.db.executemany("INSERT OR IGNORE INTO keep VALUES (?)", [(obj.id,) for obj in objs])
+            self.db.execute("DELETE FROM objects WHERE kind = ? AND id NOT IN (SELECT id FROM keep)", (kind,))
+            self.db.execute(
+                "DELETE FROM names WHERE kind = ? AND source = ? AND id NOT IN (SELECT id FROM keep)", (kind, NAME))
+        self.put_many(kind, objs)
+
+    def clear(self, kind: str, parent: str):
+        with self.db:
+            self.db.execute("DELETE FROM objects WHERE kind = ? AND parent = ?", (kind, parent))
+
+    def delete(self, kind: str, id: str):
+        with self.db:
+            self.db.execute("DELETE FROM objects WHERE kind = ? AND id = ?", (kind, id))
+            self.db.execute("DELETE FROM objects WHERE parent = ?", (id,))
+            self.db.execute("DELETE FROM names WHERE kind = ? AND id = ?", (kind, id))
+
+    def is_synced(self, key: str, max_age: float | None = None) -> bool:
+        row = self.db.execute("SELECT fetched_at FROM syncs WHERE key = ?", (key,)).fetchone()
+        return row is not None and self._fresh(row[0], max_age)
+
+    def cursor(self, key: str) -> str | None:
+        """The last id seen by an incremental sync."""
+        row = self.db.execute("SELECT cursor FROM syncs WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def mark_synced(self, key: str, cursor: str | None = None):
+        with self.db:
+            self.db.execute(
+                "INSERT INTO syncs (key, fetched_at, cursor) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET fetched_at = excluded.fetched_at, cursor = excluded.cursor",
+                (key, time.time(), cursor),
+            )
+
+    def forget(self, key: str):
+        with self.db:
+            self.db.execute("DELETE FROM syncs WHERE key = ?", (key,))
+
+    def invalidate(self, key: str):
+        """Mark a sync as stale while keeping its cursor."""
+        with self.db:
+            self.db.execute("UPDATE syncs SET fetched_at = 0 WHERE key = ?", (key,))
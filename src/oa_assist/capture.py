@@ -0,0 +1,194 @@
+"""
+Bounded output capture for commands run by tools.
+
+Commands are read as they run rather than buffered whole: only the head
+and tail of their output are kept, the middle is replaced by an elision
+marker, and commands that run too long are killed along with their whole
+process group.
+"""
+import os
+import signal
+import subprocess
+import threading
+import time
+from typing import Callable, NamedTuple
+
+
+class BoundedBuffer:
+    """Keep the first and last part of a byte stream within byte and line limits."""
+
+    def __init__(self, max_bytes: int, max_lines: int):
+        self.head_bytes = max_bytes // 2
+        self.head_lines = max_lines // 2
+        self.tail_bytes = max_bytes - self.head_bytes
+        self.tail_lines = max_lines - self.head_lines
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total_bytes = 0
+        self.total_lines = 0
+        self._head_full = False
+        self._lock = threading.Lock()
+
+    def feed(self, chunk: bytes):
+        with self._lock:
+            self.total_bytes += len(chunk)
+            self.total_lines += chunk.count(b"\n")
+            if not self._head_full:
+                chunk = self._feed_head(chunk)
+            if chunk:
+                self.tail += chunk
+                if len(self.tail) > 2 * self.tail_bytes:
+                    del self.tail[:-self.tail_bytes]
+
+    def _feed_head(self, chunk: bytes) -> bytes:
+        room = self.head_bytes - len(self.head)
+        end = min(room, len(chunk))
+        lines_left = self.head_lines - self.head.count(b"\n")
+        pos = -1
+        for _ in range(lines_left):
+            pos = chunk.find(b"\n", pos + 1, end)
+            if pos < 0:
+                break
+        else:
+            end = pos + 1 if lines_left > 0 else 0
+        if end < len(chunk):
+            self._head_full = True
+        self.head += chunk[:end]
+        return chunk[end:]
+
+    def last_line(self) -> str:
+        with self._lock:
+            data = self.tail or self.head
+            lines = bytes(data).rstrip(b"\n").rsplit(b"\n", 1)
+            return lines[-1].decode(errors="replace")[-200:]
+
+    def _trimmed_tail(self) -> bytes:
+        tail = bytes(self.tail[-self.tail_bytes:]) if self.tail_bytes else b""
+        if self.total_bytes - len(self.head) > len(tail) and b"\n" in tail[:-1]:
+            # Don't start on a partial line.
+            tail = tail[tail.index(b"\n") + 1:]
+        newlines = tail.count(b"\n")
+        if newlines > self.tail_lines:
+            pos = -1
+            for _ in range(newlines - self.tail_lines):
+                pos = tail.find(b"\n", pos + 1)
+            tail = tail[pos + 1:]
+        return tail
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_bytes > len(self.head) + len(self._trimmed_tail())
+
+    def getvalue(self) -> str:
+        with self._lock:
+            tail = self._trimmed_tail()
+            if self.total_bytes <= len(self.head) + len(tail):
+                return (bytes(self.head) + tail).decode(errors="replace")
+            elided_bytes = self.total_bytes - len(self.head) - len(tail)
+            elided_lines = max(0, self.total_lines - self.head.count(b"\n") - tail.count(b"\n"))
+            marker = f"\n... [{elided_lines} lines, {elided_bytes} bytes elided] ...\n"
+            return self.head.decode(errors="replace") + marker + tail.decode(errors="replace")
+
+
+class CommandResult(NamedTuple):
+    returncode: int | None
+    stdout: str
+    stderr: str
+    timed_out: bool
+    truncated: bool
+
+
+def _pump(pipe, buffer: BoundedBuffer):
+    with pipe:
+        while chunk := pipe.read1(65536):
+            buffer.feed(chunk)
+
+
+def _feed_input(pipe, data: bytes):
+    try:
+        with pipe:
+            pipe.write(data)
+    except BrokenPipeError:
+        pass
+
+
+def kill_group(proc: subprocess.Popen):
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            return
+        try:
+            proc.wait(timeout=2.0)
+            return
+        except subprocess.TimeoutExpired:
+            pass
+
+
+def run_bounded(
+    args: str | list[str],
+    *,
+    shell: bool = False,
+    input: str | None = None,
+    merge_stderr: bool = False,
+    max_bytes: int = 64 * 1024,
+    max_lines: int = 2000,
+    timeout: float | None = None,
+    progress: Callable[[str], None] | None = None,
+    progress_interval: float = 2.0,
+) -> CommandResult:
+    """
+    Run a command, keeping at most `max_bytes`/`max_lines` of each stream.
+
+    With `progress`, the latest output line is reported every
+    `progress_interval` seconds while the command runs.
+    """
+    proc = subprocess.Popen(
+        args,
+        shell=shell,
+        stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT if merge_stderr else subprocess.PIPE,
+        start_new_session=True,
+    )
+    stdout = BoundedBuffer(max_bytes, max_lines)
+    stderr = BoundedBuffer(max_bytes, max_lines)
+    threads = [threading.Thread(target=_pump, args=(proc.stdout, stdout), daemon=True)]
+    if not merge_stderr:
+        threads.append(threading.Thread(target=_pump, args=(proc.stderr, stderr), daemon=True))
+    if input is not None:
+        threads.append(threading.Thread(target=_feed_input, args=(proc.stdin, input.encode()), daemon=True))
+    for thread in threads:
+        thread.start()
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    timed_out = False
+    reported = ""
+    while True:
+        wait = progress_interval if progress else None
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            wait = remaining if wait is None else min(wait, remaining)
+        try:
+            proc.wait(timeout=None if wait is None else max(0.0, wait))
+            break
+        except subprocess.TimeoutExpired:
+            if deadline is not None and time.monotonic() >= deadline:
+                timed_out = True
+                kill_group(proc)
+                break
+            line = stdout.last_line()
+            if progress and line and line != reported:
+                progress(f"{stdout.total_lines} lines: {line}")
+                reported = line
+
+    for thread in threads:
+        thread.join(timeout=2.0)
+
+    return CommandResult(
+        returncode=proc.returncode,
+        stdout=stdout.getvalue(),
+        stderr=stderr.getvalue(),
+        timed_out=timed_out,
+        truncated=stdout.truncated or stderr.truncated,
+    )
@@ -1,15 +1,23 @@
-import time
+from functools import cached_property
+from typing import Iterable
 
 from ._dep import openai as oa
 from ._dep.openai import Thread, ThreadMessage
 from ._dep import rich as ui
 from ._dep.rich import Console, ConsoleOptions, Panel, Markdown, Prompt, RenderResult
+from .live_markdown import LiveMarkdown
+from .output import message_text, write_run
 
 
 class MessageView:
     def __init__(self, message: ThreadMessage):
         self.message = message
 
+    @cached_property
+    def markdown(self) -> list[Markdown]:
+        # Parsed once, however often the view is drawn.
+        return [Markdown(text) for text in message_text(self.message)]
+
     def __rich_console__(self, console: Console, options: ConsoleOptions) -> RenderResult:
         if self.message.role == "assistant":
             yield from self.show_assistant_message()
@@ -17,10 +25,9 @@ class MessageView:
             yield from self.show_user_message()
 
     def show_assistant_message(self):
-        values = (con.text.value for con in self.message.content if con.type == "text")
-        for text in values:
+        for markdown in self.markdown:
             panel = Panel(
-                Markdown(text),
+                markdown,
                 title=f"Assistant {self.message.assistant_id or ''}",
                 style="white on color(237)",
                 expand=False,
@@ -28,8 +35,7 @@ class MessageView:
             yield panel
 
     def show_user_message(self):
-        values = (con.text.value for con in self.message.content if con.type == "text")
-        for text in values:
+        for text in message_text(self.message):
             yield f"[bold red]User:[/] {text}"
 
 
@@ -44,17 +50,57 @@ class MessageListView:
             yield MessageView(mesg)
 
 
+def print_messages(console: Console, messages: Iterable[ThreadMessage]):
+    """Print messages one at a time rather than laying out the whole list at once."""
+    if not console.is_terminal:
+        for mesg in messages:
+            for text in message_text(mesg):
+                console.file.write(f"{mesg.role.capitalize()}: {text}\n")
+        return
+    for mesg in messages:
+        console.print(MessageView(mesg))
+
+
 class InteractiveChat:
     def __init__(self, initial_message: str):
         pass
 
-    def send_cmd(console, thread, line):
-        op = thread.send(line)
-        with console.status("Working...", spinner="bouncingBall") as status:
-            while not op.ready():
-                for mesg in op.get_log_messages():
-                    console.log(mesg)
-                time.sleep(0.2)
-            resp = op.get_response()
+    def send_cmd(self, console, thread, line):
+        send_cmd(console, thread, line)
+
+
+def send_cmd(console: Console, thread, line: str):
+    """Send a line to the thread and render the run's events as they arrive."""
+    render_run(console, thread.send(line))
+
+
+def render_run(console: Console, op):
+    """Render a run's events as they arrive."""
+    if not console.is_terminal:
+        return write_run(console.file, op)
 
-        console.print(MessageView(resp))
+    status = console.status("Working...", spinner="bouncingBall")
+    status.start()
+    stream: LiveMarkdown | None = None
+    try:
+        for event in op.events():
+            match event.kind:
+                case "log":
+                    console.log(event.data)
+                case "delta":
+                    if stream is None:
+                        status.stop()
+                        console.print("[bold]Assistant:[/bold]")
+                        stream = LiveMarkdown(console)
+                        stream.start()
+                    stream.feed(event.data)
+                case "message" if stream is not None:
+                    stream.finish()
+                    stream = None
+                    status.start()
+                case "message":
+                    console.print(MessageView(event.data))
+    finally:
+        if stream is not None:
+            stream.finish()
+        status.stop()
@@ -0,0 +1,97 @@
+import sys
+
+import click
+import openai
+from rich.prompt import Prompt
+
+from .assistant import AssistantInterface, ThreadInterface
+from .chat import print_messages, send_cmd
+from .cli import cli, CLI
+from .run_cli import resolve_orphans
+from .runs import RunFailed
+from .tool_executor import ToolExecutor
+
+
+def show_earlier(console, thread: ThreadInterface, oldest: str | None, limit: int) -> str | None:
+    """Show the page of messages before `oldest`, returning the new oldest message id."""
+    messages = thread.earlier_messages(oldest, limit) if oldest else thread.recent_messages(limit)
+    if not messages:
+        console.print("[dim]No earlier messages.[/dim]")
+        return oldest
+    console.rule("Earlier messages")
+    print_messages(console, messages)
+    return messages[0].id
+
+
+def read_line(console) -> str:
+    """The next line of chat; raises EOFError at the end of input."""
+    if console.is_terminal:
+        return Prompt.get_input(console, "[bold red]chat:[/bold red] ", password=False)
+    # Piped input, e.g. `echo hello | oaa chat > reply.txt`, without a prompt.
+    line = sys.stdin.readline()
+    if not line:
+        raise EOFError
+    return line.rstrip("\n")
+
+
+def send(console, thread: ThreadInterface, line: str):
+    """Send a line, reporting rather than raising errors so the chat can carry on."""
+    try:
+        send_cmd(console, thread, line)
+    except (RunFailed, openai.APIError) as err:
+        console.print(f"[bold red]Error:[/bold red] {err}")
+
+
+@cli.command
+@click.option("--message", "-m")
+@click.option("--history", "-H", default=20, show_default=True,
+              help="Number of earlier messages to show; type /more in the chat for older ones.")
+@click.pass_obj
+def chat(obj: CLI, message: str | None, history: int):
+    if obj.config.selected.assistant_id is None:
+        raise click.ClickException("No assistant selected")
+
+    acc = AssistantInterface.retrieve(
+        obj.openai,
+        obj.config.selected.assistant_id,
+        obj.tools,
+        executor=ToolExecutor(obj.config.tools),
+        cache=obj.cache,
+        metrics=obj.metrics,
+        runs=obj.runs,
+        run_policy=obj.config.runs,
+    )
+
+    console = obj.console
+    oldest = None
+
+    if obj.config.selected.thread_id:
+        #thread_id = openai.beta.threads.retrieve(obj.config.selected.thread_id)
+        thread = acc.retrieve_thread(obj.config.selected.thread_id)
+        resolve_orphans(obj, thread)
+        if history > 0:
+            messages = thread.recent_messages(history)
+            print_messages(console, messages)
+            oldest = messages[0].id if messages else None
+    else:
+        thread = acc.create_thread()
+        with obj.config.update() as conf:
+            conf.selected.thread_id = thread.thread.id
+        #thread_id = openai.beta.threads.create()
+
+    if message:
+        if console.is_terminal:
+            console.print(f"[bold red]chat:[/bold red] {message}")
+        send(console, thread, message)
+
+    while True:
+        try:
+            line = read_line(console)
+        except EOFError:
+            return
+        if not line:
+            continue
+        if line.strip() == "/more":
+            oldest = show_earlier(console, thread, oldest, history or 20)
+            continue
+        send(console, thread, line)
@@ -1,28 +1,114 @@
-import time
+import os
+import re
+from functools import cached_property
+from importlib import import_module
 from logging import basicConfig, WARNING
-from typing import List
+from typing import List, TYPE_CHECKING
 
 import click
 from click.core import Command, Context
-import openai
-import pydantic
-from rich.console import Console
-from rich.prompt import Prompt
-from rich.panel import Panel
-from rich.markdown import Markdown
-
-from .chat import MessageListView, MessageView
-from .assistant import AssistantInterface
-from .config import UserConfig, load_user_config, save_user_config
-from .tool_functions import DEFAULT_FUNCTIONS
-
-
-
-class CLI(pydantic.BaseModel):
-    model_config = pydantic.ConfigDict(arbitrary_types_allowed=True)
-    openai: openai.OpenAI
-    console: Console
-    config: UserConfig
+from click.formatting import HelpFormatter
+from click.utils import make_default_short_help
+
+if TYPE_CHECKING:
+    import openai
+    from rich.console import Console
+    from .cache import ObjectCache
+    from .config import UserConfig
+    from .metrics import MetricsStore
+    from .names import NameIndex
+    from .runs import RunStore
+    from .tool_registry import ToolRegistry
+
+
+# Subcommands are registered by importing their module, which only happens
+# once they are invoked so that openai and rich stay off the startup path.
+LAZY_COMMANDS = {
+    "ask": ".ask_cli",
+    "assistant": ".assistant_cli",
+    "batch": ".batch_cli",
+    "chat": ".chat_cli",
+    "config": ".config_cli",
+    "daemon": ".daemon_cli",
+    "run": ".run_cli",
+    "stats": ".stats_cli",
+    "thread": ".thread_cli",
+}
+# The short help of lazy commands, so that `oaa --help` doesn't import them
+# all; keep it in step with their docstrings.
+LAZY_HELP = {
+    "ask": "Send MESSAGE, write the reply to stdout and exit; for scripts.",
+    "batch": "Send each prompt in a JSONL file to its own thread.",
+    "run": "Runs in progress, including those left behind by interrupted commands.",
+    "stats": "Latency percentiles and token usage of recent runs.",
+}
+
+
+class CLI:
+    """State shared by all commands, each part created on first use."""
+
+    def __init__(self, **parts):
+        # Parts passed in (e.g. by the daemon) are used instead of creating them.
+        self.__dict__.update(parts)
+
+    @cached_property
+    def client_pid(self) -> int:
+        """The process the user is running; not the daemon's when it serves the command."""
+        return os.getpid()
+
+    @cached_property
+    def openai(self) -> "openai.OpenAI":
+        from .client import get_client
+        return get_client(self.config.client)
+
+    @cached_property
+    def console(self) -> "Console":
+        from rich.console import Console
+        return Console()
+
+    @cached_property
+    def config(self) -> "UserConfig":
+        from .config import load_user_config
+        return load_user_config()
+
+    @cached_property
+    def cache(self) -> "ObjectCache":
+        from .cache import ObjectCache
+        return ObjectCache(ttl=self.config.cache.ttl)
+
+    @cached_property
+    def tools(self) -> "ToolRegistry":
+        from .tool_functions import DEFAULT_FUNCTIONS
+        from .tool_registry import ToolRegistry
+        return ToolRegistry(DEFAULT_FUNCTIONS, plugins=True, cache=self.cache)
+
+    @cached_property
+    def metrics(self) -> "MetricsStore":
+        from .metrics import MetricsStore
+        return MetricsStore()
+
+    @cached_property
+    def names(self) -> "NameIndex":
+        from .names import NameIndex
+        return NameIndex(self.cache, self.config)
+
+    @cached_property
+    def runs(self) -> "RunStore":
+        from .runs import RunStore
+        return RunStore(pid=self.client_pid)
+
+
+AGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_age(ctx, param, value: str | None) -> float | None:
+    """Seconds in an age like "90s", "30m", "12h" or "7d"; a click option callback."""
+    if value is None:
+        return None
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smhdw])", value.strip())
+    if not match:
+        raise click.BadParameter(f"Expected a number and one of {', '.join(AGE_UNITS)}, e.g. 7d")
+    return float(match.group(1)) * AGE_UNITS[match.group(2)]
 
 
 class ShortcutGroup(click.Group):
@@ -31,22 +117,53 @@ class ShortcutGroup(click.Group):
         "rm": "delete",
     }
 
+    def __init__(self, *args, lazy_commands: dict[str, str] | None = None, lazy_help: dict[str, str] | None = None,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+        self.lazy_help = lazy_help or {}
+
+    def list_commands(self, ctx: Context) -> List[str]:
+        return sorted(set(super().list_commands(ctx)) | self.lazy_commands.keys())
+
+    def format_commands(self, ctx: Context, formatter: HelpFormatter):
+        # As click does, but listing lazy commands that aren't loaded from `lazy_help`.
+        commands = [
+            (name, self.commands.get(name) or self.lazy_help.get(name, ""))
+            for name in self.list_commands(ctx)
+        ]
+        commands = [(name, cmd) for name, cmd in commands if isinstance(cmd, str) or not cmd.hidden]
+        if not commands:
+            return
+        limit = formatter.width - 6 - max(len(name) for name, _ in commands)
+        rows = [
+            (name, make_default_short_help(cmd, limit) if isinstance(cmd, str) else cmd.get_short_help_str(limit))
+            for name, cmd in commands
+        ]
+        with formatter.section("Commands"):
+            formatter.write_dl(rows)
+
     def resolve_command(self, ctx: Context, args: List[str]) -> tuple[str | None, Command | None, List[str]]:
         _, cmd, args = super().resolve_command(ctx, args)
         return cmd.name, cmd, args
 
     def get_command(self, ctx, cmd_name):
         return (
-            super().get_command(ctx, cmd_name) or
+            self.get_exact_command(ctx, cmd_name) or
             self.get_plural_command(ctx, cmd_name) or
             self.get_alias_command(ctx, cmd_name) or
             self.get_short_command(ctx, cmd_name)
         )
 
+    def get_exact_command(self, ctx: Context, cmd_name: str):
+        if cmd_name in self.lazy_commands and cmd_name not in self.commands:
+            import_module(self.lazy_commands[cmd_name], __package__)
+        return super().get_command(ctx, cmd_name)
+
     def get_plural_command(self, ctx: Context, cmd_name: str):
         # TODO: doesn't work
         if cmd_name[-1] == 's':
-            cmd = super().get_command(ctx, cmd_name[:-1])
+            cmd = self.get_exact_command(ctx, cmd_name[:-1])
             return cmd
 
     def get_alias_command(self, ctx: Context, cmd_name: str):
@@ -60,65 +177,16 @@ class ShortcutGroup(click.Group):
             ctx.fail("Command not found")
         elif len(commands) > 1:
             ctx.fail("Ambiguous command '{cmd_name}")
-        return super().get_command(ctx, commands[0])
+        return self.get_exact_command(ctx, commands[0])
 
 
-@click.group(cls=ShortcutGroup)
+@click.group(cls=ShortcutGroup, lazy_commands=LAZY_COMMANDS, lazy_help=LAZY_HELP)
 @click.pass_context
 def cli(ctx):
     basicConfig(level=WARNING)
-    ctx.obj = CLI(
-        openai=openai.OpenAI(),
-        console=Console(),
-        config=load_user_config(),
-    )
+    # The daemon passes in a CLI with its long-lived client and cache.
+    ctx.ensure_object(CLI)
 
 
 # Ensure shortcuts are enabled for sub-groups.
 cli.group_class = ShortcutGroup
-
-
-@cli.command
-@click.option("--message", "-m")
-@click.pass_obj
-def chat(obj: CLI, message: str | None):
-    if obj.config.selected.assistant_id is None:
-        raise click.ClickException("No assistant selected")
-
-    acc = AssistantInterface.retrieve(obj.openai, obj.config.selected.assistant_id, DEFAULT_FUNCTIONS)
-
-    console = Console()
-
-    if obj.config.selected.thread_id:
-        #thread_id = openai.beta.threads.retrieve(obj.config.selected.thread_id)
-        thread = acc.retrieve_thread(obj.config.selected.thread_id)
-        messages = openai.beta.threads.messages.list(obj.config.selected.thread_id)
-        console.print(MessageListView(thread=list(messages)))
-    else:
-        thread = acc.create_thread()
-        with obj.config.update() as conf:
-            conf.selected.thread_id = thread.thread.id
-            conf.cache.thread[thread.thread.id] = thread.thread
-        #thread_id = openai.beta.threads.create()
-
-    if message:
-        console.print(f"[bold red]chat:[/bold red] {message}")
-        send_cmd(console, thread, message)
-
-    while True:
-        line = Prompt.get_input(console, "[bold red]chat:[/bold red] ", password=False)
-        if not line:
-            continue
-        send_cmd(console, thread, line)
-
-
-def send_cmd(console, thread, line):
-    op = thread.send(line)
-    with console.status("Working...", spinner="bouncingBall") as status:
-        while not op.ready():
-            for mesg in op.get_log_messages():
-                console.log(mesg)
-            time.sleep(0.2)
-        resp = op.get_response()
-
-    console.print(MessageView(resp))
@@ -0,0 +1,73 @@
+"""
+Shared OpenAI clients.
+
+Every command gets its client from here, so a process (or the daemon, see
+`daemon`) holds one connection pool per settings and reuses its
+keep-alive connections instead of repeating TLS handshakes.
+"""
+from importlib.util import find_spec
+from typing import TYPE_CHECKING
+
+from .settings import ClientSettings
+
+if TYPE_CHECKING:
+    import httpx
+    import openai
+
+
+_clients: dict[str, "openai.OpenAI"] = {}
+
+
+def _transport_options(settings: ClientSettings) -> dict:
+    import httpx
+
+    return {
+        "limits": httpx.Limits(
+            max_connections=settings.max_connections,
+            max_keepalive_connections=settings.max_keepalive_connections,
+            keepalive_expiry=settings.keepalive_expiry,
+        ),
+        "http2": settings.http2 and find_spec("h2") is not None,
+    }
+
+
+def get_client(settings: ClientSettings = ClientSettings()) -> "openai.OpenAI":
+    key = settings.model_dump_json()
+    if key not in _clients:
+        import httpx
+        import openai
+        from .scheduler import RetryTransport, get_scheduler
+
+        transport = RetryTransport(httpx.HTTPTransport(**_transport_options(settings)), get_scheduler(settings))
+        _clients[key] = openai.OpenAI(
+            base_url=settings.base_url,
+            # Retries are up to the scheduler.
+            max_retries=0,
+            http_client=httpx.Client(
+                transport=transport,
+                timeout=httpx.Timeout(settings.timeout, connect=settings.connect_timeout),
+                follow_redirects=True,
+            ),
+        )
+    return _clients[key]
+
+
+def get_async_client(settings: ClientSettings = ClientSettings()) -> "openai.AsyncOpenAI":
+    """
+    An AsyncOpenAI client; unlike `get_client` this isn't shared, since
+    its connections belong to the event loop it was first used on.
+    """
+    import httpx
+    import openai
+    from .scheduler import AsyncRetryTransport, get_scheduler
+
+    transport = AsyncRetryTransport(httpx.AsyncHTTPTransport(**_transport_options(settings)), get_scheduler(settings))
+    return openai.AsyncOpenAI(
+        base_url=settings.base_url,
+        max_retries=0,
+        http_client=httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(settings.timeout, connect=settings.connect_timeout),
+            follow_redirects=True,
+        ),
+    )
@@ -1,26 +1,170 @@
+import json
 import os
+import sqlite3
+import typing
 from pathlib import Path
 from typing import ClassVar, Any
 from contextlib import contextmanager
 
 import blinker
 import pydantic
-from ._dep.openai import Thread
+from .settings import ClientSettings, RunPolicy, ToolSettings
 
-USER_CONFIG = Path("~/.config/oa-assist/config.json").expanduser()
+USER_CONFIG = Path("~/.config/oa-assist/config.db").expanduser()
+LEGACY_USER_CONFIG = Path("~/.config/oa-assist/config.json").expanduser()
+
+# Sections that can grow without bound are only read when first accessed.
+LAZY_SECTIONS = ("labels",)
+
+
+class ConfigStore:
+    """
+    Key/value storage for the user config.
+
+    Every setting is its own row, keyed by its dotted path (e.g.
+    "selected.thread_id"), as is every label (e.g. "labels.thread.<id>"),
+    so saving only writes the keys that changed; see `flatten`. The
+    database runs in WAL mode and writes take SQLite's write lock up front,
+    which lets concurrent `oaa` processes update different keys without
+    clobbering each other.
+    """
+
+    def __init__(self, path: Path = USER_CONFIG):
+        self.path = path
+        self._db: sqlite3.Connection | None = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        return self._db
+
+    @contextmanager
+    def transaction(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.db
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    def load(self, prefix: str = "", exclude: tuple[str, ...] = ()) -> dict[str, Any]:
+        rows = self.db.execute(
+            "SELECT key, value FROM config WHERE key >= ? AND key < ?",
+            (prefix, prefix + "\uffff"),
+        )
+        return {
+            key: json.loads(value) for key, value in rows
+            if not key.startswith(tuple(f"{section}." for section in exclude))
+        }
+
+    def get(self, key: str) -> Any:
+        row = self.db.execute("SELECT value FROM config WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, changed: dict[str, Any], removed: set[str] = set()):
+        with self.transaction() as db:
+            db.executemany(
+                "INSERT INTO config (key, value) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                [(key, json.dumps(value)) for key, value in changed.items()],
+            )
+            db.executemany("DELETE FROM config WHERE key = ?", [(key,) for key in removed])
+
+    def delete(self, key: str):
+        with self.transaction() as db:
+            db.execute("DELETE FROM config WHERE key = ? OR (key > ? AND key < ?)", (key, key + ".", key + ".\uffff"))
+
+
+def _field_model(model: type[pydantic.BaseModel] | None, name: str) -> type[pydantic.BaseModel] | None:
+    """The model of a field that is itself a model, e.g. `UserConfig.tools`."""
+    field = model.model_fields.get(name) if model is not None else None
+    if field is None:
+        return None
+    for annotation in (field.annotation, *typing.get_args(field.annotation)):
+        if isinstance(annotation, type) and issubclass(annotation, pydantic.BaseModel):
+            return annotation
+    return None
+
+
+def flatten(data: dict, prefix: str = "", model: type[pydantic.BaseModel] | None = None) -> dict[str, Any]:
+    """
+    The rows of `data`, a dump of `model`: nested models are split into a
+    row per field, but any other value, including a dict setting such as
+    `tools.shell_env`, is a single row. Without a model (e.g. for labels)
+    every dict is split into a row per entry.
+    """
+    flat = {}
+    for key, value in data.items():
+        field_model = _field_model(model, key)
+        # Labels aren't a field of UserConfig, so they're split too.
+        if isinstance(value, dict) and (field_model is not None or model is None or key not in model.model_fields):
+            flat.update(flatten(value, f"{prefix}{key}.", field_model))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def unflatten(flat: dict[str, Any]) -> dict:
+    data: dict = {}
+    for key, value in flat.items():
+        *parents, leaf = key.split(".")
+        node = data
+        for part in parents:
+            if not isinstance(node.get(part), dict):
+                # Setting an entry of a dict that is unset (None) starts it.
+                node[part] = {}
+            node = node[part]
+        node[leaf] = value
+    return data
+
+
+def row_key(key: str, flat: dict[str, Any]) -> str | None:
+    """The row that holds `key`: itself, or the dict setting it's an entry of."""
+    while key and key not in flat:
+        key = key.rpartition(".")[0]
+    return key or None
 
 
 def load_user_config(path: Path = USER_CONFIG) -> "UserConfig":
-    try:
-        return UserConfig.model_validate_json(path.read_text())
-    except IOError:
-        return UserConfig()
+    if not path.exists() and LEGACY_USER_CONFIG.exists():
+        _migrate_legacy_config(LEGACY_USER_CONFIG, path)
+
+    store = ConfigStore(path)
+    flat = store.load(exclude=LAZY_SECTIONS)
+    config = UserConfig(**unflatten(flat))
+    config._store = store
+    config._saved = flatten(config.model_dump(), model=UserConfig)
+    return config
 
 
 def save_user_config(config: "UserConfig", path: Path = USER_CONFIG):
-    if not path.parent.exists():
-        path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(config.model_dump_json())
+    store = config._store or ConfigStore(path)
+    current = flatten(config.model_dump(), model=UserConfig)
+    changed = {key: value for key, value in current.items() if config._saved.get(key, ...) != value}
+    removed = {key for key in config._saved if key not in current}
+    if changed or removed:
+        store.update(changed, removed)
+    config._store = store
+    config._saved = current
+
+
+def _migrate_legacy_config(legacy: Path, path: Path):
+    from ._dep.openai import Thread
+    from .cache import ObjectCache, THREAD
+
+    data = json.loads(legacy.read_text())
+    # Threads used to be cached in the config file itself.
+    threads = data.get("cache", {}).pop("thread", None)
+    if threads:
+        ObjectCache().put_many(THREAD, [Thread.model_validate(thread) for thread in threads.values()])
+    config = UserConfig(**data)
+    ConfigStore(path).update(flatten(config.model_dump(include_lazy=True), model=UserConfig))
+    legacy.rename(legacy.with_suffix(".json.bak"))
 
 
 class Labels(pydantic.BaseModel):
@@ -30,7 +174,7 @@ class Labels(pydantic.BaseModel):
 
 
 class Cache(pydantic.BaseModel):
-    thread: dict[str, Thread] = {}
+    ttl: float = 300.0
 
 
 class SelectionIdentifiers(pydantic.BaseModel, validate_assignment=True):
@@ -38,7 +182,6 @@ class SelectionIdentifiers(pydantic.BaseModel, validate_assignment=True):
 
     assistant_id: str | None = None
     thread_id: str | None = None
-    run_id: str | None = None
 
     @pydantic.model_validator(mode="after")
     @classmethod
@@ -48,8 +191,33 @@ class SelectionIdentifiers(pydantic.BaseModel, validate_assignment=True):
 
 class UserConfig(pydantic.BaseModel):
     selected: SelectionIdentifiers = SelectionIdentifiers()
-    labels: Labels = Labels()
     cache: Cache = Cache()
+    tools: ToolSettings = ToolSettings()
+    client: ClientSettings = ClientSettings()
+    runs: RunPolicy = RunPolicy()
+
+    _labels: Labels | None = pydantic.PrivateAttr(None)
+    _store: ConfigStore | None = pydantic.PrivateAttr(None)
+    _saved: dict[str, Any] = pydantic.PrivateAttr(default_factory=dict)
+
+    def __init__(self, labels: Labels | dict | None = None, **data):
+        super().__init__(**data)
+        if labels is not None:
+            self._labels = Labels.model_validate(labels)
+
+    @property
+    def labels(self) -> Labels:
+        if self._labels is None:
+            flat = self._store.load("labels.") if self._store else {}
+            self._labels = Labels.model_validate(unflatten(flat).get("labels", {}))
+            self._saved.update(flatten(self._labels.model_dump(), "labels."))
+        return self._labels
+
+    def model_dump(self, *, include_lazy: bool = False, **kwargs) -> dict[str, Any]:
+        data = super().model_dump(**kwargs)
+        if include_lazy or self._labels is not None:
+            data["labels"] = self.labels.model_dump()
+        return data
 
     def save(self):
         save_user_config(self)
@@ -0,0 +1,73 @@
+import json
+
+import click
+import pydantic
+
+from .cli import cli, CLI
+from .config import UserConfig, flatten, row_key, unflatten
+
+
+@cli.group(invoke_without_command=True)
+@click.pass_context
+def config(ctx):
+    if ctx.invoked_subcommand is None:
+        ctx.invoke(get_value)
+
+
+def _settings(obj: CLI) -> dict:
+    """Every setting and label in effect, stored or default, by key."""
+    return flatten(obj.config.model_dump(include_lazy=True), model=UserConfig)
+
+
+@config.command(name="get")
+@click.argument("key", required=False, default="")
+@click.pass_obj
+def get_value(obj: CLI, key: str):
+    flat = _settings(obj)
+    values = {name: value for name, value in flat.items() if name.startswith(key)}
+    if not values and (row := row_key(key, flat)) is not None:
+        # An entry of a dict setting, e.g. tools.shell_env.PATH.
+        entries = flat[row] if isinstance(flat[row], dict) else {}
+        values = {key: entries.get(key[len(row) + 1:])}
+    for name, value in sorted(values.items()):
+        obj.console.print(f"{name} = {json.dumps(value)}", highlight=False, markup=False)
+
+
+@config.command(name="set")
+@click.argument("key")
+@click.argument("value")
+@click.pass_obj
+def set_value(obj: CLI, key: str, value: str):
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+
+    flat = _settings(obj)
+    flat[key] = value
+    try:
+        validated = flatten(UserConfig(**unflatten(flat)).model_dump(include_lazy=True), model=UserConfig)
+    except pydantic.ValidationError as err:
+        raise click.ClickException(str(err))
+    # Setting an entry of a dict setting stores the whole dict.
+    row = row_key(key, validated)
+    if row is None:
+        raise click.ClickException(f"Unknown key: '{key}'")
+    obj.config._store.update({row: validated[row]})
+    if key.split(".")[0] == "labels":
+        obj.names.invalidate()
+
+
+@config.command
+@click.argument("key")
+@click.pass_obj
+def unset(obj: CLI, key: str):
+    flat = _settings(obj)
+    row = row_key(key, flat)
+    if row is not None and row != key and isinstance(flat[row], dict):
+        entry = key[len(row) + 1:]
+        obj.config._store.update({row: {name: value for name, value in flat[row].items() if name != entry}})
+    else:
+        obj.config._store.delete(key)
+    if key.split(".")[0] == "labels":
+        obj.names.invalidate()
@@ -0,0 +1,327 @@
+"""
+Optional long-lived daemon for scripted use.
+
+`oaa daemon start` runs a server on a Unix socket that keeps the imports,
+the OpenAI connection pool and the object cache warm. While it is running,
+`oaa` forwards each invocation to it and just relays the output, so short
+commands skip interpreter start-up, imports and TLS handshakes.
+
+Commands that read stdin, prompt or run tools always run locally, as does
+everything when OAA_NO_DAEMON is set, so the commands the daemon serves
+only need the output relayed and never depend on the working directory.
+Requests are served concurrently, each on a thread of its own, with the
+user's config as it is at the time. The daemon uses its own environment
+(e.g. OPENAI_API_KEY).
+"""
+import io
+import json
+import os
+import shutil
+import socket
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO
+
+SOCKET_PATH = Path("~/.cache/oa-assist/daemon.sock").expanduser()
+
+# Commands that read stdin, prompt or run tools, which the daemon can't relay
+# or interrupt. Subcommands are given with their group.
+LOCAL_COMMANDS = ("chat", "batch", "daemon", "ask", "run attach", "thread prune", "assistant prune")
+# Requests served at once; more wait for a free thread.
+MAX_REQUESTS = 8
+
+_HEADER = struct.Struct("!cI")
+
+
+def write_frame(stream: BinaryIO, kind: bytes, payload: bytes):
+    stream.write(_HEADER.pack(kind, len(payload)) + payload)
+    stream.flush()
+
+
+def read_frame(stream: BinaryIO) -> tuple[bytes, bytes] | None:
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    kind, length = _HEADER.unpack(header)
+    return kind, stream.read(length)
+
+
+def _runs_locally(args: list[str]) -> bool:
+    if "-" in args:
+        # Stands for stdin, e.g. `oaa ask -`.
+        return True
+    words = [arg for arg in args if not arg.startswith("-")]
+    # Commands can be abbreviated, e.g. `oaa th pr`.
+    return any(
+        len(words) >= len(command.split()) and all(
+            part.startswith(word) or word.startswith(part) for part, word in zip(command.split(), words)
+        )
+        for command in LOCAL_COMMANDS
+    )
+
+
+def _connect(path: Path) -> socket.socket | None:
+    if not path.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path))
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def _request(sock: socket.socket, request: dict) -> int:
+    with sock, sock.makefile("rwb") as stream:
+        try:
+            write_frame(stream, b"r", json.dumps(request).encode())
+            while frame := read_frame(stream):
+                kind, payload = frame
+                match kind:
+                    case b"o":
+                        sys.stdout.buffer.write(payload)
+                        sys.stdout.flush()
+                    case b"e":
+                        sys.stderr.buffer.write(payload)
+                        sys.stderr.flush()
+                    case b"x":
+                        return int(payload)
+        except KeyboardInterrupt:
+            # Closing the connection ends the command in the daemon at its next write.
+            return 130
+    print("oaa: lost connection to the daemon", file=sys.stderr)
+    return 1
+
+
+def forward(args: list[str], path: Path = SOCKET_PATH) -> int | None:
+    """Run a command in the daemon, returning its exit code, or None to run it here."""
+    if os.environ.get("OAA_NO_DAEMON") or _runs_locally(args):
+        return None
+    sock = _connect(path)
+    if sock is None:
+        return None
+    return _request(sock, {
+        "argv": args,
+        "pid": os.getpid(),
+        "tty": sys.stdout.isatty(),
+        "width": shutil.get_terminal_size().columns,
+    })
+
+
+def control(command: str, path: Path = SOCKET_PATH) -> int | None:
+    """Send "ping" or "stop" to the daemon; None if it isn't running."""
+    sock = _connect(path)
+    if sock is None:
+        return None
+    return _request(sock, {"control": command})
+
+
+class _FrameWriter(io.TextIOBase):
+    def __init__(self, stream: BinaryIO, kind: bytes, tty: bool):
+        self.stream = stream
+        self.kind = kind
+        self.tty = tty
+
+    def write(self, text: str | bytes) -> int:
+        if text:
+            data = text.encode() if isinstance(text, str) else bytes(text)
+            write_frame(self.stream, self.kind, data)
+        return len(text)
+
+    def isatty(self) -> bool:
+        return self.tty
+
+
+class _ThreadStreams(io.TextIOBase):
+    """
+    Stands in for sys.stdout or sys.stderr, writing to the stream of the
+    request the current thread is serving, as `contextlib.redirect_stdout`
+    would for a single request.
+    """
+
+    def __init__(self, default):
+        self.default = default
+        self._local = threading.local()
+
+    @property
+    def current(self):
+        return getattr(self._local, "stream", None) or self.default
+
+    def redirect(self, stream):
+        self._local.stream = stream
+
+    def write(self, text) -> int:
+        return self.current.write(text)
+
+    def flush(self):
+        self.current.flush()
+
+    def isatty(self) -> bool:
+        return self.current.isatty()
+
+
+class _Server:
+    def __init__(self):
+        # One object cache per thread, as a sqlite connection can only be in
+        # one transaction at a time.
+        self._local = threading.local()
+        self.stopped = threading.Event()
+        self._lock = threading.Lock()
+        self.active = 0
+        self.last_active = time.monotonic()
+        if not isinstance(sys.stdout, _ThreadStreams):
+            sys.stdout = _ThreadStreams(sys.stdout)
+            sys.stderr = _ThreadStreams(sys.stderr)
+
+    @property
+    def cache(self):
+        if not hasattr(self._local, "cache"):
+            from .cache import ObjectCache
+
+            self._local.cache = ObjectCache()
+        return self._local.cache
+
+    def accepted(self):
+        """Count a connection as active from when it's accepted, even while it waits for a thread."""
+        with self._lock:
+            self.active += 1
+
+    def serve_connection(self, conn: socket.socket):
+        try:
+            with conn, conn.makefile("rwb") as stream:
+                self.handle(stream)
+        except OSError:
+            # The client went away, e.g. on Ctrl-C.
+            pass
+        finally:
+            sys.stdout.redirect(None)
+            sys.stderr.redirect(None)
+            with self._lock:
+                self.active -= 1
+                self.last_active = time.monotonic()
+
+    def idle_for(self) -> float:
+        with self._lock:
+            return 0.0 if self.active else time.monotonic() - self.last_active
+
+    def handle(self, stream: BinaryIO):
+        """Serve one request."""
+        frame = read_frame(stream)
+        if frame is None:
+            return
+        request = json.loads(frame[1])
+        match request.get("control"):
+            case "stop":
+                self.stopped.set()
+                write_frame(stream, b"x", b"0")
+                return
+            case "ping":
+                write_frame(stream, b"o", f"{os.getpid()}\n".encode())
+                write_frame(stream, b"x", b"0")
+                return
+
+        out = _FrameWriter(stream, b"o", request["tty"])
+        err = _FrameWriter(stream, b"e", request["tty"])
+        code = self.run(request, out, err)
+        write_frame(stream, b"x", str(code).encode())
+
+    def run(self, request: dict, out: _FrameWriter, err: _FrameWriter) -> int:
+        import traceback
+
+        import click
+        from rich.console import Console
+
+        from .cli import cli, CLI
+        from .client import get_client
+        from .config import load_user_config
+
+        try:
+            config = load_user_config()
+            self.cache.ttl = config.cache.ttl
+            obj = CLI(
+                config=config,
+                cache=self.cache,
+                client_pid=request["pid"],
+                openai=get_client(config.client),
+                console=Console(file=out, force_terminal=request["tty"], width=request["width"]),
+            )
+            sys.stdout.redirect(out)
+            sys.stderr.redirect(err)
+            code = cli.main(args=request["argv"], prog_name="oaa", standalone_mode=False, obj=obj)
+            return code if isinstance(code, int) else 0
+        except click.ClickException as exc:
+            exc.show(file=err)
+            return exc.exit_code
+        except click.Abort:
+            err.write("Aborted!\n")
+            return 1
+        except SystemExit as exc:
+            return exc.code if isinstance(exc.code, int) else 1
+        except (BrokenPipeError, ConnectionResetError):
+            raise
+        except Exception:
+            err.write(traceback.format_exc())
+            return 1
+
+
+def _log_to_client():
+    """Send log records to whatever sys.stderr is at the time, i.e. the client of the current thread."""
+    import logging
+
+    class Handler(logging.Handler):
+        def emit(self, record):
+            try:
+                sys.stderr.write(self.format(record) + "\n")
+            except Exception:
+                self.handleError(record)
+
+    logging.basicConfig(level=logging.WARNING, handlers=[Handler()])
+
+
+def serve(path: Path = SOCKET_PATH, idle_timeout: float | None = 1800.0):
+    """Serve requests concurrently until stopped or idle for `idle_timeout` seconds."""
+    _log_to_client()
+    server = _Server()
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o077)
+    try:
+        listener.bind(str(path))
+    finally:
+        os.umask(old_umask)
+    listener.listen()
+    # Wakes up now and then to notice a stop request or being idle.
+    listener.settimeout(0.5)
+
+    pool = ThreadPoolExecutor(max_workers=MAX_REQUESTS, thread_name_prefix="oaa-daemon")
+    try:
+        while not server.stopped.is_set():
+            try:
+                conn, _ = listener.accept()
+            except socket.timeout:
+                if idle_timeout is not None and server.idle_for() >= idle_timeout:
+                    break
+                continue
+            conn.settimeout(None)
+            server.accepted()
+            pool.submit(server.serve_connection, conn)
+    finally:
+        listener.close()
+        path.unlink(missing_ok=True)
+        # Requests still being served are left to finish.
+        pool.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the oa-assist daemon in the foreground.")
+    parser.add_argument("--idle-timeout", type=float, default=1800.0)
+    serve(idle_timeout=parser.parse_args().idle_timeout or None)
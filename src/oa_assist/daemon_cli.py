@@ -0,0 +1,56 @@
+import subprocess
+import sys
+import time
+
+import click
+
+from .cli import cli, CLI
+from .daemon import SOCKET_PATH, control, serve
+
+
+@cli.group()
+@click.pass_obj
+def daemon(obj: CLI):
+    pass
+
+
+@daemon.command
+@click.option("--foreground", "-f", is_flag=True, help="Run in this process instead of detaching.")
+@click.option("--idle-timeout", default=1800.0, show_default=True, help="Exit after this many idle seconds (0 for never).")
+@click.pass_obj
+def start(obj: CLI, foreground: bool, idle_timeout: float):
+    if control("ping") is not None:
+        raise click.ClickException("The daemon is already running.")
+    if foreground:
+        serve(idle_timeout=idle_timeout or None)
+        return
+
+    subprocess.Popen(
+        [sys.executable, "-m", "oa_assist.daemon", "--idle-timeout", str(idle_timeout)],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    deadline = time.monotonic() + 10.0
+    while not SOCKET_PATH.exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    if not SOCKET_PATH.exists():
+        raise click.ClickException("The daemon didn't start.")
+    obj.console.print(f"Daemon listening on {SOCKET_PATH}")
+
+
+@daemon.command
+@click.pass_obj
+def stop(obj: CLI):
+    if control("stop") is None:
+        raise click.ClickException("The daemon isn't running.")
+    obj.console.print("Daemon stopped.")
+
+
+@daemon.command
+@click.pass_obj
+def status(obj: CLI):
+    if control("ping") is None:
+        obj.console.print("The daemon isn't running.")
+        sys.exit(1)
@@ -0,0 +1,225 @@
+"""
+An in-process index of the files under a directory, for the search_files
+and glob_files tools.
+
+Directory listings and the text of files are kept between calls and reused
+for as long as their mtime (and, for files, size) stays the same, so
+searching a tree again only costs a `stat` per directory and file: only
+what changed is listed or read again. Text is kept within a byte budget,
+least recently used first out. Version control and dependency directories
+are skipped.
+
+There is one index per working directory (see `file_index`), shared by
+every tool call in the process.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+from .reading import SNIFF_BYTES
+
+IGNORED_DIRS = frozenset({
+    ".git", ".hg", ".svn", "__pycache__", "node_modules", ".venv", "venv", ".tox", ".mypy_cache",
+    ".pytest_cache",
+})
+# Marks a file that can't be searched: binary, too big or unreadable.
+UNSEARCHABLE = ""
+
+
+class _Listing(NamedTuple):
+    mtime_ns: int
+    files: tuple[str, ...]
+    dirs: tuple[str, ...]
+
+
+class _Text(NamedTuple):
+    mtime_ns: int
+    size: int
+    text: str
+
+
+class Match(NamedTuple):
+    path: str
+    line: int
+    text: str
+
+
+def glob_regex(pattern: str) -> re.Pattern:
+    """
+    A regex for a glob of relative paths: `*` and `?` don't match "/", `**/`
+    matches any number of directories and `[...]` is a character class.
+    """
+    out = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and (end := pattern.find("]", i + 2)) > 0:
+            body = pattern[i + 1:end]
+            out.append("[" + ("^" + body[1:] if body[0] == "!" else body).replace("\\", "\\\\") + "]")
+            i = end + 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return re.compile("".join(out) + r"\Z")
+
+
+def path_matcher(pattern: str):
+    """Match a glob against the whole relative path, or only the file name if it has no "/"."""
+    regex = glob_regex(pattern)
+    if "/" in pattern:
+        return lambda path: regex.match(path) is not None
+    return lambda path: regex.match(path.rpartition("/")[2]) is not None
+
+
+class FileIndex:
+    def __init__(self, root: Path, max_bytes: int = 64 * 1024 * 1024):
+        self.root = root
+        # Text beyond this many characters is evicted, least recently used first.
+        self.max_bytes = max_bytes
+        self._listings: dict[str, _Listing] = {}
+        self._texts: OrderedDict[str, _Text] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _listing(self, path: str) -> _Listing | None:
+        full = self.root / path
+        try:
+            mtime_ns = full.stat().st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            listing = self._listings.get(path)
+        if listing is not None and listing.mtime_ns == mtime_ns:
+            return listing
+        files, dirs = [], []
+        try:
+            with os.scandir(full) as entries:
+                for entry in entries:
+                    try:
+                        # Links to directories aren't followed, as they could form a loop.
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in IGNORED_DIRS:
+                                dirs.append(entry.name)
+                        elif entry.is_file():
+                            files.append(entry.name)
+                    except OSError:
+                        pass
+        except OSError:
+            return None
+        listing = _Listing(mtime_ns, tuple(sorted(files)), tuple(sorted(dirs)))
+        with self._lock:
+            self._listings[path] = listing
+        return listing
+
+    def walk(self, path: str = "") -> Iterator[str]:
+        """
+        Paths of the files under `path` (relative to the root, with "/"), in
+        sorted order; just `path` if it's a file.
+        """
+        listing = self._listing(path)
+        if listing is None:
+            if path and (self.root / path).is_file():
+                yield path
+            return
+        prefix = f"{path}/" if path else ""
+        for name in listing.files:
+            yield prefix + name
+        for name in listing.dirs:
+            yield from self.walk(prefix + name)
+
+    def text(self, path: str, max_file_bytes: int) -> str:
+        """The text of a file, or UNSEARCHABLE."""
+        try:
+            stat = (self.root / path).stat()
+        except OSError:
+            return UNSEARCHABLE
+        with self._lock:
+            cached = self._texts.get(path)
+            if cached is not None and cached.mtime_ns == stat.st_mtime_ns and cached.size == stat.st_size:
+                self._texts.move_to_end(path)
+                return cached.text
+        if stat.st_size > max_file_bytes:
+            return UNSEARCHABLE
+        try:
+            data = (self.root / path).read_bytes()
+        except OSError:
+            return UNSEARCHABLE
+        text = UNSEARCHABLE if b"\0" in data[:SNIFF_BYTES] else data.decode(errors="replace")
+        with self._lock:
+            old = self._texts.pop(path, None)
+            if old is not None:
+                self._bytes -= len(old.text)
+            self._texts[path] = _Text(stat.st_mtime_ns, stat.st_size, text)
+            self._bytes += len(text)
+            while self._bytes > self.max_bytes and len(self._texts) > 1:
+                _, evicted = self._texts.popitem(last=False)
+                self._bytes -= len(evicted.text)
+        return text
+
+    def search(self, regex: re.Pattern, path: str = "", include=None, max_results: int = 200,
+               max_file_bytes: int = 1024 * 1024) -> tuple[list[Match], bool, int]:
+        """
+        Lines matching `regex` in the files under `path` whose paths
+        relative to it `include` accepts, up to `max_results`. Returns the
+        matches, whether there were more and the number of files searched.
+        """
+        matches: list[Match] = []
+        searched = 0
+        for file in self.walk(path):
+            if include is not None and not include(_relative(file, path)):
+                continue
+            text = self.text(file, max_file_bytes)
+            searched += 1
+            # Most files don't match at all; only split those that do into lines.
+            if not text or not regex.search(text):
+                continue
+            for number, line in enumerate(text.splitlines(), 1):
+                if regex.search(line):
+                    if len(matches) == max_results:
+                        return matches, True, searched
+                    matches.append(Match(file, number, line))
+        return matches, False, searched
+
+    def glob(self, include, path: str = "", limit: int = 500) -> tuple[list[str], bool]:
+        """Files under `path` whose paths relative to it `include` accepts, up to `limit`; see `search`."""
+        found = []
+        for file in self.walk(path):
+            if include(_relative(file, path)):
+                if len(found) == limit:
+                    return found, True
+                found.append(file)
+        return found, False
+
+
+def _relative(file: str, path: str) -> str:
+    if not path:
+        return file
+    return file[len(path) + 1:] if file != path else file.rpartition("/")[2]
+
+
+_indexes: dict[Path, FileIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def file_index(max_bytes: int = 64 * 1024 * 1024) -> FileIndex:
+    """The index of the current working directory."""
+    root = Path.cwd()
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = FileIndex(root, max_bytes)
+        return index
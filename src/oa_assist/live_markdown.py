@@ -0,0 +1,158 @@
+"""
+Markdown rendered as it streams in.
+
+Rendering a reply with `Markdown(text)` parses and lays out the whole text
+every time it's drawn, which gets slow, and flickers, as a streamed reply
+grows. Here the text is split into top-level blocks (paragraphs, lists,
+tables, fenced code and so on) as it arrives. Each block is printed once,
+as soon as the next one starts, and only the block still being written is
+redrawn, in a `Live` region below the printed ones, at most a few times a
+second however fast text arrives.
+"""
+import re
+
+from ._dep.rich import Console, ConsoleOptions, Live, Markdown, RenderResult
+
+FENCE = re.compile(r" {0,3}(`{3,}|~{3,})")
+LIST_ITEM = re.compile(r"\s*([-*+]|\d{1,9}[.)])(\s|$)")
+# Rich renders lists and tables with a blank line before them, even at the top.
+SPACED_TOKENS = ("bullet_list_open", "ordered_list_open", "table_open")
+
+
+class BlockSplitter:
+    """
+    Splits Markdown into top-level blocks as its text arrives.
+
+    A block ends at a blank line followed by an unindented line (indented
+    lines continue a list item or code block, and items continue a list),
+    or with a closing code fence. This is coarser than a Markdown parser, but a block boundary
+    it misses only means a block is redrawn for longer.
+    """
+
+    def __init__(self):
+        # The text of the block being written, not yet returned.
+        self.pending = ""
+        # Where the first line of `pending` that hasn't been scanned starts.
+        self._line = 0
+        self._fence: str | None = None
+        self._blank = False
+
+    def _split(self, end: int, blocks: list[str]):
+        block, self.pending = self.pending[:end], self.pending[end:]
+        self._line -= end
+        if block.strip():
+            blocks.append(block)
+
+    def feed(self, text: str) -> list[str]:
+        """Add text, returning the blocks it completed."""
+        self.pending += text
+        blocks: list[str] = []
+        while self._line < len(self.pending):
+            start = self._line
+            end = self.pending.find("\n", start)
+            if self._blank and self._fence is None and not self.pending[start].isspace():
+                if LIST_ITEM.match(self.pending):
+                    # A loose list goes on if the line is another item.
+                    if end == -1:
+                        break
+                    ends = not LIST_ITEM.match(self.pending, start)
+                else:
+                    ends = True
+                if ends:
+                    self._split(start, blocks)
+                    start, end = self._line, end - start if end != -1 else -1
+                self._blank = False
+            if end == -1:
+                break
+            line = self.pending[start:end]
+            self._line = end + 1
+            if self._fence is not None:
+                if line.strip() == self._fence[0] * len(line.strip()) and len(line.strip()) >= len(self._fence):
+                    self._fence = None
+                    self._split(self._line, blocks)
+                continue
+            match = FENCE.match(line)
+            if match:
+                # A fence interrupts a paragraph.
+                self._split(start, blocks)
+                self._fence = match.group(1)
+            self._blank = not line.strip()
+        return blocks
+
+    def finish(self) -> str:
+        """The rest of the text, which is the last block."""
+        block, self.pending = self.pending, ""
+        self._line = 0
+        self._fence = None
+        self._blank = False
+        return block
+
+
+class _Trailing:
+    """The block being written, parsed only when `Live` draws it, and only if it has changed."""
+
+    def __init__(self, splitter: BlockSplitter, code_theme: str):
+        self.splitter = splitter
+        self.code_theme = code_theme
+        self._text = ""
+        self._markdown = None
+
+    def __rich_console__(self, console: Console, options: ConsoleOptions) -> RenderResult:
+        if self.splitter.pending != self._text or self._markdown is None:
+            self._text = self.splitter.pending
+            self._markdown = Markdown(self._text, code_theme=self.code_theme)
+        yield self._markdown
+
+
+class LiveMarkdown:
+    """
+    Renders Markdown text fed to it in chunks, e.g. streamed deltas:
+
+        stream = LiveMarkdown(console)
+        stream.start()
+        for chunk in chunks:
+            stream.feed(chunk)
+        stream.finish()
+    """
+
+    def __init__(self, console: Console, code_theme: str = "monokai", refresh_per_second: float = 8):
+        self.console = console
+        self.code_theme = code_theme
+        self.splitter = BlockSplitter()
+        self.live = Live(
+            _Trailing(self.splitter, code_theme),
+            console=console,
+            refresh_per_second=refresh_per_second,
+            transient=True,
+        )
+        # Whether the next block needs a blank line before it, as `Markdown` would add.
+        self._separate = False
+
+    def _print(self, block: str):
+        markdown = Markdown(block, code_theme=self.code_theme)
+        tokens = markdown.parsed
+        if self._separate and tokens and tokens[0].type not in SPACED_TOKENS:
+            self.console.line()
+        self.console.print(markdown)
+        self._separate = bool(tokens) and tokens[-1].type != "hr"
+
+    def start(self):
+        self.live.start()
+
+    def feed(self, text: str):
+        # Printing while the Live region is shown puts the output above it.
+        for block in self.splitter.feed(text):
+            self._print(block)
+
+    def finish(self):
+        self.live.stop()
+        block = self.splitter.finish()
+        if block.strip():
+            self._print(block)
+
+    def __enter__(self) -> "LiveMarkdown":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.finish()
@@ -1,9 +1,13 @@
+import sys
 
-from . import cli
-from . import assistant_cli
-from . import thread_cli
+from .daemon import forward
 
 
 def main():
-    cli.cli()
+    # Try the daemon first, before paying for any of the CLI's imports.
+    code = forward(sys.argv[1:])
+    if code is not None:
+        sys.exit(code)
 
+    from .cli import cli
+    cli()
@@ -0,0 +1,310 @@
+"""
+Per-run latency and token metrics.
+
+Each run gets a `RunMetrics` that records how long the run spent in each
+status (queued, in_progress, requires_action), client-side spans (running
+tools, submitting their outputs, fetching the response), how many times
+it was polled, how long each tool call took and the tokens it used.
+Finished runs are written to a local SQLite store that `oaa stats`
+summarises, and, when opentelemetry is installed, recorded as OTel
+histograms too.
+"""
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from importlib.util import find_spec
+from logging import exception
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Iterable, NamedTuple
+
+METRICS_PATH = Path("~/.local/state/oa-assist/metrics.db").expanduser()
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled", "expired")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    thread_id TEXT,
+    assistant_id TEXT,
+    started_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    status TEXT,
+    polls INTEGER NOT NULL,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    total_tokens INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started_at);
+CREATE TABLE IF NOT EXISTS phases (
+    run_id TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS phases_run ON phases (run_id);
+CREATE TABLE IF NOT EXISTS tool_calls (
+    run_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    success INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tool_calls_run ON tool_calls (run_id);
+"""
+
+
+class ToolCallTiming(NamedTuple):
+    name: str
+    seconds: float
+    success: bool
+
+
+class RunMetrics:
+    """Timings for a single run, fed by its PendingOperation and tool executor."""
+
+    def __init__(self, thread_id: str | None = None, assistant_id: str | None = None):
+        self.run_id: str | None = None
+        self.thread_id = thread_id
+        self.assistant_id = assistant_id
+        self.started_at = time.time()
+        self.status: str | None = None
+        self.polls = 0
+        self.phases: dict[str, float] = {}
+        self.tool_calls: list[ToolCallTiming] = []
+        self.usage: dict[str, int] = {}
+        self._start = time.monotonic()
+        self._phase_start = self._start
+        self._end: float | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def duration(self) -> float:
+        return (self._end or time.monotonic()) - self._start
+
+    def _add(self, phase: str, seconds: float):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def update(self, run):
+        """Note the run's current status, closing the previous status's phase if it changed."""
+        self.run_id = run.id
+        if run.status == self.status:
+            return
+        now = time.monotonic()
+        if self.status is not None and self.status not in TERMINAL_STATUSES:
+            self._add(self.status, now - self._phase_start)
+        self.status = run.status
+        self._phase_start = now
+
+    def poll(self):
+        self.polls += 1
+
+    @contextmanager
+    def timed(self, phase: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._add(phase, time.monotonic() - start)
+
+    def tool_call(self, name: str, seconds: float, success: bool):
+        with self._lock:
+            self.tool_calls.append(ToolCallTiming(name, seconds, success))
+
+    def finish(self, run=None, status: str | None = None):
+        if run is not None:
+            self.update(run)
+            usage = getattr(run, "usage", None)
+            if isinstance(usage, dict):
+                # SDKs that predate usage keep it as an unparsed extra field.
+                usage = SimpleNamespace(**usage)
+            if usage is not None:
+                self.usage = {
+                    name: getattr(usage, name, None) or 0
+                    for name in ("prompt_tokens", "completion_tokens", "total_tokens")
+                }
+        if self._end is None:
+            self._end = time.monotonic()
+            if self.status is not None and self.status not in TERMINAL_STATUSES:
+                self._add(self.status, self._end - self._phase_start)
+        if status is not None:
+            self.status = status
+
+
+class MetricsStore:
+    def __init__(self, path: Path = METRICS_PATH):
+        self.path = path
+        self._db: sqlite3.Connection | None = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def record(self, metrics: RunMetrics):
+        if metrics.run_id is None:
+            # The run was never created, so there's nothing to attribute.
+            return
+        try:
+            self._write(metrics)
+        except sqlite3.Error:
+            # Metrics are best effort; never fail a run over them.
+            exception("Couldn't record metrics for run '%s'", metrics.run_id)
+            return
+        _record_otel(metrics)
+
+    def _write(self, metrics: RunMetrics):
+        with self.db as db:
+            db.execute("DELETE FROM phases WHERE run_id = ?", (metrics.run_id,))
+            db.execute("DELETE FROM tool_calls WHERE run_id = ?", (metrics.run_id,))
+            db.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    metrics.run_id, metrics.thread_id, metrics.assistant_id, metrics.started_at,
+                    metrics.duration, metrics.status, metrics.polls,
+                    metrics.usage.get("prompt_tokens"), metrics.usage.get("completion_tokens"),
+                    metrics.usage.get("total_tokens"),
+                ),
+            )
+            db.executemany(
+                "INSERT INTO phases VALUES (?, ?, ?)",
+                [(metrics.run_id, phase, seconds) for phase, seconds in metrics.phases.items()],
+            )
+            db.executemany(
+                "INSERT INTO tool_calls VALUES (?, ?, ?, ?)",
+                [(metrics.run_id, *call) for call in metrics.tool_calls],
+            )
+
+    def summary(self, since: float | None = None, assistant_id: str | None = None) -> "MetricsSummary":
+        where = "WHERE started_at >= ?" if since is not None else "WHERE 1"
+        params: list[Any] = [since] if since is not None else []
+        if assistant_id is not None:
+            where += " AND assistant_id = ?"
+            params.append(assistant_id)
+        runs = f"SELECT run_id FROM runs {where}"
+
+        summary = MetricsSummary()
+        for duration, polls, status, prompt, completion, total in self.db.execute(
+                f"SELECT duration, polls, status, prompt_tokens, completion_tokens, total_tokens FROM runs {where}",
+                params):
+            summary.add("run", duration)
+            summary.polls.append(polls)
+            summary.statuses[status] = summary.statuses.get(status, 0) + 1
+            for name, value in (("prompt", prompt), ("completion", completion), ("total", total)):
+                summary.tokens[name] = summary.tokens.get(name, 0) + (value or 0)
+        for phase, seconds in self.db.execute(
+                f"SELECT phase, seconds FROM phases WHERE run_id IN ({runs})", params):
+            summary.add(f"phase:{phase}", seconds)
+        for name, seconds, success in self.db.execute(
+                f"SELECT name, seconds, success FROM tool_calls WHERE run_id IN ({runs})", params):
+            summary.add(f"tool:{name}", seconds)
+            if not success:
+                summary.tool_failures[name] = summary.tool_failures.get(name, 0) + 1
+        return summary
+
+
+class MetricsSummary:
+    """Samples collected from the store, keyed by "run", "phase:<name>" or "tool:<name>"."""
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = {}
+        self.polls: list[int] = []
+        self.statuses: dict[str | None, int] = {}
+        self.tokens: dict[str, int] = {}
+        self.tool_failures: dict[str, int] = {}
+
+    def add(self, name: str, value: float):
+        self.samples.setdefault(name, []).append(value)
+
+    @property
+    def runs(self) -> int:
+        return len(self.samples.get("run", []))
+
+
+def percentile(values: Iterable[float], q: float) -> float:
+    """The `q`th percentile (0-100) of `values`, interpolating between ranks."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+QUANTILES = (50, 90, 99)
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _summary_lines(name: str, help: str, series: dict[str, list[float]], label: str | None) -> list[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} summary"]
+    for key, values in sorted(series.items()):
+        labels = f'{label}="{_label(key)}",' if label else ""
+        for q in QUANTILES:
+            lines.append(f'{name}{{{labels}quantile="{q / 100}"}} {percentile(values, q):.6f}')
+        labels = f'{{{labels.rstrip(",")}}}' if labels else ""
+        lines.append(f"{name}_sum{labels} {sum(values):.6f}")
+        lines.append(f"{name}_count{labels} {len(values)}")
+    return lines
+
+
+def prometheus_text(summary: MetricsSummary) -> str:
+    """Render a summary in the Prometheus text exposition format."""
+    def prefixed(prefix: str) -> dict[str, list[float]]:
+        return {key[len(prefix):]: values for key, values in summary.samples.items() if key.startswith(prefix)}
+
+    lines = _summary_lines("oaa_run_duration_seconds", "Wall time of each run.",
+                           {"": summary.samples.get("run", [])}, None)
+    lines += _summary_lines("oaa_run_phase_seconds", "Time runs spent in each status or client-side span.",
+                            prefixed("phase:"), "phase")
+    lines += _summary_lines("oaa_tool_call_seconds", "Duration of tool calls by tool name.",
+                            prefixed("tool:"), "tool")
+    lines += _summary_lines("oaa_run_polls", "Status polls made per run.",
+                            {"": [float(polls) for polls in summary.polls]}, None)
+    lines += ["# HELP oaa_runs_total Runs by final status.", "# TYPE oaa_runs_total counter"]
+    lines += [f'oaa_runs_total{{status="{_label(str(status))}"}} {count}'
+              for status, count in sorted(summary.statuses.items(), key=lambda item: str(item[0]))]
+    lines += ["# HELP oaa_tool_call_failures_total Failed or timed out tool calls.",
+              "# TYPE oaa_tool_call_failures_total counter"]
+    lines += [f'oaa_tool_call_failures_total{{tool="{_label(name)}"}} {count}'
+              for name, count in sorted(summary.tool_failures.items())]
+    lines += ["# HELP oaa_tokens_total Tokens used by runs.", "# TYPE oaa_tokens_total counter"]
+    lines += [f'oaa_tokens_total{{type="{kind}"}} {count}' for kind, count in sorted(summary.tokens.items())]
+    return "\n".join(lines) + "\n"
+
+
+_otel_instruments: dict[str, Any] | None = None
+
+
+def _record_otel(metrics: RunMetrics):
+    """Record a finished run with the OpenTelemetry metrics API, if it's installed."""
+    global _otel_instruments
+    if _otel_instruments is None:
+        if find_spec("opentelemetry") is None:
+            _otel_instruments = {}
+            return
+        from opentelemetry import metrics as otel
+
+        meter = otel.get_meter("oa_assist")
+        _otel_instruments = {
+            "run": meter.create_histogram("oaa.run.duration", unit="s"),
+            "phase": meter.create_histogram("oaa.run.phase.duration", unit="s"),
+            "tool": meter.create_histogram("oaa.tool_call.duration", unit="s"),
+            "tokens": meter.create_counter("oaa.tokens", unit="{token}"),
+        }
+    if not _otel_instruments:
+        return
+    _otel_instruments["run"].record(metrics.duration, {"status": metrics.status or ""})
+    for phase, seconds in metrics.phases.items():
+        _otel_instruments["phase"].record(seconds, {"phase": phase})
+    for call in metrics.tool_calls:
+        _otel_instruments["tool"].record(call.seconds, {"tool": call.name, "success": call.success})
+    for kind, count in metrics.usage.items():
+        _otel_instruments["tokens"].add(count, {"type": kind.removesuffix("_tokens")})
@@ -0,0 +1,204 @@
+"""
+Names and labels of assistants, threads and runs, resolved to ids locally.
+
+Commands that take an id also take an assistant's name or a label, or a
+unique prefix of one (or of an id), in the same spirit as the command
+shortcuts of `cli.ShortcutGroup`. Resolving one is a lookup in the names
+index of the object cache, which is kept up to date as objects are cached
+and labels are set, so it never has to list objects from the API.
+Commands that delete objects don't act on a prefix alone: they ask first,
+unless given --yes.
+
+Labels live in the user config; the index holds a copy, made the first
+time it's used and again whenever labels are edited with `oaa config`.
+"""
+import difflib
+import time
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple
+
+import click
+
+from .cache import ASSISTANT, LABEL, NAME, RUN, THREAD, ObjectCache
+from .cli import CLI
+
+if TYPE_CHECKING:
+    from .config import UserConfig
+
+ID_PREFIXES = {ASSISTANT: "asst_", THREAD: "thread_", RUN: "run_"}
+# Recorded once labels and already cached names have been indexed.
+NAMES_SYNC = "names"
+
+_SELECT_NAMES = (
+    "SELECT n.id, n.name, json_extract(o.data, '$.model'), o.created_at FROM names n "
+    "LEFT JOIN objects o ON o.kind = n.kind AND o.id = n.id WHERE n.kind = ? "
+)
+_SELECT_IDS = (
+    "SELECT o.id, COALESCE(json_extract(o.data, '$.name'), MIN(n.name)), json_extract(o.data, '$.model'), "
+    "o.created_at FROM objects o LEFT JOIN names n ON n.kind = o.kind AND n.id = o.id "
+    "WHERE o.kind = ? AND o.id >= ? AND o.id < ? GROUP BY o.id"
+)
+
+
+class UnknownName(LookupError):
+    """A name that matches no object, or more than one."""
+
+
+class PrefixMatch(LookupError):
+    """A reference that only matches an object by a prefix, when an exact match was asked for."""
+
+    def __init__(self, ref: str, match: "Named"):
+        super().__init__(f"'{ref}' is only a prefix of {match}")
+        self.match = match
+
+
+class Named(NamedTuple):
+    id: str
+    name: str | None
+    model: str | None
+    created_at: int | None
+
+    def __str__(self) -> str:
+        details = [self.id] if self.name else []
+        if self.model:
+            details.append(self.model)
+        if self.created_at:
+            details.append(time.strftime("%Y-%m-%d", time.localtime(self.created_at)))
+        return f"{self.name or self.id} ({', '.join(details)})" if details else self.id
+
+
+class NameIndex:
+    def __init__(self, cache: ObjectCache, config: "UserConfig"):
+        self.cache = cache
+        self.config = config
+
+    def _ensure(self):
+        if self.cache.is_synced(NAMES_SYNC, max_age=float("inf")):
+            return
+        labels = [
+            (kind, id, LABEL, label, label.casefold())
+            for kind, labelled in self.config.labels.model_dump().items()
+            for id, label in labelled.items()
+        ]
+        # Assistants cached before their names were indexed.
+        names = [
+            (ASSISTANT, assistant["id"], NAME, assistant["name"], assistant["name"].casefold())
+            for assistant in self.cache.list(ASSISTANT, None) if assistant.get("name")
+        ]
+        with self.cache.db as db:
+            db.execute("DELETE FROM names WHERE source = ?", (LABEL,))
+            db.executemany("INSERT OR REPLACE INTO names VALUES (?, ?, ?, ?, ?)", labels + names)
+        self.cache.mark_synced(NAMES_SYNC)
+
+    def invalidate(self):
+        """Copy labels from the config again, e.g. after they were edited directly."""
+        self.cache.forget(NAMES_SYNC)
+
+    def set_label(self, kind: str, id: str, label: str | None):
+        """Label an object, or remove its label; the config still needs saving."""
+        self._ensure()
+        labels: dict[str, str] = getattr(self.config.labels, kind)
+        with self.cache.db as db:
+            db.execute("DELETE FROM names WHERE kind = ? AND id = ? AND source = ?", (kind, id, LABEL))
+            if label:
+                labels[id] = label
+                db.execute("INSERT INTO names VALUES (?, ?, ?, ?, ?)", (kind, id, LABEL, label, label.casefold()))
+            else:
+                labels.pop(id, None)
+
+    def lookup(self, kind: str, ref: str, prefix: bool = False) -> list[Named]:
+        """Objects named or labelled `ref` (ignoring case), or whose names start with it."""
+        self._ensure()
+        key = ref.casefold()
+        if prefix:
+            rows = self.cache.db.execute(
+                _SELECT_NAMES + "AND n.key >= ? AND n.key < ? ORDER BY n.key", (kind, key, key + "\uffff"))
+        else:
+            rows = self.cache.db.execute(_SELECT_NAMES + "AND n.key = ?", (kind, key))
+        return _unique(Named(*row) for row in rows)
+
+    def lookup_id(self, kind: str, prefix: str) -> list[Named]:
+        """Cached objects whose ids start with `prefix`."""
+        return [Named(*row) for row in self.cache.db.execute(_SELECT_IDS, (kind, prefix, prefix + "\uffff"))]
+
+    def resolve(self, kind: str, ref: str, exact: bool = False) -> str:
+        """
+        The id that `ref` refers to: an object with that name or label, or
+        else the only one whose id, name or label starts with it. Raises
+        UnknownName if there's no such object, or more than one, and
+        PrefixMatch if `exact` and it only matched a prefix.
+        """
+        matches = self.lookup(kind, ref)
+        if matches or not ref.startswith(ID_PREFIXES[kind]):
+            by_prefix = not matches
+        else:
+            matches = self.lookup_id(kind, ref)
+            if not matches or ref in (match.id for match in matches):
+                # Possibly an object that isn't cached; the API will say if it doesn't exist.
+                return ref
+            by_prefix = True
+        if not matches:
+            matches = self.lookup(kind, ref, prefix=True)
+        if len(matches) == 1:
+            if exact and by_prefix:
+                raise PrefixMatch(ref, matches[0])
+            return matches[0].id
+        if matches:
+            raise UnknownName(f"Ambiguous {kind} '{ref}', could be: " + "; ".join(map(str, matches)))
+
+        message = f"Unknown {kind} '{ref}'"
+        keys = [key for key, in self.cache.db.execute("SELECT DISTINCT key FROM names WHERE kind = ?", (kind,))]
+        close = difflib.get_close_matches(ref.casefold(), keys, n=3)
+        if close:
+            message += ". Did you mean " + " or ".join(
+                str(named) for key in close for named in self.lookup(kind, key)) + "?"
+        raise UnknownName(message)
+
+
+def _unique(matches) -> list[Named]:
+    # An object can be both named and labelled the same.
+    seen = {}
+    for match in matches:
+        seen.setdefault(match.id, match)
+    return list(seen.values())
+
+
+class ObjectRef(click.ParamType):
+    """
+    A command argument taking an id, name or label, which is converted to the
+    id. With `confirm`, e.g. "Delete", a reference that only matches a prefix
+    is confirmed first, unless the command was given --yes (which must be
+    eager, so it's known by the time arguments are converted).
+    """
+
+    def __init__(self, kind: str, refresh: Callable[[CLI], Any] | None = None, confirm: str | None = None):
+        self.kind = kind
+        self.name = kind
+        # Called to fill the cache when a name isn't found and the kind has never been listed.
+        self.refresh = refresh
+        self.confirm = confirm
+
+    def resolve(self, obj: CLI, value: str, ctx) -> str:
+        exact = self.confirm is not None and not ctx.params.get("yes")
+        try:
+            return obj.names.resolve(self.kind, value, exact=exact)
+        except PrefixMatch as err:
+            click.confirm(f"{self.confirm} {self.kind} {err.match}?", abort=True)
+            return err.match.id
+
+    def convert(self, value, param, ctx):
+        obj = ctx.find_object(CLI)
+        try:
+            return self.resolve(obj, value, ctx)
+        except UnknownName as err:
+            if self.refresh is None or obj.cache.is_synced(self.kind, max_age=float("inf")):
+                self.fail(str(err), param, ctx)
+        with obj.console.status("Working..."):
+            self.refresh(obj)
+        try:
+            return self.resolve(obj, value, ctx)
+        except UnknownName as err:
+            self.fail(str(err), param, ctx)
+
+
+THREAD_REF = ObjectRef(THREAD)
+RUN_REF = ObjectRef(RUN)
@@ -0,0 +1,87 @@
+"""
+Run output for pipes and scripts, written without rich.
+
+`write_run` writes a run's replies as plain text and `write_ndjson` writes
+every event of the run as a JSON object per line. Both write each piece as
+soon as it arrives, and leave errors to the caller.
+"""
+import json
+import sys
+from typing import Any, TextIO
+
+
+def message_text(message) -> list[str]:
+    return [con.text.value for con in message.content if con.type == "text"]
+
+
+def write_run(out: TextIO, op):
+    """
+    Write a run's replies as plain text as they arrive, e.g. when output
+    is piped to another program; tool logs go to stderr.
+    """
+    streaming = False
+    for event in op.events():
+        match event.kind:
+            case "log":
+                print(event.data, file=sys.stderr)
+            case "delta":
+                out.write(event.data)
+                out.flush()
+                streaming = True
+            case "message" if streaming:
+                out.write("\n")
+                streaming = False
+            case "message":
+                out.write("".join(f"{text}\n" for text in message_text(event.data)))
+    out.flush()
+
+
+def event_record(event, op) -> dict[str, Any] | None:
+    """A RunEvent as a JSON-compatible dict with a "type", or None if it isn't reported."""
+    match event.kind:
+        case "status":
+            return {"type": "status", "run_id": event.data.id, "status": event.data.status}
+        case "delta":
+            return {"type": "delta", "text": event.data}
+        case "log":
+            return {"type": "log", "message": event.data}
+        case "tool":
+            return {
+                "type": "tool_call",
+                "name": event.data.name,
+                "seconds": round(event.data.seconds, 3),
+                "success": event.data.success,
+            }
+        case "message":
+            return {
+                "type": "message",
+                "id": event.data.id,
+                "run_id": event.data.run_id,
+                "text": "\n\n".join(message_text(event.data)),
+            }
+        case "done":
+            return {
+                "type": "done",
+                "thread_id": op.thread_interface.thread.id,
+                "run_id": event.data.id,
+                "status": event.data.status,
+            }
+    return None
+
+
+def write_ndjson(out: TextIO, op):
+    """
+    Write a run's events as JSON lines as they arrive, with a "usage"
+    event (the run's token counts) before the final "done".
+    """
+    for event in op.events():
+        if event.kind == "done":
+            write_record(out, {"type": "usage", **op.metrics.usage})
+        record = event_record(event, op)
+        if record is not None:
+            write_record(out, record)
+
+
+def write_record(out: TextIO, record: dict[str, Any]):
+    out.write(json.dumps(record) + "\n")
+    out.flush()
@@ -0,0 +1,206 @@
+"""
+Keep tool outputs within a size budget before they're submitted.
+
+Everything submitted becomes part of the thread, so an oversized output
+costs tokens and latency on every later turn as well as this one. Outputs
+over `ToolSettings.output_budget` characters are reduced, in order, by:
+
+  - collapsing runs of repeated lines;
+  - summarising directory listings (first entries, plus counts by extension);
+  - keeping the head and tail and eliding the middle.
+
+JSON results stay valid JSON. When there's a "content", only that is
+reduced; a page of a file (with a "next_offset") keeps its head instead,
+with "next_offset" and "end_line" moved back to where it now stops, so a
+model paging through the file doesn't skip what was cut. Other results
+have their longest lists (e.g. search_files' "matches") cut short, with a
+count of the entries left out, and their longest strings truncated. The
+savings are reported through the run's log.
+"""
+import json
+from collections import Counter
+from logging import info
+from pathlib import PurePath
+from typing import NamedTuple
+
+from openai.types.beta.threads.run_submit_tool_outputs_params import ToolOutput
+from openai.types.beta.threads.required_action_function_tool_call import RequiredActionFunctionToolCall
+
+from .capture import BoundedBuffer
+from .tool_functions import FunctionEventHandler, ToolSettings, fit_list
+
+
+class Reduced(NamedTuple):
+    output: str
+    original_chars: int
+    steps: list[str]
+
+
+def dedupe_lines(text: str) -> str:
+    """Collapse runs of identical lines into one line and a count."""
+    lines = text.split("\n")
+    result = []
+    index = 0
+    while index < len(lines):
+        end = index + 1
+        while end < len(lines) and lines[end] == lines[index]:
+            end += 1
+        result.append(lines[index])
+        if end - index > 2:
+            result.append(f"[previous line repeated {end - index - 1} more times]")
+        elif end - index == 2:
+            result.append(lines[index])
+        index = end
+    return "\n".join(result)
+
+
+def truncate(text: str, max_chars: int) -> str:
+    """Keep the head and tail of `text`, with a marker for what was elided."""
+    buffer = BoundedBuffer(max(0, max_chars - 64), max_lines=max_chars)
+    buffer.feed(text.encode())
+    return buffer.getvalue()
+
+
+def _line_count(text: str) -> int:
+    return text.count("\n") + (1 if text and not text.endswith("\n") else 0)
+
+
+def cut_page(data: dict, max_chars: int) -> dict:
+    """
+    Keep the head of a page of a file in `max_chars`, whole lines where
+    possible, and move its paging fields back to the end of what's kept.
+    """
+    content = data["content"]
+    cut = content.rfind("\n", 0, max_chars + 1) + 1
+    if cut == 0:
+        cut = max_chars
+        if "end_line" in data:
+            data["partial_line"] = True
+    elif "partial_line" in data:
+        data["partial_line"] = False
+    head = content[:cut]
+    if "end_line" in data:
+        data["end_line"] -= _line_count(content) - _line_count(head)
+    if data.get("offset") is not None:
+        data["next_offset"] = data["offset"] + len(head.encode())
+    data["eof"] = False
+    data["content"] = head
+    return data
+
+
+def summarise_listing(entries: list, max_chars: int) -> tuple[list, dict]:
+    """As many entries as fit in `max_chars`, and a summary of the rest."""
+    kept = []
+    used = 0
+    for entry in entries:
+        used += len(json.dumps(entry)) + 2
+        if used > max_chars // 2:
+            break
+        kept.append(entry)
+    omitted = entries[len(kept):]
+    extensions = Counter(
+        "directories" if str(entry).endswith("/") else PurePath(str(entry)).suffix or "(none)"
+        for entry in omitted
+    )
+    return kept, {"omitted": len(omitted), "by_extension": dict(extensions.most_common(20))}
+
+
+class OutputBudget:
+    def __init__(self, settings: ToolSettings):
+        self.max_chars = settings.output_budget
+
+    def reduce_text(self, text: str, max_chars: int, steps: list[str]) -> str:
+        deduped = dedupe_lines(text)
+        if len(deduped) < len(text):
+            steps.append("deduplicated")
+            text = deduped
+        if len(text) > max_chars:
+            steps.append("truncated")
+            text = truncate(text, max_chars)
+        return text
+
+    def reduce(self, output: str) -> Reduced:
+        """Reduce `output` to fit the budget."""
+        steps: list[str] = []
+        if self.max_chars is None or len(output) <= self.max_chars:
+            return Reduced(output, len(output), steps)
+        try:
+            data = json.loads(output)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return Reduced(self.reduce_text(output, self.max_chars, steps), len(output), steps)
+        if not isinstance(data.get("content"), (str, list)):
+            return Reduced(json.dumps(self.reduce_fields(data, steps)), len(output), steps)
+
+        content = data["content"]
+        encoded = len(json.dumps(content))
+        # Less what the "content_reduced" flag takes.
+        room = max(0, self.max_chars - (len(output) - encoded) - 25)
+        if isinstance(content, list):
+            data["content"], data["summary"] = summarise_listing(content, room)
+            steps.append("summarised listing")
+        else:
+            # `room` is in encoded characters; escaping may take more than one per character.
+            room = room * len(content) // max(encoded, 1)
+            if "next_offset" in data:
+                # Deduplicating or eliding lines would throw paging off.
+                while True:
+                    cut = cut_page(dict(data), room)
+                    over = len(json.dumps(cut)) + 25 - self.max_chars
+                    if over <= 0 or room == 0:
+                        break
+                    # Escaping isn't spread evenly; try again with less.
+                    room = max(0, room - over)
+                data = cut
+                steps.append("cut short")
+            else:
+                data["content"] = self.reduce_text(content, room, steps)
+            data["content_reduced"] = True
+        return Reduced(json.dumps(data), len(output), steps)
+
+    def reduce_fields(self, data: dict, steps: list[str]) -> dict:
+        """Cut the longest lists and strings in `data` until it fits."""
+        while (size := len(json.dumps(data))) > self.max_chars:
+            fields = [(key, value) for key, value in data.items() if isinstance(value, (list, str)) and value]
+            if not fields:
+                break
+            key, value = max(fields, key=lambda field: len(json.dumps(field[1])))
+            encoded = len(json.dumps(value))
+            room = max(0, encoded - (size - self.max_chars))
+            if isinstance(value, list):
+                kept = fit_list(value, room)
+                data[key] = kept
+                data[f"{key}_omitted"] = data.get(f"{key}_omitted", 0) + len(value) - len(kept)
+                data["truncated"] = True
+                steps.append(f"left out {len(value) - len(kept)} {key}")
+            else:
+                data[key] = truncate(value, room * len(value) // encoded)
+                steps.append(f"truncated {key}")
+            if data[key] == value:
+                break
+        return data
+
+    def apply(
+        self,
+        tool_calls: list[RequiredActionFunctionToolCall],
+        outputs: list[ToolOutput],
+        events: FunctionEventHandler,
+    ) -> list[ToolOutput]:
+        if self.max_chars is None:
+            return outputs
+        names = {call.id: call.function.name for call in tool_calls}
+        result = []
+        for output in outputs:
+            name = names.get(output["tool_call_id"], "tool")
+            reduced = self.reduce(output["output"])
+            text = reduced.output
+            if reduced.steps:
+                saved = reduced.original_chars - len(text)
+                info("Reduced %s output by %d characters: %s", name, saved, ", ".join(reduced.steps))
+                events.log(
+                    f"Reduced {name} output from {reduced.original_chars} to {len(text)} characters "
+                    f"({', '.join(reduced.steps)})"
+                )
+            result.append(ToolOutput(output=text, tool_call_id=output["tool_call_id"]))
+        return result
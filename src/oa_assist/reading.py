@@ -0,0 +1,127 @@
+"""
+Bounded file and directory reads for the read_file tool.
+
+Files are read a window at a time, so the memory used doesn't depend on
+the size of the file; large files are memory-mapped so that finding a line
+range doesn't mean reading everything before it into Python.
+"""
+import heapq
+import mmap
+import os
+from pathlib import Path
+from typing import NamedTuple
+
+SNIFF_BYTES = 8192
+
+
+class Chunk(NamedTuple):
+    data: bytes
+    offset: int
+    size: int
+    # Set when reading by line; the last line included.
+    end_line: int | None = None
+    # Whether that line is cut short, being longer than the bytes asked for;
+    # the rest of it starts at `next_offset`.
+    partial: bool = False
+
+    @property
+    def next_offset(self) -> int | None:
+        end = self.offset + len(self.data)
+        return end if end < self.size else None
+
+
+class _Source:
+    """A read-only view of a file: an mmap for large files, a plain file otherwise."""
+
+    def __init__(self, path: Path, mmap_threshold: int):
+        self.file = open(path, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.map = None
+        if self.size >= mmap_threshold:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+    def read(self, offset: int, length: int) -> bytes:
+        if self.map is not None:
+            return self.map[offset:offset + length]
+        self.file.seek(offset)
+        return self.file.read(length)
+
+    def find_line(self, line: int) -> int:
+        """Byte offset of the start of a 1-based line (the file size if past the end)."""
+        pos = 0
+        if self.map is not None:
+            for _ in range(line - 1):
+                pos = self.map.find(b"\n", pos) + 1
+                if pos == 0:
+                    return self.size
+            return pos
+        self.file.seek(0)
+        for _ in range(line - 1):
+            if not self.file.readline():
+                return self.size
+        return self.file.tell()
+
+
+def is_binary(path: Path) -> bool:
+    """Guess whether a file is binary from a NUL byte near its start."""
+    with open(path, "rb") as f:
+        return b"\0" in f.read(SNIFF_BYTES)
+
+
+def read_bytes(path: Path, offset: int, length: int, mmap_threshold: int) -> Chunk:
+    with _Source(path, mmap_threshold) as source:
+        offset = min(max(0, offset), source.size)
+        return Chunk(source.read(offset, length), offset, source.size)
+
+
+def read_lines(path: Path, start: int, end: int | None, max_bytes: int, mmap_threshold: int) -> Chunk:
+    """
+    Read lines `start`..`end` (1-based, inclusive), stopping at a line
+    boundary within `max_bytes`, unless the first line alone is longer.
+    """
+    with _Source(path, mmap_threshold) as source:
+        start = max(1, start)
+        offset = source.find_line(start)
+        if offset >= source.size:
+            return Chunk(b"", source.size, source.size, start - 1)
+        data = source.read(offset, max_bytes)
+        lines = data.split(b"\n")
+        partial = False
+        if len(lines) > 1 and (offset + len(data) < source.size or data.endswith(b"\n")):
+            # The last piece is incomplete or empty.
+            lines = lines[:-1]
+        elif offset + len(data) < source.size:
+            partial = True
+        if end is not None:
+            lines = lines[:max(0, end - start + 1)]
+        partial = partial and bool(lines)
+        data = b"\n".join(lines)
+        if offset + len(data) < source.size and not partial:
+            data += b"\n"
+        return Chunk(data, offset, source.size, start + len(lines) - 1, partial)
+
+
+def list_directory(path: Path, limit: int, after: str | None = None) -> tuple[list[str], str | None]:
+    """
+    Up to `limit` entries of a directory in name order, starting after `after`.
+
+    Returns the entries (sub-directories with a trailing slash) and the
+    token for the next page, if there is one.
+    """
+    with os.scandir(path) as entries:
+        page = heapq.nsmallest(
+            limit + 1,
+            (entry for entry in entries if after is None or entry.name > after),
+            key=lambda entry: entry.name,
+        )
+    names = [entry.name + ("/" if entry.is_dir() else "") for entry in page[:limit]]
+    next_token = page[limit - 1].name if len(page) > limit else None
+    return names, next_token
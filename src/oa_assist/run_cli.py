@@ -0,0 +1,152 @@
+import time
+
+import click
+import openai
+from rich.prompt import Prompt
+
+from .assistant import AssistantInterface, ThreadInterface
+from .chat import render_run
+from .cli import cli, CLI
+from .metrics import TERMINAL_STATUSES
+from .names import RUN_REF
+from .runs import ActiveRun
+from .tool_executor import ToolExecutor
+from .ui import Table
+
+
+@cli.group()
+@click.pass_obj
+def run(obj: CLI):
+    """Runs in progress, including those left behind by interrupted commands."""
+    pass
+
+
+def find_run(obj: CLI, run_id: str | None) -> ActiveRun:
+    """The given run, or else the newest interrupted one on the selected thread."""
+    if run_id:
+        active = obj.runs.get(run_id)
+        if active:
+            return active
+        # Not started here; assume it's on the selected thread.
+        if obj.config.selected.thread_id is None:
+            raise click.ClickException(f"Unknown run {run_id} and no thread selected")
+        return ActiveRun(run_id, obj.config.selected.thread_id, None, 0, 0.0)
+
+    orphans = obj.runs.orphans(obj.config.selected.thread_id) or obj.runs.orphans()
+    if not orphans:
+        raise click.ClickException("No interrupted runs; pass a RUN_ID")
+    return orphans[0]
+
+
+def retrieve_run(obj: CLI, active: ActiveRun):
+    try:
+        return obj.openai.beta.threads.runs.retrieve(thread_id=active.thread_id, run_id=active.run_id)
+    except openai.NotFoundError:
+        return None
+
+
+def attach_run(obj: CLI, thread: ThreadInterface, active: ActiveRun):
+    obj.runs.claim(active.run_id, active.thread_id, active.assistant_id)
+    try:
+        render_run(obj.console, thread.attach(active.run_id))
+    except ValueError as err:
+        raise click.ClickException(str(err))
+
+
+def cancel_run(obj: CLI, active: ActiveRun):
+    try:
+        run = obj.openai.beta.threads.runs.cancel(thread_id=active.thread_id, run_id=active.run_id)
+    except (openai.BadRequestError, openai.NotFoundError) as err:
+        # Usually because the run has already finished.
+        obj.console.print(f"Couldn't cancel run [bold]{active.run_id}[/bold]: {err.message}")
+    else:
+        obj.console.print(f"Run [bold]{run.id}[/bold] is {run.status}.")
+    obj.runs.remove(active.run_id)
+
+
+def resolve_orphans(obj: CLI, thread: ThreadInterface):
+    """Offer to resume or cancel runs on the thread that interrupted commands left behind."""
+    for active in obj.runs.orphans(thread.thread.id):
+        run = retrieve_run(obj, active)
+        if run is None or run.status in TERMINAL_STATUSES:
+            obj.runs.remove(active.run_id)
+            continue
+        choice = Prompt.ask(
+            f"Run [bold]{run.id}[/bold] from an interrupted session is still {run.status}. "
+            "Resume it, cancel it or ignore it?",
+            console=obj.console,
+            choices=["resume", "cancel", "ignore"],
+            default="resume",
+        )
+        if choice == "resume":
+            attach_run(obj, thread, active)
+        elif choice == "cancel":
+            cancel_run(obj, active)
+
+
+@run.command(name="list")
+@click.pass_obj
+def list_runs(obj: CLI):
+    table = Table("Run", "Thread", "Started", "Followed by", title="Active runs")
+    for active in obj.runs.active():
+        if active.orphaned:
+            # Forget runs whose process has gone if they have since finished.
+            run = retrieve_run(obj, active)
+            if run is None or run.status in TERMINAL_STATUSES:
+                obj.runs.remove(active.run_id)
+                continue
+        table.add_row(
+            active.run_id,
+            obj.config.labels.thread.get(active.thread_id, active.thread_id),
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(active.started_at)),
+            "[yellow]nothing (interrupted)[/yellow]" if active.orphaned else f"process {active.pid}",
+        )
+    obj.console.print(table)
+
+
+@run.command
+@click.argument("run_id", required=False, type=RUN_REF)
+@click.option("--force", "-f", is_flag=True, help="Attach even if another process is following the run.")
+@click.pass_obj
+def attach(obj: CLI, run_id: str | None, force: bool):
+    """
+    Follow a run to completion, running any tools it calls here.
+
+    RUN_ID defaults to the newest interrupted run on the selected thread.
+    """
+    active = find_run(obj, run_id)
+    if active.pid and not active.orphaned and not force:
+        raise click.ClickException(f"Run {active.run_id} is being followed by process {active.pid}")
+
+    assistant_id = active.assistant_id or obj.config.selected.assistant_id
+    if assistant_id is None:
+        raise click.ClickException("No assistant selected")
+    acc = AssistantInterface.retrieve(
+        obj.openai,
+        assistant_id,
+        obj.tools,
+        executor=ToolExecutor(obj.config.tools),
+        cache=obj.cache,
+        metrics=obj.metrics,
+        runs=obj.runs,
+        run_policy=obj.config.runs,
+    )
+    attach_run(obj, acc.retrieve_thread(active.thread_id), active)
+
+
+@run.command
+@click.argument("run_id", required=False, type=RUN_REF)
+@click.option("--all", "all_orphans", is_flag=True, help="Cancel every interrupted run.")
+@click.pass_obj
+def cancel(obj: CLI, run_id: str | None, all_orphans: bool):
+    """
+    Cancel a run, unlocking its thread.
+
+    RUN_ID defaults to the newest interrupted run on the selected thread.
+    """
+    targets = obj.runs.orphans() if all_orphans else [find_run(obj, run_id)]
+    if not targets:
+        obj.console.print("No interrupted runs.")
+    with obj.console.status("Working..."):
+        for active in targets:
+            cancel_run(obj, active)
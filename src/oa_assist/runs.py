@@ -0,0 +1,137 @@
+"""
+Runs in progress, so that they can be picked up again.
+
+A run keeps going on the server when the process following it is
+interrupted: it may still be using tokens, or wait in requires_action for
+tool outputs that will never arrive, leaving its thread locked until it
+expires. Runs are recorded here once started, with the id of the process
+following them (the client's when a command is served by the daemon, see
+`RunStore.pid`), and removed when they reach a terminal status. A record
+whose process has gone is an orphan, which `oaa run attach` can resume
+and `oaa run cancel` can stop; `oaa chat` offers to do either for orphans
+on the selected thread.
+
+Runs that end without completing are handled according to a `RunPolicy`.
+"""
+import os
+import sqlite3
+import time
+from logging import exception
+from pathlib import Path
+from typing import NamedTuple
+
+from .metrics import TERMINAL_STATUSES
+from .settings import RunPolicy
+
+RUNS_PATH = Path("~/.local/state/oa-assist/runs.db").expanduser()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS active_runs (
+    run_id TEXT PRIMARY KEY,
+    thread_id TEXT NOT NULL,
+    assistant_id TEXT,
+    pid INTEGER NOT NULL,
+    started_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS active_runs_thread ON active_runs (thread_id);
+"""
+
+
+# Terminal statuses other than "completed".
+UNFINISHED_STATUSES = ("failed", "cancelled", "expired")
+
+
+class RunFailed(ValueError):
+    """A run ended without completing and the run policy gave up on it."""
+
+    def __init__(self, run):
+        error = getattr(run, "last_error", None)
+        super().__init__(f"Run {run.id} {run.status}" + (f": {error.message}" if error else ""))
+        self.run = run
+
+
+def process_alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ActiveRun(NamedTuple):
+    run_id: str
+    thread_id: str
+    assistant_id: str | None
+    pid: int
+    started_at: float
+
+    @property
+    def orphaned(self) -> bool:
+        return self.pid != os.getpid() and not process_alive(self.pid)
+
+
+class RunStore:
+    def __init__(self, path: Path = RUNS_PATH, pid: int | None = None):
+        self.path = path
+        # The process runs are recorded as followed by: the one whose exit
+        # leaves them orphaned.
+        self.pid = os.getpid() if pid is None else pid
+        self._db: sqlite3.Connection | None = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def track(self, run) -> bool:
+        """
+        Record that `pid` is following `run`, or forget it once it
+        has finished. Returns whether the run is still active.
+        """
+        active = run.status not in TERMINAL_STATUSES
+        try:
+            if active:
+                self.claim(run.id, run.thread_id, run.assistant_id)
+            else:
+                self.remove(run.id)
+        except sqlite3.Error:
+            # Like metrics, this is best effort; never fail a run over it.
+            exception("Couldn't record the state of run '%s'", run.id)
+        return active
+
+    def claim(self, run_id: str, thread_id: str, assistant_id: str | None = None):
+        """Record that `pid` is following the run, e.g. after attaching to an orphan."""
+        with self.db as db:
+            db.execute(
+                "INSERT INTO active_runs VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (run_id) DO UPDATE SET pid = excluded.pid",
+                (run_id, thread_id, assistant_id, self.pid, time.time()),
+            )
+
+    def remove(self, run_id: str):
+        with self.db as db:
+            db.execute("DELETE FROM active_runs WHERE run_id = ?", (run_id,))
+
+    def get(self, run_id: str) -> ActiveRun | None:
+        row = self.db.execute("SELECT * FROM active_runs WHERE run_id = ?", (run_id,)).fetchone()
+        return ActiveRun(*row) if row else None
+
+    def active(self, thread_id: str | None = None) -> list[ActiveRun]:
+        """Active runs, newest first."""
+        if thread_id is None:
+            rows = self.db.execute("SELECT * FROM active_runs ORDER BY started_at DESC")
+        else:
+            rows = self.db.execute(
+                "SELECT * FROM active_runs WHERE thread_id = ? ORDER BY started_at DESC", (thread_id,))
+        return [ActiveRun(*row) for row in rows]
+
+    def orphans(self, thread_id: str | None = None) -> list[ActiveRun]:
+        return [run for run in self.active(thread_id) if run.orphaned]
@@ -0,0 +1,278 @@
+"""
+Rate limiting, retries and circuit breaking for every API request.
+
+Clients from `client` send their requests through a `RetryTransport` (or
+`AsyncRetryTransport`) whose `Scheduler` shares its state with every
+other client for the same API base URL, so every thread, batch worker
+and command in a process sees the same limits:
+
+  - a token bucket sized from the x-ratelimit-*-requests headers holds
+    requests back before the server would reject them, and a 429 pauses
+    every request for its Retry-After;
+  - failed requests are retried with jittered exponential backoff, but
+    only when that can't repeat an effect: reads, cancelling and
+    submitting tool outputs after 429s, 5xxs and connection errors;
+    creating messages and runs only after a 429 or a failure to connect;
+  - after `breaker_threshold` consecutive 5xxs or connection errors the
+    circuit opens and requests fail at once for `breaker_cooldown`
+    seconds, then one request is let through to probe the API.
+
+The OpenAI SDK's own retries are turned off, since they'd retry
+everything, including calls that aren't safe to repeat.
+"""
+import asyncio
+import random
+import re
+import threading
+import time
+from logging import info, warning
+
+import httpx
+
+from .client import ClientSettings
+
+RETRY_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504})
+# POSTs that have the same effect when repeated.
+IDEMPOTENT_POSTS = re.compile(r"/runs/[^/]+/(submit_tool_outputs|cancel)$")
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of sending a request while the circuit breaker is open."""
+
+
+def parse_duration(value: str) -> float | None:
+    """Seconds in a rate limit reset time like "20ms", "1s" or "6m0s"."""
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def retry_after(headers: httpx.Headers) -> float | None:
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(headers[name]) * scale
+        except (KeyError, ValueError):
+            pass
+    return None
+
+
+def is_idempotent(request: httpx.Request) -> bool:
+    return request.method != "POST" or bool(IDEMPOTENT_POSTS.search(request.url.path))
+
+
+class RateLimiter:
+    """A token bucket sized from the server's x-ratelimit-*-requests headers."""
+
+    def __init__(self):
+        # Unknown until the server reports its limits; until then, unlimited.
+        self.tokens: float | None = None
+        self.rate = 0.0
+        self.capacity = 0.0
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        if self.tokens is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """Take a token, returning how long to wait before using it."""
+        wait = max(0.0, self.paused_until - now)
+        if self.tokens is None:
+            return wait
+        self._refill(now)
+        self.tokens -= 1
+        if self.tokens < 0 and self.rate > 0:
+            wait = max(wait, -self.tokens / self.rate)
+        return wait
+
+    def observe(self, headers: httpx.Headers, now: float):
+        try:
+            limit = float(headers["x-ratelimit-limit-requests"])
+            remaining = float(headers["x-ratelimit-remaining-requests"])
+        except (KeyError, ValueError):
+            return
+        reset = parse_duration(headers.get("x-ratelimit-reset-requests", "")) or 60.0
+        self._refill(now)
+        self.capacity = limit
+        # Requests sent since the server counted are already taken from `tokens`.
+        self.tokens = min(remaining, self.tokens if self.tokens is not None else remaining)
+        self.rate = max(limit - remaining, 1.0) / reset
+
+    def pause(self, delay: float, now: float):
+        self.paused_until = max(self.paused_until, now + delay)
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+
+    def check(self, now: float):
+        if self.threshold <= 0 or self.failures < self.threshold:
+            return
+        if now < self.open_until:
+            raise CircuitOpenError(
+                f"The API failed {self.failures} times in a row; not sending requests for "
+                f"{self.open_until - now:.0f}s"
+            )
+        # Let one request through to probe; it reopens the circuit if it fails.
+        self.open_until = now + self.cooldown
+
+    def record(self, success: bool, now: float):
+        if success:
+            if self.failures >= self.threshold > 0:
+                info("API requests are succeeding again; closing the circuit")
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.failures == self.threshold:
+            warning("%d consecutive API failures; pausing requests for %ss", self.failures, self.cooldown)
+            self.open_until = now + self.cooldown
+
+
+class _APIState:
+    """What's known about an API's limits and health, shared by all its clients."""
+
+    def __init__(self, settings: ClientSettings):
+        self.limiter = RateLimiter()
+        self.breaker = CircuitBreaker(settings.breaker_threshold, settings.breaker_cooldown)
+        self.lock = threading.Lock()
+
+
+class Scheduler:
+    """Decides when each request may be sent and whether a failed one is retried."""
+
+    def __init__(self, settings: ClientSettings, state: _APIState | None = None):
+        self.settings = settings
+        state = state or _APIState(settings)
+        self.limiter = state.limiter
+        self.breaker = state.breaker
+        self._lock = state.lock
+
+    def admit(self, request: httpx.Request) -> float:
+        """How long to wait before sending `request`; raises CircuitOpenError if it mustn't be."""
+        now = time.monotonic()
+        with self._lock:
+            self.breaker.check(now)
+            return self.limiter.reserve(now) if self.settings.rate_limit else 0.0
+
+    def backoff(self, attempt: int) -> float:
+        delay = min(self.settings.retry_backoff_max, self.settings.retry_backoff * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    def completed(self, request: httpx.Request, response: httpx.Response, attempt: int) -> float | None:
+        """The delay before retrying `request`, or None to return `response`."""
+        now = time.monotonic()
+        status = response.status_code
+        with self._lock:
+            self.limiter.observe(response.headers, now)
+            self.breaker.record(status < 500, now)
+            delay = retry_after(response.headers)
+            if status == 429:
+                self.limiter.pause(delay or self.backoff(attempt), now)
+
+        should_retry = response.headers.get("x-should-retry")
+        if attempt >= self.settings.max_retries or should_retry == "false":
+            return None
+        if should_retry != "true" and status not in RETRY_STATUSES:
+            return None
+        # A 429 means the request was turned away, so even a POST is safe to
+        # repeat; otherwise the server may have acted on it, whatever it says.
+        if status != 429 and not is_idempotent(request):
+            return None
+        delay = delay if delay is not None and delay <= self.settings.retry_backoff_max else self.backoff(attempt)
+        info("Retrying %s %s after %d in %.2fs", request.method, request.url.path, status, delay)
+        return delay
+
+    def failed(self, request: httpx.Request, err: httpx.TransportError, attempt: int) -> float | None:
+        """The delay before retrying `request` after a transport error, or None to raise it."""
+        if isinstance(err, CircuitOpenError):
+            return None
+        with self._lock:
+            self.breaker.record(False, time.monotonic())
+        if attempt >= self.settings.max_retries:
+            return None
+        # A request that never reached the server is safe to repeat.
+        if not is_idempotent(request) and not isinstance(err, (httpx.ConnectError, httpx.ConnectTimeout)):
+            return None
+        delay = self.backoff(attempt)
+        info("Retrying %s %s after %s in %.2fs", request.method, request.url.path, type(err).__name__, delay)
+        return delay
+
+
+_states: dict[str | None, _APIState] = {}
+_states_lock = threading.Lock()
+
+
+def get_scheduler(settings: ClientSettings) -> Scheduler:
+    """A scheduler sharing rate limits and circuit state with every other client for the same API."""
+    with _states_lock:
+        if settings.base_url not in _states:
+            _states[settings.base_url] = _APIState(settings)
+        return Scheduler(settings, _states[settings.base_url])
+
+
+class RetryTransport(httpx.BaseTransport):
+    def __init__(self, transport: httpx.BaseTransport, scheduler: Scheduler):
+        self.transport = transport
+        self.scheduler = scheduler
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            wait = self.scheduler.admit(request)
+            if wait:
+                time.sleep(wait)
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.TransportError as err:
+                delay = self.scheduler.failed(request, err, attempt)
+                if delay is None:
+                    raise
+            else:
+                delay = self.scheduler.completed(request, response, attempt)
+                if delay is None:
+                    return response
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport, scheduler: Scheduler):
+        self.transport = transport
+        self.scheduler = scheduler
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            wait = self.scheduler.admit(request)
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                response = await self.transport.handle_async_request(request)
+            except httpx.TransportError as err:
+                delay = self.scheduler.failed(request, err, attempt)
+                if delay is None:
+                    raise
+            else:
+                delay = self.scheduler.completed(request, response, attempt)
+                if delay is None:
+                    return response
+                await response.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self):
+        await self.transport.aclose()
@@ -0,0 +1,95 @@
+"""
+The settings models that are part of the user config.
+
+They live apart from the code they configure so that loading the config
+only costs pydantic, not the imports of the tools, the client or the run
+store; those modules re-export their settings.
+"""
+from typing import Literal
+
+import pydantic
+
+
+class ClientSettings(pydantic.BaseModel):
+    base_url: str | None = None
+    timeout: float = 600.0
+    connect_timeout: float = 5.0
+    # Retries of each failed request, with backoff between them (see `scheduler`).
+    max_retries: int = 2
+    retry_backoff: float = 0.5
+    retry_backoff_max: float = 30.0
+    # Hold requests back according to the server's x-ratelimit-* headers.
+    rate_limit: bool = True
+    # Consecutive failures that stop requests being sent, and for how long; 0 disables.
+    breaker_threshold: int = 5
+    breaker_cooldown: float = 30.0
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 120.0
+    # Only used when the h2 package is installed.
+    http2: bool = True
+
+
+class RunPolicy(pydantic.BaseModel):
+    """
+    What to do when a run ends without completing, by status: "retry"
+    starts a new run on the thread, "error" raises RunFailed.
+    """
+    failed: Literal["retry", "error"] = "retry"
+    # Usually a requires_action run whose tool outputs took too long.
+    expired: Literal["retry", "error"] = "retry"
+    cancelled: Literal["retry", "error"] = "error"
+    # Failed runs are only retried for these error codes; others won't go away.
+    retry_codes: list[str] = ["server_error", "rate_limit_exceeded"]
+    max_retries: int = 2
+    retry_delay: float = 1.0
+
+    def retry_after(self, run, retries: int) -> float | None:
+        """How long to wait before starting the run again, or None to give up."""
+        from .runs import UNFINISHED_STATUSES
+
+        if run.status not in UNFINISHED_STATUSES or getattr(self, run.status) != "retry":
+            return None
+        if retries >= self.max_retries:
+            return None
+        error = getattr(run, "last_error", None)
+        if run.status == "failed" and error is not None and error.code not in self.retry_codes:
+            return None
+        return self.retry_delay * 2 ** retries
+
+
+class ToolSettings(pydantic.BaseModel):
+    max_workers: int = 4
+    timeout: float | None = 300.0
+    max_output_bytes: int = 64 * 1024
+    max_output_lines: int = 2000
+    command_timeout: float | None = 120.0
+    progress_interval: float = 2.0
+    max_read_bytes: int = 64 * 1024
+    max_dir_entries: int = 500
+    mmap_threshold: int = 1024 * 1024
+    # Limits of search_files and glob_files (see `file_index`).
+    max_search_results: int = 200
+    max_search_file_bytes: int = 1024 * 1024
+    # Memory for file contents kept between searches.
+    file_index_bytes: int = 64 * 1024 * 1024
+    # Reuse results of identical read-only calls (see `tool_cache`).
+    result_cache: bool = False
+    result_cache_entries: int = 256
+    result_cache_bytes: int = 8 * 1024 * 1024
+    # Bounds staleness from changes made outside the assistant's own tools.
+    result_cache_ttl: float | None = 60.0
+    # Outputs longer than this many characters are reduced before they're
+    # submitted (see `output_budget`); None submits them as they are.
+    output_budget: int | None = 32 * 1024
+    # Run exec_shell commands in long-lived shells (see `shell_pool`), so a
+    # thread's `cd` and `export` carry over to its later commands.
+    shell_pool: bool = False
+    shell_pool_size: int = 4
+    # A command the shells are started with, e.g. ["unshare", "--user", "--net"].
+    shell_sandbox: list[str] = []
+    shell_cwd: str | None = None
+    # The shells' whole environment; None passes on ours.
+    shell_env: dict[str, str] | None = None
+    shell_cpu_seconds: int | None = None
+    shell_memory_mb: int | None = None
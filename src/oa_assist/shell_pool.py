@@ -0,0 +1,279 @@
+"""
+Long-lived shells for `exec_shell`.
+
+Running every command with `bash -c` pays for a fork, an exec and shell
+start-up each time, which adds up when an assistant runs dozens of small
+commands in a turn. With `shell_pool` enabled, commands are written to
+shells that stay running instead: each command is run with `eval` and
+followed by a marker line carrying its exit status, which ends its output.
+`exit` is aliased to `return` from the function running the `eval`, so it
+ends the command rather than the shell.
+A spare shell is kept started ahead of time, and a thread's commands go to
+a shell it has used before whenever one is idle, so a `cd` or an `export`
+carries over to its next command as it would in a terminal.
+
+Shells can be started inside a sandbox command (e.g. `unshare` or
+`bwrap`), in a given directory and environment, and with CPU time and
+memory limits that apply to each command they run. A command that times
+out is killed along with its shell, which is replaced, as is a shell that
+exits anyway (e.g. after `exec`). Shells also exit once their pool is closed or garbage collected,
+when their stdin is closed.
+"""
+import os
+import secrets
+import select
+import shlex
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Hashable, Iterator
+
+from .capture import BoundedBuffer, CommandResult, kill_group
+
+if TYPE_CHECKING:
+    from .tool_functions import ToolSettings
+
+
+class Shell:
+    """A bash process that runs commands one at a time, keeping its state between them."""
+
+    def __init__(self, settings: "ToolSettings", session: Hashable | None = None):
+        # The thread whose commands it has run; None for a spare.
+        self.session = session
+        self.proc = subprocess.Popen(
+            [*settings.shell_sandbox, "bash", "--noprofile", "--norc"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=settings.shell_cwd,
+            env=settings.shell_env,
+            start_new_session=True,
+            bufsize=0,
+        )
+        self._send('shopt -s expand_aliases; alias exit=return; __oaa_run() { eval -- "$1"; }\n')
+        limits = []
+        if settings.shell_cpu_seconds:
+            limits.append(f"ulimit -t {settings.shell_cpu_seconds}")
+        if settings.shell_memory_mb:
+            limits.append(f"ulimit -v {settings.shell_memory_mb * 1024}")
+        if limits:
+            # Inherited by every command; a shell can't raise them again.
+            self._send("; ".join(limits) + "\n")
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def _send(self, script: str):
+        try:
+            self.proc.stdin.write(script.encode())
+        except BrokenPipeError:
+            pass
+
+    def run(
+        self,
+        command: str,
+        *,
+        input: str | None = None,
+        max_bytes: int = 64 * 1024,
+        max_lines: int = 2000,
+        timeout: float | None = None,
+        progress: Callable[[str], None] | None = None,
+        progress_interval: float = 2.0,
+    ) -> CommandResult:
+        """Run a command as `capture.run_bounded` would, with stderr merged into stdout."""
+        stdin = os.devnull
+        if input is not None:
+            with tempfile.NamedTemporaryFile("w", prefix="oaa-input-", delete=False) as file:
+                file.write(input)
+            stdin = file.name
+        try:
+            return self._run(command, stdin, max_bytes, max_lines, timeout, progress, progress_interval)
+        finally:
+            if input is not None:
+                os.unlink(stdin)
+
+    def _run(self, command, stdin, max_bytes, max_lines, timeout, progress, progress_interval) -> CommandResult:
+        marker = f"\n__oaa_done_{secrets.token_hex(8)}__ ".encode()
+        self._send(f"__oaa_run {shlex.quote(command)} < {shlex.quote(stdin)}; "
+                   f"printf '\\n%s %d\\n' {marker.strip().decode()} \"$?\"\n")
+
+        output = BoundedBuffer(max_bytes, max_lines)
+        fd = self.proc.stdout.fileno()
+        # The end of what's been read when it could be the start of the marker.
+        pending = b""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        next_progress = time.monotonic() + progress_interval
+        reported = ""
+        while True:
+            now = time.monotonic()
+            wait = next_progress - now if progress else None
+            if deadline is not None:
+                wait = deadline - now if wait is None else min(wait, deadline - now)
+            ready, _, _ = select.select([fd], [], [], None if wait is None else max(0.0, wait))
+            if ready:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    # The command ended the shell, e.g. with `exec`.
+                    output.feed(pending)
+                    return CommandResult(self.proc.wait(), output.getvalue(), "", False, output.truncated)
+                pending += chunk
+                end = pending.find(marker)
+                if end >= 0:
+                    output.feed(pending[:end])
+                    return CommandResult(self._status(pending[end + len(marker):]), output.getvalue(), "", False,
+                                         output.truncated)
+                start = pending.rfind(b"\n", max(0, len(pending) - len(marker)))
+                if start < 0 or not marker.startswith(pending[start:]):
+                    start = len(pending)
+                output.feed(pending[:start])
+                pending = pending[start:]
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                kill_group(self.proc)
+                output.feed(pending)
+                return CommandResult(None, output.getvalue(), "", True, output.truncated)
+            if progress and now >= next_progress:
+                next_progress = now + progress_interval
+                line = output.last_line()
+                if line and line != reported:
+                    progress(f"{output.total_lines} lines: {line}")
+                    reported = line
+
+    def _status(self, rest: bytes) -> int | None:
+        fd = self.proc.stdout.fileno()
+        while b"\n" not in rest:
+            chunk = os.read(fd, 64)
+            if not chunk:
+                break
+            rest += chunk
+        try:
+            return int(rest.split(b"\n", 1)[0])
+        except ValueError:
+            return None
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=1.0)
+        except (OSError, subprocess.TimeoutExpired):
+            kill_group(self.proc)
+
+
+class ShellPool:
+    """
+    Up to `shell_pool_size` shells shared by the tool calls of an executor.
+
+    A call gets an idle shell of its session (thread) if there is one, then
+    the spare, then a new shell; once the pool is full, an idle shell of
+    another session is replaced, or else the call waits for one to be free.
+    Concurrent calls of one session get shells of their own.
+    """
+
+    def __init__(self, settings: "ToolSettings"):
+        self.settings = settings
+        self._idle: list[Shell] = []
+        # Shells that are idle, busy or being started.
+        self._count = 0
+        self._closed = False
+        self._spare_starting = False
+        self._cond = threading.Condition()
+        self._start_spare()
+
+    @property
+    def size(self) -> int:
+        return max(1, self.settings.shell_pool_size)
+
+    def _start_spare(self):
+        with self._cond:
+            if (self._closed or self._spare_starting or self._count >= self.size
+                    or any(shell.session is None for shell in self._idle)):
+                return
+            self._count += 1
+            self._spare_starting = True
+        threading.Thread(target=self._add_spare, name="oaa-shell-spare", daemon=True).start()
+
+    def _add_spare(self):
+        try:
+            shell = Shell(self.settings)
+        except OSError:
+            shell = None
+        with self._cond:
+            self._spare_starting = False
+            if shell is not None and not self._closed:
+                self._idle.append(shell)
+                self._cond.notify()
+                return
+            # Not retried until a call needs a shell.
+            self._count -= 1
+            self._cond.notify()
+        if shell is not None:
+            shell.close()
+
+    def _discard(self):
+        with self._cond:
+            self._count -= 1
+            self._cond.notify()
+
+    def _acquire(self, session: Hashable) -> Shell:
+        replaced = None
+        with self._cond:
+            while True:
+                shell = (next((shell for shell in self._idle if shell.session == session), None)
+                         or next((shell for shell in self._idle if shell.session is None), None))
+                if shell is not None:
+                    self._idle.remove(shell)
+                    break
+                if self._count < self.size:
+                    self._count += 1
+                    break
+                if self._idle:
+                    # Every idle shell belongs to another session.
+                    replaced = self._idle.pop(0)
+                    break
+                self._cond.wait()
+        if replaced is not None:
+            replaced.close()
+        if shell is None:
+            try:
+                shell = Shell(self.settings)
+            except OSError:
+                self._discard()
+                raise
+        if shell.session is None:
+            shell.session = session
+            self._start_spare()
+        return shell
+
+    def _release(self, shell: Shell):
+        with self._cond:
+            if shell.alive and not self._closed:
+                self._idle.append(shell)
+                self._cond.notify()
+                return
+        self._discard()
+        shell.close()
+        self._start_spare()
+
+    @contextmanager
+    def shell(self, session: Hashable) -> Iterator[Shell]:
+        shell = self._acquire(session)
+        try:
+            yield shell
+        finally:
+            self._release(shell)
+
+    def run(self, session: Hashable, command: str, **kwargs) -> CommandResult:
+        """Run a command on a shell of `session`; see `Shell.run`."""
+        with self.shell(session) as shell:
+            return shell.run(command, **kwargs)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._count -= len(idle)
+        for shell in idle:
+            shell.close()
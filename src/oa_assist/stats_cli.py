@@ -0,0 +1,69 @@
+import sys
+import time
+
+import rich.box
+import click
+
+from .cache import ASSISTANT
+from .cli import cli, CLI, parse_age
+from .metrics import MetricsSummary, QUANTILES, percentile, prometheus_text
+from .names import ObjectRef
+from .ui import Table
+
+def _seconds(value: float) -> str:
+    return f"{value * 1000:.0f}ms" if value < 1 else f"{value:.2f}s"
+
+
+def show_summary(obj: CLI, summary: MetricsSummary):
+    table = Table(
+        "Metric",
+        "Count",
+        *(f"p{q}" for q in QUANTILES),
+        "Max",
+        title=f"Runs: {summary.runs}",
+        box=rich.box.SIMPLE_HEAD,
+    )
+    order = {"run": 0, "phase": 1, "tool": 2}
+    for name, values in sorted(summary.samples.items(), key=lambda item: (order[item[0].split(":")[0]], item[0])):
+        label = name
+        if name.startswith("tool:") and summary.tool_failures.get(name[5:]):
+            label += f" ({summary.tool_failures[name[5:]]} failed)"
+        table.add_row(
+            label,
+            str(len(values)),
+            *(_seconds(percentile(values, q)) for q in QUANTILES),
+            _seconds(max(values)),
+        )
+    if summary.polls:
+        table.add_row(
+            "polls",
+            str(len(summary.polls)),
+            *(f"{percentile(summary.polls, q):.0f}" for q in QUANTILES),
+            str(max(summary.polls)),
+        )
+    obj.console.print(table)
+
+    statuses = ", ".join(f"{status}: {count}" for status, count in sorted(summary.statuses.items(), key=str))
+    obj.console.print(f"Status: {statuses or 'none'}")
+    if summary.tokens.get("total"):
+        obj.console.print(
+            f"Tokens: {summary.tokens['total']} total "
+            f"({summary.tokens['prompt']} prompt, {summary.tokens['completion']} completion), "
+            f"{summary.tokens['total'] / summary.runs:.0f} per run"
+        )
+
+
+@cli.command
+@click.option("--since", "-s", default="7d", show_default=True, callback=parse_age,
+              help="Only runs started within this age, e.g. 12h.")
+@click.option("--assistant", "-a", "assistant_id", type=ObjectRef(ASSISTANT), help="Only runs of this assistant.")
+@click.option("--format", "-f", "output_format", type=click.Choice(["table", "prometheus"]), default="table",
+              show_default=True)
+@click.pass_obj
+def stats(obj: CLI, since: float, assistant_id: str | None, output_format: str):
+    """Latency percentiles and token usage of recent runs."""
+    summary = obj.metrics.summary(since=time.time() - since, assistant_id=assistant_id)
+    if output_format == "prometheus":
+        sys.stdout.write(prometheus_text(summary))
+    else:
+        show_summary(obj, summary)
@@ -1,8 +1,18 @@
 
+import time
+from fnmatch import fnmatch
+from typing import TYPE_CHECKING
+
 import click
 
-from .cli import cli, CLI, ShortcutGroup
-from .ui import Working, Table
+from .bulk import Cell, delete_all, run_concurrently
+from .cache import THREAD
+from .cli import cli, CLI, ShortcutGroup, parse_age
+from .names import THREAD_REF, ObjectRef
+from .ui import Live, Table
+
+if TYPE_CHECKING:
+    import openai
 
 
 @cli.group()
@@ -19,31 +29,132 @@ def create(obj: CLI, label: str, select: bool):
     with obj.console.status("Working..."):
         thread = obj.openai.beta.threads.create()
     if select:
-        obj.config.selected_thread_id = thread.id
+        obj.config.selected.thread_id = thread.id
+    obj.cache.put(THREAD, thread)
     if label:
-        obj.config.labels.thread[thread.id] = label
-    obj.config.cache.thread[thread.id] = thread
+        obj.names.set_label(THREAD, thread.id, label)
     obj.config.save()
     obj.console.print(f"Thread [bold]{thread.id}[/bold] created and selected.")
 
 
+def forget_thread(obj: CLI, thread_id: str):
+    obj.cache.delete(THREAD, thread_id)
+    obj.names.set_label(THREAD, thread_id, None)
+    if obj.config.selected.thread_id == thread_id:
+        obj.config.selected.thread_id = None
+
+
+def delete_threads(obj: CLI, thread_ids: list[str], concurrency: int):
+    # Created here rather than lazily by a worker: the config's connection belongs to this thread.
+    client = obj.openai
+    gone = delete_all(
+        obj.console, "thread", thread_ids, lambda id: client.beta.threads.delete(thread_id=id), concurrency)
+    with obj.config.update():
+        for thread_id in gone:
+            forget_thread(obj, thread_id)
+
+
 @thread.command
+@click.argument("thread_id", nargs=-1, required=True, type=ObjectRef(THREAD, confirm="Delete"))
+@click.option("--yes", "-y", is_flag=True, is_eager=True, help="Don't ask before deleting by a prefix.")
+@click.option("--concurrency", "-j", default=8, show_default=True, help="Threads deleted at once.")
 @click.pass_obj
-def delete(obj: CLI):
-    pass
+def delete(obj: CLI, thread_id: tuple[str, ...], yes: bool, concurrency: int):
+    delete_threads(obj, list(thread_id), concurrency)
+
+
+@thread.command
+@click.argument("thread_id", type=THREAD_REF)
+@click.pass_obj
+def select(obj: CLI, thread_id: str):
+    """Select a thread by id or label, or a prefix of one."""
+    obj.config.selected.thread_id = thread_id
+    obj.config.save()
+    obj.console.print(f"Thread [bold]{thread_id}[/bold] is now selected.")
+
+
+@thread.command
+@click.argument("thread_id", type=THREAD_REF)
+@click.argument("label", required=False)
+@click.pass_obj
+def label(obj: CLI, thread_id: str, label: str | None):
+    """Label a thread, or remove its label."""
+    with obj.config.update():
+        obj.names.set_label(THREAD, thread_id, label)
+
+
+@thread.command
+@click.option("--older-than", "-o", callback=parse_age, help="Only threads created longer ago than this, e.g. 30d.")
+@click.option("--label", "-l", "pattern", help="Only threads whose label matches this glob pattern.")
+@click.option("--unlabelled", "-u", is_flag=True, help="Only threads without a label.")
+@click.option("--dry-run", "-n", is_flag=True, help="Show what would be deleted.")
+@click.option("--yes", "-y", is_flag=True, help="Don't ask for confirmation.")
+@click.option("--concurrency", "-j", default=8, show_default=True, help="Threads deleted at once.")
+@click.pass_obj
+def prune(obj: CLI, older_than: float | None, pattern: str | None, unlabelled: bool, dry_run: bool, yes: bool,
+          concurrency: int):
+    """Delete known threads by age and label, except the selected one."""
+    if older_than is None and pattern is None and not unlabelled:
+        raise click.UsageError("Pass at least one of --older-than, --label and --unlabelled")
+    labels = obj.config.labels.thread
+    cutoff = time.time() - (older_than or 0)
+    thread_ids = [
+        thread["id"] for thread in obj.cache.list(THREAD, None)
+        if thread["id"] != obj.config.selected.thread_id
+        and (older_than is None or (thread.get("created_at") or 0) < cutoff)
+        and (pattern is None or fnmatch(labels.get(thread["id"], ""), pattern))
+        and (not unlabelled or thread["id"] not in labels)
+    ]
+    if not thread_ids:
+        obj.console.print("No threads to delete.")
+        return
+    if dry_run:
+        for thread_id in thread_ids:
+            obj.console.print(f"Would delete thread [bold]{thread_id}[/bold] {labels.get(thread_id, '')}")
+        return
+    if not yes:
+        click.confirm(f"Delete {len(thread_ids)} threads?", abort=True)
+    delete_threads(obj, thread_ids, concurrency)
+
+
+def latest_run_status(client: "openai.OpenAI", thread_id: str) -> str:
+    page = client.beta.threads.runs.list(thread_id=thread_id, limit=1)
+    return page.data[0].status if page.data else "idle"
+
+
+STATUS_STYLES = {"idle": "dim", "completed": "green", "failed": "red", "expired": "red", "missing": "red"}
 
 
 @thread.command(name="list")
+@click.option("--status", "-S", is_flag=True, help="Fetch each thread's status (its latest run's).")
+@click.option("--concurrency", "-j", default=8, show_default=True, help="Statuses fetched at once.")
 @click.pass_obj
-def list_threads(obj: CLI):
-    table = Table("", "Label", "ID", "Status", title="Threads", caption="Known threads only")
-    for thread in obj.config.cache.thread.values():
-        selected = obj.config.selected.thread_id == thread.id
+def list_threads(obj: CLI, status: bool, concurrency: int):
+    threads = obj.cache.list(THREAD, None)
+    table = Table("", "Label", "ID", *(("Status",) if status else ()), title="Threads", caption="Known threads only")
+    cells = {}
+    for thread in threads:
+        selected = obj.config.selected.thread_id == thread["id"]
+        if status:
+            cells[thread["id"]] = Cell("...", "dim")
         table.add_row(
             ":star:" if selected else "",
-            obj.config.labels.thread.get(thread.id, ""),
-            thread.id,
-            "",
+            obj.config.labels.thread.get(thread["id"], ""),
+            thread["id"],
+            *((cells[thread["id"]],) if status else ()),
             style="bold green" if selected else "",
         )
-    obj.console.print(table)
+    if not cells:
+        obj.console.print(table)
+        return
+
+    # Show the table straight away and fill in statuses as they arrive.
+    client = obj.openai
+    with Live(table, console=obj.console, refresh_per_second=8):
+        for outcome in run_concurrently(lambda id: latest_run_status(client, id), cells, concurrency):
+            if outcome.error is None:
+                cells[outcome.item].set(outcome.result, STATUS_STYLES.get(outcome.result, "yellow"))
+            elif getattr(outcome.error, "status_code", None) == 404:
+                cells[outcome.item].set("missing", STATUS_STYLES["missing"])
+            else:
+                cells[outcome.item].set(f"error: {outcome.error}", "red")
@@ -0,0 +1,77 @@
+"""
+Memoized results of idempotent tool calls.
+
+Tools opt in by setting `CACHEABLE` and implementing `cache_stamp`, which
+returns the state the result depends on (e.g. a file's mtime, or a
+repository's HEAD). A call is served from the cache when the same tool
+was called with the same arguments and the stamp hasn't changed. Calls to
+tools that set `MUTATES` (write_file, exec_shell) clear the cache, since
+they can change the workspace in ways no stamp would notice.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+from .tool_functions import BaseFunction
+
+
+class ToolResultCache:
+    """An LRU cache of tool outputs, bounded by entry count, total size and age."""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 8 * 1024 * 1024, ttl: float | None = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[str, float]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def key(self, func: BaseFunction) -> Hashable | None:
+        """The cache key for a call, or None if it can't be cached."""
+        if not func.CACHEABLE:
+            return None
+        stamp = func.cache_stamp()
+        if stamp is None:
+            return None
+        return func.NAME, json.dumps(func.model_dump(mode="json"), sort_keys=True), stamp
+
+    def get(self, key: Hashable) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, output: str):
+        size = len(output)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (output, time.monotonic())
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Hashable):
+        output, _ = self._entries.pop(key)
+        self._bytes -= len(output)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from logging import info, exception
+
+from openai.types.beta.threads.run_submit_tool_outputs_params import ToolOutput
+from openai.types.beta.threads.required_action_function_tool_call import RequiredActionFunctionToolCall
+
+from .shell_pool import ShellPool
+from .tool_cache import ToolResultCache
+from .tool_functions import BaseFunction, FunctionEventHandler, ToolSettings
+
+
+class _ToolTask:
+    def __init__(self):
+        self.submit_time = time.monotonic()
+        self.start_time: float | None = None
+
+    def start(self):
+        self.start_time = time.monotonic()
+
+
+class ToolExecutor:
+    """
+    Run the tool calls of a `requires_action` run concurrently.
+
+    Calls are executed on a shared thread pool (tools need the live event
+    handler, so they can't be shipped to another process) and the outputs
+    are returned in the order the model requested them. A call that isn't
+    done within the timeout of being submitted, whether it's running or
+    still queued behind others, is reported to the model as failed; its
+    thread is left to finish in the background.
+    """
+
+    def __init__(self, settings: ToolSettings = ToolSettings()):
+        self.settings = settings
+        self.cache = _result_cache(settings)
+        self.shells = ShellPool(settings) if settings.shell_pool else None
+        self._pool: ThreadPoolExecutor | None = None
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=max(1, self.settings.max_workers),
+                thread_name_prefix="oaa-tool",
+            )
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self.shells is not None:
+            self.shells.close()
+
+    def run(
+        self,
+        functions: dict[str, type[BaseFunction]],
+        tool_calls: list[RequiredActionFunctionToolCall],
+        events: FunctionEventHandler,
+    ) -> list[ToolOutput]:
+        tasks: list[tuple[RequiredActionFunctionToolCall, _ToolTask, Future]] = []
+        for action in tool_calls:
+            info("Should Run: %s: %s", action.function.name, action.function.arguments)
+            task = _ToolTask()
+            future = self.pool.submit(self._call, task, functions, action, events)
+            tasks.append((action, task, future))
+
+        return [
+            ToolOutput(output=self._result(action, task, future, events), tool_call_id=action.id)
+            for action, task, future in tasks
+        ]
+
+    def _call(
+        self,
+        task: _ToolTask,
+        functions: dict[str, type[BaseFunction]],
+        action: RequiredActionFunctionToolCall,
+        events: FunctionEventHandler,
+    ) -> str:
+        task.start()
+        func_cls = functions[action.function.name]
+        func = func_cls.model_validate_json(action.function.arguments)
+        return _invoke(func, events, self.cache)
+
+    def _result(
+        self,
+        action: RequiredActionFunctionToolCall,
+        task: _ToolTask,
+        future: Future,
+        events: FunctionEventHandler,
+    ) -> str:
+        timeout = self.settings.timeout
+        success = False
+        try:
+            if timeout is None:
+                output = future.result()
+            else:
+                # Counted from submission, so a call queued behind hung ones times out too.
+                remaining = timeout - (time.monotonic() - task.submit_time)
+                output = future.result(timeout=max(0.0, remaining))
+            success = True
+        except TimeoutError:
+            # Never starts it if it's still queued.
+            future.cancel()
+            output = _timed_out(action, timeout, events)
+        except Exception as err:
+            output = _failed(action, err, events)
+        start = task.start_time if task.start_time is not None else task.submit_time
+        events.tool_call(action.function.name, time.monotonic() - start, success)
+        return output
+
+
+class AsyncToolExecutor:
+    """
+    The asyncio counterpart of `ToolExecutor`.
+
+    Each call runs in the event loop's default executor via
+    `asyncio.to_thread`, with at most `max_workers` calls in flight per
+    executor. As there, the timeout includes the time spent waiting for a
+    free slot.
+    """
+
+    def __init__(self, settings: ToolSettings = ToolSettings()):
+        self.settings = settings
+        self.cache = _result_cache(settings)
+        self.shells = ShellPool(settings) if settings.shell_pool else None
+        self._semaphore: asyncio.Semaphore | None = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(max(1, self.settings.max_workers))
+        return self._semaphore
+
+    async def run(
+        self,
+        functions: dict[str, type[BaseFunction]],
+        tool_calls: list[RequiredActionFunctionToolCall],
+        events: FunctionEventHandler,
+    ) -> list[ToolOutput]:
+        results = await asyncio.gather(*(self._call(functions, action, events) for action in tool_calls))
+        return [
+            ToolOutput(output=result, tool_call_id=action.id)
+            for action, result in zip(tool_calls, results)
+        ]
+
+    async def _call(
+        self,
+        functions: dict[str, type[BaseFunction]],
+        action: RequiredActionFunctionToolCall,
+        events: FunctionEventHandler,
+    ) -> str:
+        timeout = self.settings.timeout
+        start = time.monotonic()
+
+        async def call() -> str:
+            nonlocal start
+            async with self.semaphore:
+                info("Should Run: %s: %s", action.function.name, action.function.arguments)
+                start = time.monotonic()
+                func_cls = functions[action.function.name]
+                func = func_cls.model_validate_json(action.function.arguments)
+                return str(await asyncio.to_thread(_invoke, func, events, self.cache))
+
+        success = False
+        try:
+            output = await asyncio.wait_for(call(), timeout)
+            success = True
+        except asyncio.TimeoutError:
+            output = _timed_out(action, timeout, events)
+        except Exception as err:
+            output = _failed(action, err, events)
+        events.tool_call(action.function.name, time.monotonic() - start, success)
+        return output
+
+
+def _result_cache(settings: ToolSettings) -> ToolResultCache | None:
+    if not settings.result_cache:
+        return None
+    return ToolResultCache(settings.result_cache_entries, settings.result_cache_bytes, settings.result_cache_ttl)
+
+
+def _invoke(func: BaseFunction, events: FunctionEventHandler, cache: ToolResultCache | None) -> str:
+    if cache is None:
+        return str(func(events))
+    # The key (and so the stamp) is taken before the call, so a result that
+    # raced with a change is filed under the old state and never reused.
+    key = cache.key(func)
+    if key is not None and (output := cache.get(key)) is not None:
+        events.log(f"Reused cached result: {func.NAME}")
+        return output
+    output = str(func(events))
+    if func.MUTATES:
+        cache.clear()
+    elif key is not None:
+        cache.put(key, output)
+    return output
+
+
+def _timed_out(action: RequiredActionFunctionToolCall, timeout: float, events: FunctionEventHandler) -> str:
+    events.log(f"Timed out after {timeout}s: {action.function.name}")
+    return json.dumps({"success": False, "error": f"Timed out after {timeout} seconds"})
+
+
+def _failed(action: RequiredActionFunctionToolCall, err: Exception, events: FunctionEventHandler) -> str:
+    exception("Tool call failed: %s", action.function.name)
+    events.log(f"Failed: {action.function.name}: {err}")
+    return json.dumps({"success": False, "error": str(err)})
@@ -1,25 +1,56 @@
+import functools
 import json
+import os
 import re
-import subprocess
 from pathlib import Path
-from typing import ClassVar, List
+from typing import TYPE_CHECKING, Callable, ClassVar, Hashable, List
 from abc import ABC
 from logging import exception
 
 import pydantic
 
+from .capture import run_bounded
+from .file_index import file_index, path_matcher
+from .settings import ToolSettings
+from . import reading
+
+if TYPE_CHECKING:
+    from .shell_pool import ShellPool
+
 
 class FunctionEventHandler(ABC):
+    settings: ToolSettings = ToolSettings()
+    # Shells for exec_shell, when they're pooled.
+    shells: "ShellPool | None" = None
+    # Calls in one session (a thread) can share shell state.
+    session: Hashable | None = None
+
     def log(self, mesg: str):
         pass
 
+    def tool_call(self, name: str, seconds: float, success: bool):
+        """Called by the executor after each tool call, e.g. to record its timing."""
+        pass
+
 # TODO: rename BaseToolFunction
 class BaseFunction(pydantic.BaseModel):
+    # Whether calls with the same arguments return the same result for as
+    # long as `cache_stamp` doesn't change.
+    CACHEABLE: ClassVar[bool] = False
+    # Whether calls can change the workspace, invalidating cached results.
+    MUTATES: ClassVar[bool] = False
+
     def __call__(self, events: FunctionEventHandler = FunctionEventHandler()):
         raise NotImplementedError()
 
+    def cache_stamp(self) -> Hashable | None:
+        """The state this call's result depends on, or None if it can't be cached."""
+        return None
+
     @classmethod
+    @functools.cache
     def get_function(cls):
+        # Cached per class: building the JSON schema isn't free.
         return {
             "name": cls.NAME,
             "description": cls.DESCRIPTION,
@@ -27,6 +58,19 @@ class BaseFunction(pydantic.BaseModel):
         }
 
 
+def local_path(path: str) -> str:
+    """A path kept within the working directory: relative, and without ".."."""
+    path = re.sub(r"\.+", ".", path)
+    if path.startswith("/"):
+        path = path[1:]
+    return path
+
+
+def _index_path(path: str) -> str:
+    path = os.path.normpath(local_path(path))
+    return "" if path == "." else path
+
+
 class BaseToolBox(pydantic.BaseModel):
     name: str
     functions: list[BaseFunction]
@@ -34,29 +78,49 @@ class BaseToolBox(pydantic.BaseModel):
 
 class ExecFunction(BaseFunction):
     NAME: ClassVar[str] = "exec_shell"
-    DESCRIPTION: ClassVar[str] = "Execute a single shell command using: bash -c '{command}'"
+    DESCRIPTION: ClassVar[str] = (
+        "Execute a shell command with bash and return its output, stdout and stderr combined. Commands may run "
+        "in a persistent shell, where `cd`, variables and functions carry over to later calls; `exit` only ends "
+        "the current command. Don't rely on that state: use paths relative to the working directory."
+    )
+    MUTATES: ClassVar[bool] = True
     command: str
     input: str | None = None
 
     def __call__(self, events: FunctionEventHandler = FunctionEventHandler()):
         events.log(f"Executing: {self.command}")
-        proc = subprocess.run(self.command, shell=True, input=self.input, capture_output=True)
-        return proc.stdout + proc.stderr
+        settings = events.settings
+        limits = dict(
+            input=self.input,
+            max_bytes=settings.max_output_bytes,
+            max_lines=settings.max_output_lines,
+            timeout=settings.command_timeout,
+            progress=events.log,
+            progress_interval=settings.progress_interval,
+        )
+        if events.shells is not None:
+            result = events.shells.run(events.session, self.command, **limits)
+        else:
+            result = run_bounded(self.command, shell=True, merge_stderr=True, **limits)
+        output = result.stdout
+        if result.timed_out:
+            output += f"\n[killed after {settings.command_timeout} seconds]"
+        elif result.returncode:
+            output += f"\n[exit status {result.returncode}]"
+        return output
 
 
 class WriteFileFunction(BaseFunction):
     NAME: ClassVar[str] = "write_file"
     DESCRIPTION: ClassVar[str] = "Write content to a file within a local directory"
+    MUTATES: ClassVar[bool] = True
     path: str
     content: str
 
     @pydantic.model_validator(mode="before")
     @classmethod
     def _validate(cls, data):
-        path = re.sub(r"\.+", ".", data["path"])
-        if path.startswith("/"):
-            path = path[1:]
-        data["path"] = path
+        data["path"] = local_path(data["path"])
         return data
 
     def __call__(self, events: FunctionEventHandler = FunctionEventHandler()):
@@ -71,42 +135,87 @@ class WriteFileFunction(BaseFunction):
 class ReadFileFunction(BaseFunction):
     NAME: ClassVar[str] = "read_file"
     DESCRIPTION: ClassVar[str] = """\
-        Read content from a file within a local directory. If the path
-        is a directory a list of files will be returned (sub-directories
-        will have a trailing slash).
+        Read content from a file within a local directory. Large files are
+        returned in pieces: pass `offset` (and optionally `length`) in
+        bytes, or `start_line`/`end_line`, and continue from `next_offset`
+        or `end_line` + 1 until `eof` is true. If `partial_line` is true,
+        line `end_line` was too long to return whole: read the rest of it
+        from `next_offset`. If the path is a directory a page of file names
+        will be returned (sub-directories will have a trailing slash); pass
+        `next_page_token` as `page_token` for more.
     """
+    CACHEABLE: ClassVar[bool] = True
     path: str
+    offset: int | None = None
+    length: int | None = None
+    start_line: int | None = None
+    end_line: int | None = None
+    page_token: str | None = None
 
     @pydantic.model_validator(mode="before")
     @classmethod
     def _validate(cls, data):
-        path = re.sub(r"\.+", ".", data["path"])
-        if path.startswith("/"):
-            path = path[1:]
-        data["path"] = path
+        data["path"] = local_path(data["path"])
         return data
 
+    def cache_stamp(self) -> Hashable | None:
+        return _file_stamp(self.path)
+
     def __call__(self, events: FunctionEventHandler = FunctionEventHandler()):
         path = Path(self.path)
+        settings = events.settings
 
         try:
             if path.is_dir():
-                listing = [sub.name + ("/" if sub.is_dir() else "") for sub in path.iterdir()]
-                events.log(f"Getting file list: '{path} -> {listing}")
+                listing, next_token = reading.list_directory(path, settings.max_dir_entries, self.page_token)
+                events.log(f"Getting file list: '{path}' -> {len(listing)} entries")
                 return json.dumps({
                     "success": True,
                     "path": str(path),
                     "file-type": "directory",
                     "content": listing,
+                    "next_page_token": next_token,
                 })
 
-            events.log(f"Reading file: '{path}'")
-            return json.dumps({
-                "success": True,
-                "path": str(path),
-                "file-type": "file",
-                "content": path.read_text()
-            })
+            if reading.is_binary(path):
+                events.log(f"Not reading binary file: '{path}'")
+                return json.dumps({
+                    "success": True,
+                    "path": str(path),
+                    "file-type": "binary",
+                    "size": path.stat().st_size,
+                    "content": None,
+                })
+
+            by_line = self.start_line is not None or self.end_line is not None
+            if by_line:
+                events.log(f"Reading file: '{path}' lines {self.start_line or 1}-{self.end_line or ''}")
+            else:
+                events.log(f"Reading file: '{path}'")
+
+            def read(max_bytes: int) -> dict:
+                if by_line:
+                    chunk = reading.read_lines(path, self.start_line or 1, self.end_line, max_bytes,
+                                               settings.mmap_threshold)
+                else:
+                    chunk = reading.read_bytes(path, self.offset or 0, max_bytes, settings.mmap_threshold)
+                result = {
+                    "success": True,
+                    "path": str(path),
+                    "file-type": "file",
+                    "size": chunk.size,
+                    "offset": chunk.offset,
+                    "next_offset": chunk.next_offset,
+                    "eof": chunk.next_offset is None,
+                    "content": chunk.data.decode(errors="replace"),
+                }
+                if chunk.end_line is not None:
+                    result["end_line"] = chunk.end_line
+                    result["partial_line"] = chunk.partial
+                return result
+
+            max_bytes = min(self.length or settings.max_read_bytes, settings.max_read_bytes)
+            return json.dumps(fitted_read(read, max_bytes, settings.output_budget))
         except Exception:
             exception("Read failed")
             events.log(f"Read failed: '{path}'")
@@ -116,26 +225,281 @@ class ReadFileFunction(BaseFunction):
             })
 
 
+# Room left in the output budget for what surrounds a tool's list of results.
+RESULT_OVERHEAD = 256
+
+
+def fit_list(entries: list, max_chars: int | None) -> list:
+    """The leading entries of a list whose JSON fits in `max_chars`."""
+    if max_chars is None:
+        return entries
+    used = 2
+    for index, entry in enumerate(entries):
+        used += len(json.dumps(entry)) + 2
+        if used > max_chars:
+            return entries[:index]
+    return entries
+
+
+def _list_budget(settings: ToolSettings) -> int | None:
+    return None if settings.output_budget is None else max(0, settings.output_budget - RESULT_OVERHEAD)
+
+
+def fitted_read(read: Callable[[int], dict], max_bytes: int, max_chars: int | None) -> dict:
+    """
+    The result of `read(max_bytes)`, read again with fewer bytes for as
+    long as its JSON is over `max_chars` (the output budget), so that a
+    page is never cut short after the fact and its paging fields stay true.
+    """
+    result = read(max_bytes)
+    while max_chars is not None and max_bytes > 1 and (size := len(json.dumps(result))) > max_chars:
+        # Escaping makes the JSON longer than the bytes read; shrink in proportion.
+        max_bytes = max(1, max_bytes * max_chars // size - 1)
+        result = read(max_bytes)
+    return result
+
+
+def _file_stamp(path: str) -> tuple | None:
+    try:
+        stat = Path(path).stat()
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class FileLines(pydantic.BaseModel):
+    path: str
+    start_line: int | None = None
+    end_line: int | None = None
+
+    @pydantic.model_validator(mode="before")
+    @classmethod
+    def _validate(cls, data):
+        data["path"] = local_path(data["path"])
+        return data
+
+
+class ReadFilesFunction(BaseFunction):
+    NAME: ClassVar[str] = "read_files"
+    DESCRIPTION: ClassVar[str] = """\
+        Read several text files, or line ranges of them, in one call. Each
+        entry of `files` is a path with an optional `start_line` and
+        `end_line` (1-based, inclusive). The output is limited in total: if
+        a file's `end_line` is short of what was asked and `eof` is false,
+        continue from `end_line` + 1, and read files that failed with
+        "Output limit reached" in another call. If `partial_line` is true,
+        line `end_line` was too long to return whole: read the rest of it
+        with read_file from `next_offset`.
+    """
+    CACHEABLE: ClassVar[bool] = True
+    files: list[FileLines]
+
+    def cache_stamp(self) -> Hashable | None:
+        stamps = tuple(_file_stamp(file.path) for file in self.files)
+        return None if None in stamps else stamps
+
+    def __call__(self, events: FunctionEventHandler = FunctionEventHandler()):
+        settings = events.settings
+        events.log(f"Reading files: {', '.join(repr(file.path) for file in self.files)}")
+        # Both the bytes read and the characters of JSON returned are limited.
+        budget = settings.max_read_bytes
+        chars = _list_budget(settings)
+        results = []
+        for file in self.files:
+            path = Path(file.path)
+            if results and chars is not None:
+                chars -= len(json.dumps(results[-1])) + 2
+            # Room for at least a line or two, or else an error.
+            if budget <= 0 or (chars is not None and chars < 200):
+                results.append({"path": file.path, "success": False, "error": "Output limit reached"})
+                continue
+            try:
+                if path.is_dir():
+                    results.append({"path": file.path, "success": False, "error": "Is a directory"})
+                elif not path.exists():
+                    results.append({"path": file.path, "success": False, "error": "No such file"})
+                elif reading.is_binary(path):
+                    results.append({
+                        "path": file.path,
+                        "success": True,
+                        "file-type": "binary",
+                        "size": path.stat().st_size,
+                        "content": None,
+                    })
+                else:
+                    start = max(1, file.start_line or 1)
+                    read_bytes = 0
+
+                    def read(max_bytes: int) -> dict:
+                        nonlocal read_bytes
+                        chunk = reading.read_lines(path, start, file.end_line, max_bytes, settings.mmap_threshold)
+                        read_bytes = len(chunk.data)
+                        return {
+                            "path": file.path,
+                            "success": True,
+                            "start_line": start,
+                            "end_line": chunk.end_line,
+                            "partial_line": chunk.partial,
+                            "next_offset": chunk.next_offset,
+                            "eof": chunk.next_offset is None,
+                            "content": chunk.data.decode(errors="replace"),
+                        }
+
+                    results.append(fitted_read(read, budget, chars))
+                    budget -= read_bytes
+            except OSError:
+                exception("Read failed")
+                results.append({"path": file.path, "success": False, "error": "Unable to access file"})
+        return json.dumps({"success": True, "files": results})
+
+
+# Longer matching lines are cut short in search results.
+MAX_MATCH_CHARS = 500
+
+
+class SearchFilesFunction(BaseFunction):
+    NAME: ClassVar[str] = "search_files"
+    DESCRIPTION: ClassVar[str] = """\
+        Search the text files under a directory (or one file) for lines
+        matching a regular expression in Python syntax, like `grep -rn`.
+        Returns the matching lines with their paths and line numbers;
+        `truncated` is true if there were more than `max_results`, or more
+        than fit in the output.
+        `include` is a glob that the files' paths must match, e.g. "*.py"
+        or "src/**/*.ts". Binary and very large files are skipped, as are
+        directories such as .git and node_modules.
+    """
+    pattern: str
+    path: str = "."
+    include: str | None = None
+    ignore_case: bool = False
+    max_results: int | None = None
+
+    def __call__(self, events: FunctionEventHandler = FunctionEventHandler()):
+        settings = events.settings
+        try:
+            regex = re.compile(self.pattern, re.MULTILINE | (re.IGNORECASE if self.ignore_case else 0))
+        except re.error as err:
+            return json.dumps({"success": False, "error": f"Invalid pattern: {err}"})
+        limit = min(self.max_results or settings.max_search_results, settings.max_search_results)
+        matches, truncated, searched = file_index(settings.file_index_bytes).search(
+            regex,
+            _index_path(self.path),
+            path_matcher(self.include) if self.include else None,
+            limit,
+            settings.max_search_file_bytes,
+        )
+        events.log(f"Searching for '{self.pattern}' in '{self.path}' -> {len(matches)} matches in {searched} files")
+        entries = [
+            {"path": match.path, "line": match.line, "text": match.text[:MAX_MATCH_CHARS]}
+            for match in matches
+        ]
+        kept = fit_list(entries, _list_budget(settings))
+        return json.dumps({
+            "success": True,
+            "matches": kept,
+            "truncated": truncated or len(kept) < len(entries),
+            "files_searched": searched,
+        })
+
+
+class GlobFilesFunction(BaseFunction):
+    NAME: ClassVar[str] = "glob_files"
+    DESCRIPTION: ClassVar[str] = """\
+        List the files under a directory whose paths (relative to it) match
+        a glob, e.g. "**/*.py" or "tests/test_*.py". `*` doesn't match "/",
+        `**/` matches any number of directories and a pattern without "/"
+        is matched against file names. `truncated` is true if there were
+        more files than were returned.
+    """
+    pattern: str
+    path: str = "."
+
+    def __call__(self, events: FunctionEventHandler = FunctionEventHandler()):
+        settings = events.settings
+        files, truncated = file_index(settings.file_index_bytes).glob(
+            path_matcher(self.pattern), _index_path(self.path), settings.max_dir_entries)
+        events.log(f"Finding files: '{self.pattern}' in '{self.path}' -> {len(files)} files")
+        kept = fit_list(files, _list_budget(settings))
+        return json.dumps({"success": True, "files": kept, "truncated": truncated or len(kept) < len(files)})
+
+
+# Commands whose output depends only on the commits and refs, never on the
+# work tree (unlike status, diff or blame), so `git_state` covers it.
+REF_ONLY_GIT_COMMANDS = frozenset({"describe", "log", "rev-parse", "shortlog", "show"})
+# Options that make them look at the work tree after all.
+WORK_TREE_GIT_OPTIONS = ("--dirty", "--broken")
+
+
+def _mtime(path: Path) -> int | None:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def git_state(repo_dir: str) -> tuple | None:
+    """
+    HEAD, the commit it points to and the mtimes of every ref, the reflog,
+    the index and the config, read from .git without running git; None if
+    that isn't possible (e.g. in a worktree, where .git is a file).
+    """
+    git_dir = Path(repo_dir, ".git")
+    try:
+        head = (git_dir / "HEAD").read_text().strip()
+        commit = head
+        if head.startswith("ref: "):
+            ref = git_dir / head[len("ref: "):]
+            commit = ref.read_text().strip() if ref.exists() else None
+        refs = []
+        for root, _, files in os.walk(git_dir / "refs"):
+            refs.extend((os.path.join(root, name), _mtime(Path(root, name))) for name in files)
+        stamps = tuple(_mtime(git_dir / name) for name in ("packed-refs", "logs/HEAD", "index", "config"))
+    except OSError:
+        return None
+    return head, commit, tuple(sorted(refs, key=lambda ref: ref[0])), *stamps
+
+
 class GitCommandFunction(BaseFunction):
     NAME: ClassVar[str] = "git_command"
     DESCRIPTION: ClassVar[str] = "Execute a Git command within a repository."
+    CACHEABLE: ClassVar[bool] = True
     command: str
     args: List[str] = []
     repo_dir: str
 
+    def cache_stamp(self) -> Hashable | None:
+        if self.command not in REF_ONLY_GIT_COMMANDS or any(
+                arg.startswith(WORK_TREE_GIT_OPTIONS) for arg in self.args):
+            return None
+        return git_state(self.repo_dir)
+
     def __call__(self, events: FunctionEventHandler = FunctionEventHandler()):
         git_cmd = ["git", "-C", self.repo_dir] + [self.command] + self.args
         command_str = " ".join(git_cmd)
         events.log(f"Executing Git command: {command_str}")
-        proc = subprocess.run(git_cmd, capture_output=True, text=True)
-        if proc.returncode == 0:
-            return {'success': True, 'output': proc.stdout}
+        settings = events.settings
+        result = run_bounded(
+            git_cmd,
+            max_bytes=settings.max_output_bytes,
+            max_lines=settings.max_output_lines,
+            timeout=settings.command_timeout,
+            progress=events.log,
+            progress_interval=settings.progress_interval,
+        )
+        if result.timed_out:
+            return {'success': False, 'error': f"Killed after {settings.command_timeout} seconds", 'output': result.stdout}
+        if result.returncode == 0:
+            return {'success': True, 'output': result.stdout}
         else:
-            return {'success': False, 'error': proc.stderr}
+            return {'success': False, 'error': result.stderr}
 
 
 DEFAULT_FUNCTIONS = [
     ReadFileFunction,
+    ReadFilesFunction,
+    SearchFilesFunction,
+    GlobFilesFunction,
     WriteFileFunction,
     ExecFunction,
     GitCommandFunction,
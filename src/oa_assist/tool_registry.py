@@ -0,0 +1,141 @@
+"""
+The tools offered to assistants.
+
+A `ToolRegistry` maps tool names to `BaseFunction` classes: the built-in
+ones, plus any that plugins provide through the "oa_assist.tools" entry
+point group, e.g. in a plugin's pyproject.toml:
+
+    [project.entry-points."oa_assist.tools"]
+    search_docs = "my_plugin.tools:SearchDocsFunction"
+
+Plugin classes are only imported when the model calls them or their
+schema isn't already cached. Schemas are computed once per class and,
+with an ObjectCache, persisted along with a hash of their content, so
+whether an assistant's remote tools are up to date can be checked
+without rebuilding them.
+"""
+import hashlib
+import json
+import os
+import sys
+from collections.abc import Mapping
+from importlib.metadata import EntryPoint, entry_points
+from logging import warning
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+import pydantic
+
+from .cache import ObjectCache, TOOL
+from .tool_functions import BaseFunction
+
+ENTRY_POINT_GROUP = "oa_assist.tools"
+
+
+class ToolSchema(pydantic.BaseModel):
+    # The class's import path ("module:QualName").
+    id: str
+    # Changes whenever the class may have: its source file, or its plugin's version.
+    stamp: str
+    function: dict
+    hash: str
+
+
+class _Tool(NamedTuple):
+    key: str
+    stamp: str
+    load: Callable[[], type[BaseFunction]]
+
+
+def tools_hash(tools: Iterable[dict]) -> str:
+    """A hash of tool definitions that doesn't depend on their order or formatting."""
+    canonical = sorted(json.dumps(tool, sort_keys=True, separators=(",", ":")) for tool in tools)
+    return hashlib.sha256("\n".join(canonical).encode()).hexdigest()
+
+
+def _class_tool(cls: type[BaseFunction]) -> _Tool:
+    module = sys.modules.get(cls.__module__)
+    try:
+        stat = os.stat(module.__file__)
+        stamp = f"{stat.st_mtime_ns}:{stat.st_size}"
+    except (AttributeError, TypeError, OSError):
+        stamp = ""
+    return _Tool(f"{cls.__module__}:{cls.__qualname__}", stamp, lambda: cls)
+
+
+def _entry_point_tool(entry_point: EntryPoint) -> _Tool:
+    dist = entry_point.dist
+    stamp = f"{dist.name}=={dist.version}" if dist else ""
+    return _Tool(entry_point.value, stamp, entry_point.load)
+
+
+class ToolRegistry(Mapping[str, type[BaseFunction]]):
+    def __init__(self, functions: Iterable[type[BaseFunction]] = (), plugins: bool = False,
+                 cache: ObjectCache | None = None):
+        self.cache = cache
+        self._tools = {func.NAME: _class_tool(func) for func in functions}
+        self._classes = {func.NAME: func for func in functions}
+        self._functions: dict[str, dict] = {}
+        self._plugins = plugins
+
+    def _discover(self):
+        if not self._plugins:
+            return
+        self._plugins = False
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+            if entry_point.name in self._tools:
+                warning("Ignoring plugin tool '%s' (%s): the name is taken", entry_point.name, entry_point.value)
+                continue
+            self._tools[entry_point.name] = _entry_point_tool(entry_point)
+
+    def __getitem__(self, name: str) -> type[BaseFunction]:
+        if name not in self._classes:
+            self._discover()
+            cls = self._tools[name].load()
+            if cls.NAME != name:
+                raise KeyError(f"Plugin tool '{name}' is named '{cls.NAME}'")
+            self._classes[name] = cls
+        return self._classes[name]
+
+    def __iter__(self) -> Iterator[str]:
+        self._discover()
+        return iter(self._tools)
+
+    def __len__(self) -> int:
+        self._discover()
+        return len(self._tools)
+
+    def __contains__(self, name) -> bool:
+        self._discover()
+        return name in self._tools
+
+    def function(self, name: str) -> dict:
+        """The function definition of a tool, from the cache if its class hasn't changed."""
+        if name in self._functions:
+            return self._functions[name]
+        self._discover()
+        tool = self._tools[name]
+        cached = self.cache and self.cache.get(TOOL, tool.key, ToolSchema, max_age=float("inf"))
+        if cached and cached.stamp == tool.stamp and tool.stamp:
+            function = cached.function
+        else:
+            function = self[name].get_function()
+            if self.cache:
+                self.cache.put(TOOL, ToolSchema(
+                    id=tool.key, stamp=tool.stamp, function=function, hash=tools_hash([function])))
+        self._functions[name] = function
+        return function
+
+    def definitions(self, builtin_tools: Iterable[dict] = ()) -> list[dict]:
+        """The `tools` parameter for an assistant: `builtin_tools` followed by every function."""
+        return list(builtin_tools) + [{"type": "function", "function": self.function(name)} for name in self]
+
+    def matches(self, tools: Iterable, builtin_tools: Iterable[dict] | None = None) -> bool:
+        """
+        Whether an assistant's `tools` are what `definitions` would give.
+        With `builtin_tools` None, only the function tools are compared.
+        """
+        remote = [tool if isinstance(tool, dict) else tool.model_dump(exclude_none=True) for tool in tools]
+        if builtin_tools is None:
+            remote = [tool for tool in remote if tool["type"] == "function"]
+            builtin_tools = ()
+        return tools_hash(remote) == tools_hash(self.definitions(builtin_tools))
@@ -2,13 +2,4 @@
 Helpers.
 """
 
-from rich.console import Console
-from rich.panel import Panel
-from rich.markdown import Markdown
-from rich.prompt import Prompt
-from rich.table import Table
-from rich.columns import Columns
-from rich.text import Text
-from rich.padding import Padding
-
-Working = Console().status("Working...")
+from ._dep.rich import __getattr__
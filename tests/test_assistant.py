@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from oa_assist.assistant import AssistantInterface, ThreadInterface
+
+
+def bad_request(message: str, param: str | None = None) -> openai.BadRequestError:
+    response = httpx.Response(400, request=httpx.Request("POST", "https://api.example.com/v1/threads/thread_1/runs"))
+    return openai.BadRequestError(message, response=response, body={"message": message, "param": param})
+
+
+class Runs:
+    """Stands in for client.beta.threads.runs."""
+
+    def __init__(self, events=(), error: Exception | None = None):
+        self.events = events
+        self.error = error
+        self.created = []
+
+    def create(self, **params):
+        self.created.append(params)
+        if params.get("stream"):
+            if self.error is not None:
+                raise self.error
+            return iter(self.events)
+        return SimpleNamespace(id="run_polled")
+
+
+def thread(runs: Runs) -> ThreadInterface:
+    client = SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(runs=runs)))
+    assistant = AssistantInterface(client, SimpleNamespace(id="asst_1"))
+    return ThreadInterface(assistant, SimpleNamespace(id="thread_1"))
+
+
+def event(name: str, data) -> SimpleNamespace:
+    return SimpleNamespace(event=name, data=data)
+
+
+def run(status: str) -> SimpleNamespace:
+    return SimpleNamespace(id="run_1", status=status, usage=None)
+
+
+def delta(text: str) -> SimpleNamespace:
+    part = SimpleNamespace(type="text", text=SimpleNamespace(value=text))
+    return SimpleNamespace(delta=SimpleNamespace(content=[part]))
+
+
+def test_streamed_run():
+    message = SimpleNamespace(id="msg_1")
+    runs = Runs([
+        event("thread.run.created", run("queued")),
+        event("thread.run.in_progress", run("in_progress")),
+        event("thread.message.delta", delta("Hel")),
+        event("thread.message.delta", delta("lo")),
+        event("thread.message.completed", message),
+        event("thread.run.completed", run("completed")),
+    ])
+    pending = thread(runs).start_run()
+    updates = list(pending.events())
+    assert [update.kind for update in updates] == ["status", "status", "delta", "delta", "message", "done"]
+    assert "".join(update.data for update in updates if update.kind == "delta") == "Hello"
+    assert pending.run_id == "run_1"
+    assert runs.created == [{"thread_id": "thread_1", "assistant_id": "asst_1", "stream": True}]
+
+
+def test_sdk_without_streaming_falls_back_to_polling():
+    runs = Runs(error=TypeError("unexpected keyword argument 'stream'"))
+    interface = thread(runs)
+    pending = interface.start_run()
+    assert pending.run_id == "run_polled"
+    assert not interface.assistant_interface.streaming
+
+
+def test_refused_stream_falls_back_to_polling():
+    runs = Runs(error=bad_request("Unrecognized request argument supplied: stream", param="stream"))
+    interface = thread(runs)
+    assert interface.start_run().run_id == "run_polled"
+    assert not interface.assistant_interface.streaming
+
+
+def test_other_bad_requests_are_raised():
+    runs = Runs(error=bad_request("Thread thread_1 already has an active run run_0."))
+    interface = thread(runs)
+    with pytest.raises(openai.BadRequestError):
+        interface.start_run()
+    assert interface.assistant_interface.streaming
+    assert len(runs.created) == 1
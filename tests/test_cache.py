@@ -0,0 +1,48 @@
+import pydantic
+
+from oa_assist.cache import MESSAGE, ObjectCache
+
+
+class Message(pydantic.BaseModel):
+    id: str
+    created_at: int
+
+
+def messages(*ids: str, created_at: int = 100) -> list[Message]:
+    return [Message(id=id, created_at=created_at) for id in ids]
+
+
+def ids(objs) -> list[str]:
+    return [obj.id for obj in objs]
+
+
+def test_ties_keep_the_api_order(tmp_path):
+    cache = ObjectCache(tmp_path / "cache.db")
+    # Ids that sort the other way round to the API's order.
+    cache.put_many(MESSAGE, messages("msg_c", "msg_b"), parent="thread", position="after")
+    cache.put_many(MESSAGE, messages("msg_a"), parent="thread", position="after")
+    assert ids(cache.list(MESSAGE, Message, parent="thread")) == ["msg_c", "msg_b", "msg_a"]
+
+
+def test_earlier_pages_go_before(tmp_path):
+    cache = ObjectCache(tmp_path / "cache.db")
+    cache.put_many(MESSAGE, messages("msg_3", "msg_4"), parent="thread", position="after")
+    cache.put_many(MESSAGE, messages("msg_1", "msg_2"), parent="thread", position="before")
+    assert ids(cache.list(MESSAGE, Message, parent="thread")) == ["msg_1", "msg_2", "msg_3", "msg_4"]
+    assert ids(cache.page(MESSAGE, Message, "thread", limit=3)) == ["msg_2", "msg_3", "msg_4"]
+    assert ids(cache.page(MESSAGE, Message, "thread", before="msg_3", limit=3)) == ["msg_1", "msg_2"]
+
+
+def test_cached_objects_keep_their_place(tmp_path):
+    cache = ObjectCache(tmp_path / "cache.db")
+    cache.put_many(MESSAGE, messages("msg_1", "msg_2"), parent="thread", position="after")
+    cache.put_many(MESSAGE, messages("msg_2", "msg_3"), parent="thread", position="after")
+    assert ids(cache.list(MESSAGE, Message, parent="thread")) == ["msg_1", "msg_2", "msg_3"]
+
+
+def test_created_at_comes_first(tmp_path):
+    cache = ObjectCache(tmp_path / "cache.db")
+    cache.put_many(MESSAGE, messages("msg_new", created_at=200), parent="thread", position="after")
+    cache.put_many(MESSAGE, messages("msg_old", created_at=100), parent="thread", position="after")
+    assert ids(cache.list(MESSAGE, Message, parent="thread")) == ["msg_old", "msg_new"]
+    assert ids(cache.list(MESSAGE, Message, parent="thread", reverse=True)) == ["msg_new", "msg_old"]
@@ -0,0 +1,107 @@
+import json
+
+import pytest
+from click.testing import CliRunner
+from rich.console import Console
+
+from oa_assist import cache, config
+from oa_assist.cli import CLI, cli
+from oa_assist.config import ConfigStore, UserConfig, flatten, load_user_config, unflatten
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "config.db"
+
+
+def test_store_round_trip(path):
+    store = ConfigStore(path)
+    store.update({"selected.thread_id": "thread_1", "labels.thread.thread_1": "work", "cache.ttl": 60.0})
+    assert store.get("selected.thread_id") == "thread_1"
+    assert store.load("labels.") == {"labels.thread.thread_1": "work"}
+    assert "labels.thread.thread_1" not in store.load(exclude=("labels",))
+    store.update({}, removed={"cache.ttl"})
+    assert store.get("cache.ttl") is None
+    store.delete("labels")
+    assert store.load("labels.") == {}
+
+
+def test_dict_settings_are_one_row():
+    config = UserConfig(tools={"shell_env": {"PATH": "/bin"}}, labels={"thread": {"thread_1": "work"}})
+    flat = flatten(config.model_dump(include_lazy=True), model=UserConfig)
+    assert flat["tools.shell_env"] == {"PATH": "/bin"}
+    assert flat["tools.max_workers"] == config.tools.max_workers
+    assert flat["labels.thread.thread_1"] == "work"
+    assert UserConfig(**unflatten(flat)) == config
+
+
+def test_saves_only_changes(path):
+    config = load_user_config(path)
+    config.selected.thread_id = "thread_1"
+    config.tools.shell_env = {"HOME": "/tmp"}
+    config.save()
+    assert ConfigStore(path).load() == {"selected.thread_id": "thread_1", "tools.shell_env": {"HOME": "/tmp"}}
+
+    # Another process' change to a different key survives.
+    ConfigStore(path).update({"cache.ttl": 10.0})
+    config.selected.assistant_id = "asst_1"
+    config.save()
+    loaded = load_user_config(path)
+    assert (loaded.selected.thread_id, loaded.selected.assistant_id, loaded.cache.ttl) == ("thread_1", "asst_1", 10.0)
+    assert loaded.tools.shell_env == {"HOME": "/tmp"}
+
+
+def test_labels_are_loaded_lazily(path):
+    ConfigStore(path).update({"labels.thread.thread_1": "work"})
+    config = load_user_config(path)
+    assert config._labels is None
+    assert config.labels.thread == {"thread_1": "work"}
+
+
+def test_migrates_the_legacy_file(tmp_path, monkeypatch):
+    legacy = tmp_path / "config.json"
+    legacy.write_text(json.dumps({
+        "selected": {"assistant_id": "asst_1", "thread_id": "thread_1"},
+        "labels": {"thread": {"thread_1": "work"}},
+        "cache": {"thread": {"thread_1": {"id": "thread_1", "created_at": 1, "metadata": {}, "object": "thread"}}},
+    }))
+    monkeypatch.setattr(config, "LEGACY_USER_CONFIG", legacy)
+    monkeypatch.setattr(cache.ObjectCache.__init__, "__defaults__", (tmp_path / "cache.db", 300.0))
+
+    loaded = load_user_config(tmp_path / "config.db")
+    assert loaded.selected.assistant_id == "asst_1"
+    assert loaded.labels.thread == {"thread_1": "work"}
+    # Threads cached in the file move to the object cache.
+    assert [thread["id"] for thread in cache.ObjectCache().list(cache.THREAD, None)] == ["thread_1"]
+    assert not legacy.exists()
+    assert (tmp_path / "config.json.bak").exists()
+
+
+def oaa(path, *args) -> str:
+    obj = CLI(config=load_user_config(path), console=Console(width=200))
+    result = CliRunner().invoke(cli, ["config", *args], obj=obj, catch_exceptions=False)
+    return result.output
+
+
+def test_get_shows_defaults(path):
+    assert oaa(path, "get", "cache.ttl") == "cache.ttl = 300.0\n"
+    assert "tools.shell_env = null\n" in oaa(path, "get", "tools.")
+
+
+def test_set_a_dict_setting(path):
+    oaa(path, "set", "tools.shell_env", '{"PATH": "/bin"}')
+    assert load_user_config(path).tools.shell_env == {"PATH": "/bin"}
+    oaa(path, "set", "tools.shell_env.HOME", "/tmp")
+    assert load_user_config(path).tools.shell_env == {"PATH": "/bin", "HOME": "/tmp"}
+    assert oaa(path, "get", "tools.shell_env.HOME") == 'tools.shell_env.HOME = "/tmp"\n'
+    oaa(path, "unset", "tools.shell_env.PATH")
+    assert load_user_config(path).tools.shell_env == {"HOME": "/tmp"}
+
+
+def test_set_an_entry_of_an_unset_dict(path):
+    oaa(path, "set", "tools.shell_env.PATH", "/bin")
+    assert load_user_config(path).tools.shell_env == {"PATH": "/bin"}
+
+
+def test_set_rejects_unknown_keys(path):
+    assert "Unknown key" in oaa(path, "set", "tools.nonsense", "1")
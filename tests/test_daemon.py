@@ -0,0 +1,41 @@
+import io
+
+import pytest
+
+from oa_assist.daemon import _runs_locally, read_frame, write_frame
+
+
+def test_frames_round_trip():
+    stream = io.BytesIO()
+    write_frame(stream, b"r", b'{"argv": []}')
+    write_frame(stream, b"o", b"")
+    write_frame(stream, b"x", b"0")
+    stream.seek(0)
+    assert read_frame(stream) == (b"r", b'{"argv": []}')
+    assert read_frame(stream) == (b"o", b"")
+    assert read_frame(stream) == (b"x", b"0")
+    assert read_frame(stream) is None
+
+
+def test_truncated_header_ends_the_stream():
+    stream = io.BytesIO()
+    write_frame(stream, b"o", b"hello")
+    stream = io.BytesIO(stream.getvalue()[:3])
+    assert read_frame(stream) is None
+
+
+@pytest.mark.parametrize("args, local", [
+    (["ask", "hi"], True),
+    (["ask", "-"], True),
+    (["thread", "list", "-"], True),
+    (["chat"], True),
+    (["run", "attach"], True),
+    (["run", "list"], False),
+    (["th", "pr", "-y"], True),
+    (["thread", "list"], False),
+    (["-v", "assistant", "prune"], True),
+    (["assistant", "list"], False),
+    ([], False),
+])
+def test_runs_locally(args, local):
+    assert _runs_locally(args) is local
@@ -0,0 +1,152 @@
+import json
+import os
+import re
+
+import pytest
+
+from oa_assist.file_index import FileIndex, UNSEARCHABLE, glob_regex, path_matcher
+from oa_assist.settings import ToolSettings
+from oa_assist.tool_functions import (
+    FunctionEventHandler, GlobFilesFunction, ReadFilesFunction, SearchFilesFunction,
+)
+
+
+def events(**settings) -> FunctionEventHandler:
+    handler = FunctionEventHandler()
+    handler.settings = ToolSettings(**settings)
+    return handler
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    (tmp_path / "src" / "pkg").mkdir(parents=True)
+    (tmp_path / "src" / "pkg" / "core.py").write_text("import os\n\ndef main():\n    return os.getcwd()\n")
+    (tmp_path / "src" / "pkg" / "util.py").write_text("def helper():\n    return 1\n")
+    (tmp_path / "README.md").write_text("# Title\nUse main() to start.\n")
+    (tmp_path / "data.bin").write_bytes(b"\0\1\2main")
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".git" / "config").write_text("main\n")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.mark.parametrize("pattern, path, matched", [
+    ("*.py", "core.py", True),
+    ("*.py", "src/core.py", False),
+    ("**/*.py", "core.py", True),
+    ("**/*.py", "src/pkg/core.py", True),
+    ("src/*.py", "src/pkg/core.py", False),
+    ("test_?.py", "test_1.py", True),
+    ("[!a]*.md", "README.md", True),
+    ("[!R]*.md", "README.md", False),
+])
+def test_glob_regex(pattern, path, matched):
+    assert (glob_regex(pattern).match(path) is not None) is matched
+
+
+def test_path_matcher_uses_the_name_without_a_slash():
+    assert path_matcher("*.py")("src/pkg/core.py")
+    assert not path_matcher("src/*.py")("src/pkg/core.py")
+
+
+def test_walk_is_sorted_and_skips_ignored_dirs(tree):
+    index = FileIndex(tree)
+    assert list(index.walk()) == ["README.md", "data.bin", "src/pkg/core.py", "src/pkg/util.py"]
+    assert list(index.walk("src/pkg/util.py")) == ["src/pkg/util.py"]
+    assert list(index.walk("missing")) == []
+
+
+def test_walk_sees_new_files(tree):
+    index = FileIndex(tree)
+    list(index.walk())
+    (tree / "src" / "pkg" / "new.py").write_text("")
+    os.utime(tree / "src" / "pkg", ns=(0, 1))
+    assert "src/pkg/new.py" in list(index.walk())
+
+
+def test_text_is_cached_until_the_file_changes(tree):
+    index = FileIndex(tree)
+    assert index.text("README.md", 1024).startswith("# Title")
+    (tree / "README.md").write_text("changed and longer\n")
+    assert index.text("README.md", 1024) == "changed and longer\n"
+    assert index.text("data.bin", 1024) == UNSEARCHABLE
+    assert index.text("README.md", 4) == "changed and longer\n"
+    assert index.text("src/pkg/core.py", 4) == UNSEARCHABLE
+
+
+def test_text_cache_is_bounded(tree):
+    index = FileIndex(tree, max_bytes=60)
+    index.text("src/pkg/core.py", 1024)
+    index.text("src/pkg/util.py", 1024)
+    index.text("README.md", 1024)
+    assert index._bytes <= 60
+    assert "src/pkg/core.py" not in index._texts
+
+
+def test_search(tree):
+    index = FileIndex(tree)
+    matches, truncated, searched = index.search(re.compile("main"))
+    assert [(match.path, match.line) for match in matches] == [("README.md", 2), ("src/pkg/core.py", 3)]
+    assert not truncated
+    assert searched == 4
+    matches, truncated, _ = index.search(re.compile("return"), "src", path_matcher("*.py"), max_results=1)
+    assert [(match.path, match.line) for match in matches] == [("src/pkg/core.py", 4)]
+    assert truncated
+
+
+def test_read_files(tree):
+    output = ReadFilesFunction(files=[
+        {"path": "README.md"},
+        {"path": "src/pkg/core.py", "start_line": 3, "end_line": 3},
+        {"path": "missing.txt"},
+        {"path": "src"},
+        {"path": "data.bin"},
+    ])(events())
+    files = json.loads(output)["files"]
+    assert files[0]["content"] == "# Title\nUse main() to start.\n"
+    assert files[0]["eof"]
+    assert files[1]["content"] == "def main():\n"
+    assert (files[1]["start_line"], files[1]["end_line"], files[1]["eof"]) == (3, 3, False)
+    assert [file.get("error") for file in files[2:4]] == ["No such file", "Is a directory"]
+    assert files[4]["file-type"] == "binary"
+
+
+def test_read_files_fits_the_output_budget(tree):
+    text = "".join(f'\tline {number} = "{number}"\n' for number in range(5000))
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (tree / name).write_text(text)
+    handler = events(output_budget=20_000)
+    output = ReadFilesFunction(files=[{"path": "a.txt"}, {"path": "b.txt"}, {"path": "c.txt"}])(handler)
+    assert len(output) <= 20_000
+    files = json.loads(output)["files"]
+    assert not files[0]["eof"]
+    assert text.startswith(files[0]["content"])
+    assert files[0]["end_line"] == files[0]["content"].count("\n")
+    assert files[-1]["error"] == "Output limit reached"
+
+    # Continuing from end_line + 1 carries on where the first page stopped.
+    rest = json.loads(ReadFilesFunction(files=[{"path": "a.txt", "start_line": files[0]["end_line"] + 1}])(handler))
+    assert text.startswith(files[0]["content"] + rest["files"][0]["content"])
+
+
+def test_search_files(tree):
+    result = json.loads(SearchFilesFunction(pattern="MAIN", ignore_case=True, include="*.py")(events()))
+    assert result["matches"] == [{"path": "src/pkg/core.py", "line": 3, "text": "def main():"}]
+    assert not result["truncated"]
+    assert not json.loads(SearchFilesFunction(pattern="(")(events()))["success"]
+
+
+def test_search_files_fits_the_output_budget(tree):
+    (tree / "many.txt").write_text("match " * 80 + "\n" * 2 + ("match " * 80 + "\n") * 300)
+    output = SearchFilesFunction(pattern="match", max_results=200)(events(output_budget=10_000))
+    assert len(output) <= 10_000
+    result = json.loads(output)
+    assert result["truncated"]
+    assert 0 < len(result["matches"]) < 200
+
+
+def test_glob_files(tree):
+    result = json.loads(GlobFilesFunction(pattern="**/*.py")(events()))
+    assert result == {"success": True, "files": ["src/pkg/core.py", "src/pkg/util.py"], "truncated": False}
+    result = json.loads(GlobFilesFunction(pattern="*.py", path="src/pkg")(events()))
+    assert result["files"] == ["src/pkg/core.py", "src/pkg/util.py"]
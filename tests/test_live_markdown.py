@@ -0,0 +1,125 @@
+import io
+from types import SimpleNamespace
+
+import pytest
+from rich.console import Console
+from rich.markdown import Markdown
+
+from oa_assist.chat import render_run
+from oa_assist.live_markdown import BlockSplitter, LiveMarkdown
+
+REPLY = """# Title
+
+A paragraph
+over two lines.
+
+- one
+- two
+
+- three
+  continued
+
+```python
+x = 1
+
+y = 2
+```
+After code.
+
+| a | b |
+|---|---|
+| 1 | 2 |
+
+---
+
+> A quote.
+
+1. first
+2. second
+
+The end."""
+
+
+def split(chunks) -> list[str]:
+    splitter = BlockSplitter()
+    blocks = [block for chunk in chunks for block in splitter.feed(chunk)]
+    return blocks + [splitter.finish()]
+
+
+def chunked(text: str, size: int) -> list[str]:
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+
+def test_splits_top_level_blocks():
+    assert split([REPLY]) == [
+        "# Title\n\n",
+        "A paragraph\nover two lines.\n\n",
+        # A loose list, and an indented line continuing an item.
+        "- one\n- two\n\n- three\n  continued\n\n",
+        # Blank lines inside fenced code don't end it; the closing fence does.
+        "```python\nx = 1\n\ny = 2\n```\n",
+        "After code.\n\n",
+        "| a | b |\n|---|---|\n| 1 | 2 |\n\n",
+        "---\n\n",
+        "> A quote.\n\n",
+        # The last block isn't known to have ended until the text does.
+        "1. first\n2. second\n\nThe end.",
+    ]
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64])
+def test_chunks_split_the_same(size):
+    assert split(chunked(REPLY, size)) == split([REPLY])
+
+
+def test_fence_interrupts_a_paragraph():
+    assert split(["Look:\n```\ncode\n```\nthen"]) == ["Look:\n", "```\ncode\n```\n", "then"]
+
+
+def render(console: Console, chunks) -> str:
+    with LiveMarkdown(console) as stream:
+        for chunk in chunks:
+            stream.feed(chunk)
+    return console.file.getvalue()
+
+
+def plain_console() -> Console:
+    return Console(file=io.StringIO(), width=60, color_system=None)
+
+
+@pytest.mark.parametrize("size", [1, 5, len(REPLY)])
+def test_renders_as_markdown_would(size):
+    whole = plain_console()
+    whole.print(Markdown(REPLY))
+    assert render(plain_console(), chunked(REPLY, size)) == whole.file.getvalue()
+
+
+def test_completed_blocks_print_once():
+    console = Console(file=io.StringIO(), width=60, force_terminal=True, color_system=None)
+    output = render(console, chunked("First paragraph.\n\nSecond paragraph.\n\nThird.", 3))
+    # Only the block being written is redrawn, in the Live region.
+    assert output.count("First paragraph.") == 1
+    assert output.count("Second paragraph.") == 1
+    assert "Third." in output
+
+
+def event(kind: str, data) -> SimpleNamespace:
+    return SimpleNamespace(kind=kind, data=data)
+
+
+def message(role: str, text: str) -> SimpleNamespace:
+    return SimpleNamespace(role=role, content=[SimpleNamespace(type="text", text=SimpleNamespace(value=text))])
+
+
+def test_piped_runs_write_plain_text(capsys):
+    op = SimpleNamespace(events=lambda: iter([
+        event("log", "Executing: ls"),
+        event("delta", "**Hello**"),
+        event("delta", " there"),
+        event("message", message("assistant", "**Hello** there")),
+        event("message", message("assistant", "Another")),
+    ]))
+    console = plain_console()
+    render_run(console, op)
+    assert console.file.getvalue() == "**Hello** there\nAnother\n"
+    assert capsys.readouterr().err == "Executing: ls\n"
@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import pydantic
+import pytest
+from click.testing import CliRunner
+from rich.console import Console
+
+from oa_assist.cache import ASSISTANT, THREAD, ObjectCache
+from oa_assist.cli import CLI, cli
+from oa_assist.config import load_user_config
+from oa_assist.names import NameIndex, PrefixMatch, UnknownName
+
+
+class Thread(pydantic.BaseModel):
+    id: str
+    created_at: int = 100
+
+
+class Assistant(Thread):
+    name: str | None = None
+    model: str = "gpt-4"
+
+
+@pytest.fixture
+def obj(tmp_path):
+    config = load_user_config(tmp_path / "config.db")
+    config.labels.thread.update({"thread_abc1": "work", "thread_abc2": "home"})
+    config.save()
+    cache = ObjectCache(tmp_path / "cache.db")
+    cache.put_many(THREAD, [Thread(id="thread_abc1"), Thread(id="thread_abc2")])
+    cache.put(ASSISTANT, Assistant(id="asst_1", name="Coder"))
+    deleted = []
+    threads = SimpleNamespace(delete=lambda thread_id: deleted.append(thread_id))
+    client = SimpleNamespace(beta=SimpleNamespace(threads=threads))
+    return SimpleNamespace(
+        cli=CLI(config=config, console=Console(width=200), cache=cache, openai=client),
+        deleted=deleted,
+    )
+
+
+def test_resolves_names_labels_and_prefixes(obj):
+    names = NameIndex(obj.cli.cache, obj.cli.config)
+    assert names.resolve(THREAD, "WORK") == "thread_abc1"
+    assert names.resolve(THREAD, "wo") == "thread_abc1"
+    assert names.resolve(THREAD, "thread_abc2") == "thread_abc2"
+    assert names.resolve(ASSISTANT, "cod") == "asst_1"
+    # Uncached ids go to the API as they are.
+    assert names.resolve(THREAD, "thread_xyz") == "thread_xyz"
+    with pytest.raises(UnknownName, match="Ambiguous"):
+        names.resolve(THREAD, "thread_abc")
+    with pytest.raises(UnknownName, match="Did you mean"):
+        names.resolve(THREAD, "wrok")
+
+
+def test_exact_rejects_prefixes(obj):
+    names = NameIndex(obj.cli.cache, obj.cli.config)
+    assert names.resolve(THREAD, "work", exact=True) == "thread_abc1"
+    with pytest.raises(PrefixMatch) as err:
+        names.resolve(THREAD, "wo", exact=True)
+    assert err.value.match.id == "thread_abc1"
+    obj.cli.cache.delete(THREAD, "thread_abc2")
+    with pytest.raises(PrefixMatch):
+        names.resolve(THREAD, "thread_abc", exact=True)
+
+
+def delete(obj, *args, input=None):
+    return CliRunner().invoke(cli, ["thread", "delete", *args], obj=obj.cli, input=input, catch_exceptions=False)
+
+
+def test_delete_by_label_doesnt_ask(obj):
+    result = delete(obj, "work")
+    assert result.exit_code == 0
+    assert obj.deleted == ["thread_abc1"]
+    assert "thread_abc1" not in load_user_config(obj.cli.config._store.path).labels.thread
+
+
+def test_delete_by_prefix_asks(obj):
+    result = delete(obj, "wo", input="n\n")
+    assert result.exit_code == 1
+    assert "Delete thread work (thread_abc1" in result.output
+    assert obj.deleted == []
+    result = delete(obj, "wo", input="y\n")
+    assert result.exit_code == 0
+    assert obj.deleted == ["thread_abc1"]
+
+
+def test_delete_by_prefix_with_yes(obj):
+    # --yes is known before the argument is converted, wherever it's given.
+    result = delete(obj, "wo", "--yes")
+    assert result.exit_code == 0
+    assert obj.deleted == ["thread_abc1"]
@@ -0,0 +1,115 @@
+import json
+
+from oa_assist.output_budget import OutputBudget, dedupe_lines
+from oa_assist.settings import ToolSettings
+from oa_assist.tool_functions import FunctionEventHandler, ReadFileFunction
+
+# Lines of code-like text, with quotes and tabs that JSON escaping makes longer.
+TEXT = "".join(f'\tline {number}: "value" = {number * 7}\n' for number in range(1, 8001))
+
+
+def events(**settings) -> FunctionEventHandler:
+    handler = FunctionEventHandler()
+    handler.settings = ToolSettings(**settings)
+    return handler
+
+
+def test_read_file_pages_fit_the_budget_and_skip_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "big.txt").write_text(TEXT)
+    handler = events()
+    budget = OutputBudget(handler.settings)
+    data, offset = "", 0
+    while True:
+        output = ReadFileFunction(path="big.txt", offset=offset)(handler)
+        assert len(output) <= handler.settings.output_budget
+        assert budget.reduce(output).output == output
+        page = json.loads(output)
+        data += page["content"]
+        if page["eof"]:
+            break
+        offset = page["next_offset"]
+    assert data == TEXT
+
+
+def test_read_file_pages_by_line(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "big.txt").write_text(TEXT)
+    handler = events(output_budget=10_000)
+    data, start = "", 1
+    while True:
+        page = json.loads(ReadFileFunction(path="big.txt", start_line=start)(handler))
+        assert not page["partial_line"]
+        data += page["content"]
+        if page["eof"]:
+            break
+        start = page["end_line"] + 1
+    assert data == TEXT
+
+
+def page(content: str, offset: int = 0, end_line: int | None = None) -> str:
+    result = {"success": True, "offset": offset, "next_offset": offset + len(content), "eof": False,
+              "content": content}
+    if end_line is not None:
+        result.update(end_line=end_line, partial_line=False)
+    return json.dumps(result)
+
+
+def test_oversized_page_keeps_its_head():
+    content = "".join(f"line {number}\n" for number in range(11, 1011))
+    reduced = OutputBudget(ToolSettings(output_budget=2000)).reduce(page(content, offset=100, end_line=1010))
+    data = json.loads(reduced.output)
+    assert len(reduced.output) <= 2000
+    assert content.startswith(data["content"])
+    assert data["content"].endswith("\n")
+    assert data["next_offset"] == 100 + len(data["content"])
+    # The lines kept are 11 up to end_line.
+    assert data["end_line"] == 10 + data["content"].count("\n")
+    assert not data["eof"]
+
+
+def test_oversized_single_line_page_is_partial():
+    reduced = OutputBudget(ToolSettings(output_budget=500)).reduce(page("x" * 5000, end_line=1))
+    data = json.loads(reduced.output)
+    assert data["partial_line"]
+    assert data["end_line"] == 1
+    assert data["next_offset"] == len(data["content"])
+
+
+def test_lists_are_cut_short_as_valid_json():
+    matches = [{"path": f"src/file{number}.py", "line": number, "text": "x = 1\t" * 40} for number in range(300)]
+    output = json.dumps({"success": True, "matches": matches, "truncated": False, "files_searched": 300})
+    reduced = OutputBudget(ToolSettings(output_budget=5000)).reduce(output)
+    data = json.loads(reduced.output)
+    assert len(reduced.output) <= 5000
+    assert data["truncated"]
+    assert data["matches"] == matches[:len(data["matches"])]
+    assert data["matches_omitted"] == 300 - len(data["matches"])
+
+
+def test_nested_content_stays_valid_json():
+    files = [{"path": f"file{number}.txt", "content": TEXT[:20_000]} for number in range(5)]
+    output = json.dumps({"success": True, "files": files})
+    reduced = OutputBudget(ToolSettings(output_budget=30_000)).reduce(output)
+    data = json.loads(reduced.output)
+    assert len(reduced.output) <= 30_000
+    assert data["files"] == files[:1]
+    assert data["files_omitted"] == 4
+
+
+def test_plain_text_is_deduplicated_then_truncated():
+    text = "same\n" * 1000 + "".join(f"line {number}\n" for number in range(5000))
+    reduced = OutputBudget(ToolSettings(output_budget=4000)).reduce(text)
+    assert reduced.steps == ["deduplicated", "truncated"]
+    assert len(reduced.output) <= 4000
+    assert reduced.output.startswith("same\n[previous line repeated 999 more times]\nline 0\n")
+
+
+def test_dedupe_lines():
+    assert dedupe_lines("a\na\nb\nb\nb\nc") == "a\na\nb\n[previous line repeated 2 more times]\nc"
+
+
+def test_small_outputs_are_left_alone():
+    budget = OutputBudget(ToolSettings())
+    assert budget.reduce('{"content": "short"}').steps == []
+    assert OutputBudget(ToolSettings(output_budget=None)).reduce(TEXT).output == TEXT
@@ -0,0 +1,72 @@
+import pytest
+
+from oa_assist.reading import read_lines
+
+LINES = b"".join(b"line %d\n" % number for number in range(1, 11))
+
+
+# A threshold of 0 reads through an mmap, a large one with plain reads.
+@pytest.fixture(params=[0, 1 << 30], ids=["mmap", "file"])
+def mmap_threshold(request):
+    return request.param
+
+
+def test_whole_lines_within_the_budget(tmp_path, mmap_threshold):
+    path = tmp_path / "lines.txt"
+    path.write_bytes(LINES)
+    chunk = read_lines(path, 1, None, 20, mmap_threshold)
+    # "line 1\n" and "line 2\n" fit in 20 bytes, "line 3\n" doesn't.
+    assert chunk.data == b"line 1\nline 2\n"
+    assert chunk.end_line == 2
+    assert not chunk.partial
+    assert chunk.next_offset == len(chunk.data)
+
+
+def test_pages_cover_the_file(tmp_path, mmap_threshold):
+    path = tmp_path / "lines.txt"
+    path.write_bytes(LINES)
+    data = b""
+    start = 1
+    while True:
+        chunk = read_lines(path, start, None, 25, mmap_threshold)
+        data += chunk.data
+        if chunk.next_offset is None:
+            break
+        start = chunk.end_line + 1
+    assert data == LINES
+    assert chunk.end_line == 10
+
+
+def test_end_line(tmp_path, mmap_threshold):
+    path = tmp_path / "lines.txt"
+    path.write_bytes(LINES)
+    chunk = read_lines(path, 3, 4, 1000, mmap_threshold)
+    assert chunk.data == b"line 3\nline 4\n"
+    assert chunk.end_line == 4
+
+
+def test_past_the_end(tmp_path, mmap_threshold):
+    path = tmp_path / "lines.txt"
+    path.write_bytes(LINES)
+    chunk = read_lines(path, 20, None, 1000, mmap_threshold)
+    assert chunk.data == b""
+    assert chunk.next_offset is None
+
+
+def test_no_trailing_newline(tmp_path, mmap_threshold):
+    path = tmp_path / "lines.txt"
+    path.write_bytes(b"one\ntwo")
+    chunk = read_lines(path, 1, None, 1000, mmap_threshold)
+    assert chunk.data == b"one\ntwo"
+    assert chunk.end_line == 2
+    assert chunk.next_offset is None
+
+
+def test_overlong_line_is_partial(tmp_path, mmap_threshold):
+    path = tmp_path / "long.txt"
+    path.write_bytes(b"x" * 5000 + b"\nnext\n")
+    chunk = read_lines(path, 1, None, 1000, mmap_threshold)
+    assert chunk.data == b"x" * 1000
+    assert chunk.end_line == 1
+    assert chunk.partial
+    assert chunk.next_offset == 1000
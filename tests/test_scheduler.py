@@ -0,0 +1,114 @@
+import httpx
+import pytest
+
+from oa_assist.scheduler import CircuitBreaker, CircuitOpenError, Scheduler
+from oa_assist.settings import ClientSettings
+
+API = "https://api.example.com/v1"
+
+
+def scheduler(**settings) -> Scheduler:
+    return Scheduler(ClientSettings(retry_backoff=0.01, **settings))
+
+
+def request(method: str, path: str) -> httpx.Request:
+    return httpx.Request(method, API + path)
+
+
+def response(status: int, **headers) -> httpx.Response:
+    return httpx.Response(status, headers=headers)
+
+
+@pytest.mark.parametrize("method, path, status, retried", [
+    ("GET", "/threads/thread_1/runs/run_1", 500, True),
+    ("GET", "/threads/thread_1/runs/run_1", 404, False),
+    ("POST", "/threads/thread_1/runs/run_1/submit_tool_outputs", 503, True),
+    ("POST", "/threads/thread_1/runs/run_1/cancel", 502, True),
+    # Repeating these could create a second message or run.
+    ("POST", "/threads/thread_1/messages", 500, False),
+    ("POST", "/threads/thread_1/runs", 500, False),
+    # Unless the server turned the request away.
+    ("POST", "/threads/thread_1/runs", 429, True),
+])
+def test_retry_statuses(method, path, status, retried):
+    delay = scheduler(rate_limit=False).completed(request(method, path), response(status), 0)
+    assert (delay is not None) is retried
+
+
+def test_retries_are_limited():
+    sched = scheduler(max_retries=2)
+    get = request("GET", "/assistants")
+    assert sched.completed(get, response(500), 1) is not None
+    assert sched.completed(get, response(500), 2) is None
+
+
+def test_should_retry_header():
+    sched = scheduler()
+    assert sched.completed(request("GET", "/assistants"), response(500, **{"x-should-retry": "false"}), 0) is None
+    assert sched.completed(request("GET", "/assistants"), response(400, **{"x-should-retry": "true"}), 0) is not None
+
+
+@pytest.mark.parametrize("path", ["/threads/thread_1/runs", "/threads/thread_1/messages"])
+def test_should_retry_header_doesnt_repeat_creates(path):
+    sched = scheduler()
+    assert sched.completed(request("POST", path), response(500, **{"x-should-retry": "true"}), 0) is None
+    assert sched.completed(request("POST", path), response(429, **{"x-should-retry": "true"}), 0) is not None
+
+
+def test_retry_after_is_used():
+    delay = scheduler().completed(request("GET", "/assistants"), response(429, **{"retry-after-ms": "250"}), 0)
+    assert delay == 0.25
+
+
+@pytest.mark.parametrize("error, retried", [
+    (httpx.ConnectError("refused"), True),
+    (httpx.ReadTimeout("slow"), False),
+])
+def test_transport_errors_on_posts(error, retried):
+    delay = scheduler().failed(request("POST", "/threads/thread_1/runs"), error, 0)
+    assert (delay is not None) is retried
+
+
+def test_reads_retry_any_transport_error():
+    assert scheduler().failed(request("GET", "/assistants"), httpx.ReadTimeout("slow"), 0) is not None
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(threshold=3, cooldown=30.0)
+    for _ in range(2):
+        breaker.record(False, 0.0)
+    breaker.check(1.0)
+    breaker.record(False, 1.0)
+    with pytest.raises(CircuitOpenError):
+        breaker.check(2.0)
+
+
+def test_breaker_lets_one_probe_through_after_cooldown():
+    breaker = CircuitBreaker(threshold=1, cooldown=30.0)
+    breaker.record(False, 0.0)
+    breaker.check(31.0)
+    # The probe is in flight; others wait for its result.
+    with pytest.raises(CircuitOpenError):
+        breaker.check(32.0)
+    breaker.record(True, 33.0)
+    breaker.check(34.0)
+
+
+def test_success_resets_the_breaker():
+    breaker = CircuitBreaker(threshold=2, cooldown=30.0)
+    breaker.record(False, 0.0)
+    breaker.record(True, 1.0)
+    breaker.record(False, 2.0)
+    breaker.check(3.0)
+
+
+def test_breaker_disabled():
+    breaker = CircuitBreaker(threshold=0, cooldown=30.0)
+    for _ in range(10):
+        breaker.record(False, 0.0)
+    breaker.check(1.0)
+
+
+def test_open_circuit_isnt_retried():
+    sched = scheduler()
+    assert sched.failed(request("GET", "/assistants"), CircuitOpenError("open"), 0) is None
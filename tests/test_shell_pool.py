@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+from oa_assist.settings import ToolSettings
+from oa_assist.shell_pool import Shell, ShellPool
+from oa_assist.tool_functions import ExecFunction, FunctionEventHandler
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ShellPool(ToolSettings(shell_pool=True, shell_pool_size=2, shell_cwd=str(tmp_path)))
+    yield pool
+    pool.close()
+
+
+def test_state_carries_over(pool, tmp_path):
+    (tmp_path / "sub").mkdir()
+    assert pool.run("t1", "cd sub; export GREETING=hi; count=3; greet() { echo \"$GREETING $1\"; }").returncode == 0
+    result = pool.run("t1", "pwd; echo $count; greet there")
+    assert result.stdout == f"{tmp_path / 'sub'}\n3\nhi there\n"
+    assert result.returncode == 0
+
+
+def test_sessions_get_their_own_shells(pool):
+    pool.run("t1", "x=1")
+    assert pool.run("t2", "echo ${x:-unset}").stdout == "unset\n"
+    assert pool.run("t1", "echo $x").stdout == "1\n"
+
+
+def test_exit_ends_only_the_command(pool):
+    pid = pool.run("t1", "echo $$").stdout
+    result = pool.run("t1", "echo before; exit 3; echo after")
+    assert result.stdout == "before\n"
+    assert result.returncode == 3
+    assert pool.run("t1", "echo $$").stdout == pid
+
+
+def test_dead_shells_are_replaced(pool):
+    pid = pool.run("t1", "echo $$").stdout
+    result = pool.run("t1", "exec true")
+    assert result.returncode == 0
+    assert not result.timed_out
+    result = pool.run("t1", "echo $$; echo ok")
+    assert result.stdout.endswith("ok\n")
+    assert result.stdout.split("\n")[0] != pid.strip()
+    pool.run("t1", "kill -9 $$")
+    assert pool.run("t1", "echo ok").stdout == "ok\n"
+
+
+def test_timeout_kills_only_its_shell(pool):
+    pool.run("t2", "y=2")
+    result = pool.run("t1", "echo started; sleep 30", timeout=0.5)
+    assert result.timed_out
+    assert result.returncode is None
+    assert result.stdout == "started\n"
+    assert pool.run("t2", "echo $y").stdout == "2\n"
+    assert pool.run("t1", "echo ok").stdout == "ok\n"
+
+
+def test_input_and_status(pool):
+    result = pool.run("t1", "tr a-z A-Z; false", input="hello\n")
+    assert result.stdout == "HELLO\n"
+    assert result.returncode == 1
+    # Commands without input don't wait on the shell's own stdin.
+    assert pool.run("t1", "cat").stdout == ""
+
+
+def test_output_without_a_final_newline(pool):
+    # Output without a trailing newline runs straight into the marker line.
+    result = pool.run("t1", "printf partial")
+    assert result.stdout == "partial"
+    assert result.returncode == 0
+
+
+def test_limits_and_sandbox(tmp_path):
+    settings = ToolSettings(shell_cpu_seconds=5, shell_sandbox=["env", "SANDBOXED=1"], shell_env={"PATH": os.defpath})
+    shell = Shell(settings)
+    try:
+        result = shell.run("ulimit -t; echo $SANDBOXED")
+        assert result.stdout == "5\n1\n"
+    finally:
+        shell.close()
+    assert not shell.alive
+
+
+def test_exec_uses_the_pool(pool, tmp_path):
+    handler = FunctionEventHandler()
+    handler.settings = ToolSettings()
+    handler.shells = pool
+    handler.session = "t1"
+    ExecFunction(command="cd /; exit 2")(handler)
+    output = ExecFunction(command="pwd")(handler)
+    assert output == "/\n"
+    assert ExecFunction(command="exit 2")(handler).endswith("[exit status 2]")
@@ -0,0 +1,80 @@
+import subprocess
+
+import pytest
+
+from oa_assist.tool_cache import ToolResultCache
+from oa_assist.tool_functions import ExecFunction, GitCommandFunction, ReadFileFunction
+
+
+def git(repo, *args):
+    subprocess.run(
+        ["git", "-C", str(repo), "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+        check=True, capture_output=True,
+    )
+
+
+@pytest.fixture
+def repo(tmp_path):
+    git(tmp_path, "init", "-q")
+    (tmp_path / "file.txt").write_text("one\n")
+    git(tmp_path, "add", "file.txt")
+    git(tmp_path, "commit", "-q", "-m", "first")
+    return tmp_path
+
+
+def test_ref_commands_are_cached_on_the_refs(repo):
+    cache = ToolResultCache()
+    log = GitCommandFunction(command="log", args=["--all", "--oneline"], repo_dir=str(repo))
+    key = cache.key(log)
+    assert key is not None
+    assert cache.key(log) == key
+    git(repo, "tag", "v1")
+    assert cache.key(log) != key
+
+
+def test_commits_change_the_stamp(repo):
+    log = GitCommandFunction(command="log", repo_dir=str(repo))
+    stamp = log.cache_stamp()
+    (repo / "file.txt").write_text("two\n")
+    git(repo, "commit", "-q", "-am", "second")
+    assert log.cache_stamp() != stamp
+
+
+@pytest.mark.parametrize("command, args", [
+    ("status", []),
+    ("diff", []),
+    ("blame", ["file.txt"]),
+    ("describe", ["--dirty"]),
+    ("commit", ["-m", "x"]),
+])
+def test_work_tree_commands_arent_cached(repo, command, args):
+    assert GitCommandFunction(command=command, args=args, repo_dir=str(repo)).cache_stamp() is None
+
+
+def test_not_a_repository(tmp_path):
+    assert GitCommandFunction(command="log", repo_dir=str(tmp_path)).cache_stamp() is None
+
+
+def test_file_stamp_follows_the_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "notes.txt").write_text("one\n")
+    read = ReadFileFunction(path="notes.txt")
+    stamp = read.cache_stamp()
+    assert stamp is not None
+    (tmp_path / "notes.txt").write_text("one\ntwo\n")
+    assert read.cache_stamp() != stamp
+
+
+def test_uncacheable_tools():
+    assert ToolResultCache().key(ExecFunction(command="true")) is None
+
+
+def test_lru_eviction():
+    cache = ToolResultCache(max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"